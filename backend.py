@@ -0,0 +1,654 @@
+"""
+ImageMagick backend resolution
+
+Detects which ImageMagick binary is available (``magick`` for ImageMagick 7,
+``convert``/``identify`` for legacy ImageMagick 6), its version and the
+delegates and formats it supports. Detection runs once per process and the
+result is cached on disk, keyed on the binary's path and modification time,
+so later launches skip the probing entirely.
+"""
+
+import asyncio
+import json
+import os
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+CACHE_VERSION = 1
+
+# File extensions whose ImageMagick format name differs
+FORMAT_ALIASES = {"JPG": "JPEG", "TIF": "TIFF", "HEIF": "HEIC"}
+
+# Error kinds reported by ConversionError
+ERROR_MISSING_BINARY = "missing-binary"
+ERROR_TIMEOUT = "timeout"
+ERROR_CANCELLED = "cancelled"
+ERROR_UNSUPPORTED_INPUT = "unsupported-input"
+ERROR_UNSUPPORTED_OUTPUT = "unsupported-output"
+ERROR_CORRUPT_INPUT = "corrupt-input"
+ERROR_UNREADABLE_INPUT = "unreadable-input"
+ERROR_WRITE_FAILED = "write-failed"
+ERROR_POLICY = "policy"
+ERROR_RESOURCES = "resources"
+ERROR_FAILED = "failed"
+
+# Substrings of ImageMagick's stderr, checked in order
+_ERROR_PATTERNS = [
+	(ERROR_UNSUPPORTED_INPUT, ["no decode delegate"]),
+	(ERROR_UNSUPPORTED_OUTPUT, ["no encode delegate"]),
+	(ERROR_POLICY, ["not authorized", "security policy"]),
+	(
+		ERROR_RESOURCES,
+		["cache resources exhausted", "memory allocation failed", "resource limit"],
+	),
+	(
+		ERROR_CORRUPT_INPUT,
+		[
+			"improper image header",
+			"corrupt image",
+			"corruptimage",
+			"insufficient image data",
+			"premature end",
+			"not a jpeg file",
+			"unexpected end-of-file",
+			"negative or zero image size",
+			"length and filesize do not match",
+		],
+	),
+	(ERROR_WRITE_FAILED, ["permission denied", "unable to write"]),
+	(ERROR_UNREADABLE_INPUT, ["unable to open image", "no such file"]),
+]
+
+_ERROR_DESCRIPTIONS = {
+	ERROR_MISSING_BINARY: "ImageMagick not found",
+	ERROR_TIMEOUT: "Timed out",
+	ERROR_CANCELLED: "Cancelled",
+	ERROR_UNSUPPORTED_INPUT: "Input format not supported",
+	ERROR_UNSUPPORTED_OUTPUT: "Output format not supported",
+	ERROR_CORRUPT_INPUT: "Input file is corrupt",
+	ERROR_UNREADABLE_INPUT: "Input file could not be read",
+	ERROR_WRITE_FAILED: "Output could not be written",
+	ERROR_POLICY: "Blocked by ImageMagick security policy",
+	ERROR_RESOURCES: "Ran out of resources",
+	ERROR_FAILED: "Conversion failed",
+}
+
+
+class ConversionError(Exception):
+	"""A classified ImageMagick failure"""
+
+	def __init__(self, kind, detail=""):
+		self.kind = kind
+		self.detail = detail
+		message = _ERROR_DESCRIPTIONS.get(kind, kind)
+		if detail:
+			message = f"{message}: {detail}"
+		super().__init__(message)
+
+
+def _format_name(fmt):
+	fmt = fmt.upper()
+	return FORMAT_ALIASES.get(fmt, fmt)
+
+
+def classify_error(stderr):
+	"""Map ImageMagick's stderr output to one of the ERROR_* kinds"""
+	text = (stderr or "").lower()
+	for kind, patterns in _ERROR_PATTERNS:
+		if any(pattern in text for pattern in patterns):
+			return kind
+	return ERROR_FAILED
+
+
+class ProcessGroup:
+	"""Child processes that can be cancelled together
+
+	Pass a group to ImageMagickBackend.run(); cancel() terminates every
+	process still running in it (killing those that ignore SIGTERM after a
+	grace period) and makes later runs fail immediately.
+	"""
+
+	KILL_GRACE = 2.0
+
+	def __init__(self):
+		self._processes = set()
+		self._lock = threading.Lock()
+		self._cancelled = threading.Event()
+
+	@property
+	def cancelled(self):
+		return self._cancelled.is_set()
+
+	def add(self, process):
+		with self._lock:
+			self._processes.add(process)
+			cancelled = self.cancelled
+		if cancelled:
+			self._terminate(process)
+
+	def discard(self, process):
+		with self._lock:
+			self._processes.discard(process)
+
+	def cancel(self):
+		"""Terminate all running processes and refuse to start new ones"""
+		with self._lock:
+			self._cancelled.set()
+			processes = list(self._processes)
+		for process in processes:
+			self._terminate(process)
+
+	def _terminate(self, process):
+		_signal_process(process, kill=False)
+		timer = threading.Timer(self.KILL_GRACE, self._kill, args=(process,))
+		timer.daemon = True
+		timer.start()
+
+	@staticmethod
+	def _kill(process):
+		if process.poll() is None:
+			_signal_process(process, kill=True)
+
+
+def _reap(process):
+	"""Reap a child that has exited, returning its resource usage
+
+	os.wait4() reaps it as Popen.wait() would but also returns the rusage.
+	Returns None where os.wait4() does not exist, or when the child was
+	reaped elsewhere first (such as by ProcessGroup polling it).
+	"""
+	if process.returncode is None and hasattr(os, "wait4"):
+		try:
+			pid, status, rusage = os.wait4(process.pid, 0)
+		except ChildProcessError:
+			pass
+		else:
+			if os.WIFSIGNALED(status):
+				process.returncode = -os.WTERMSIG(status)
+			else:
+				process.returncode = os.WEXITSTATUS(status)
+			return rusage
+	process.wait()
+	return None
+
+
+def _wait_exited(process, timeout):
+	"""Wait up to ``timeout`` seconds for a child to exit; returns whether it did
+
+	On Linux the child is watched through a pidfd and left for _reap();
+	elsewhere Popen.wait() reaps it, so its resource usage is not known.
+	"""
+	if process.returncode is not None:
+		return True
+	try:
+		pidfd = os.pidfd_open(process.pid)
+	except (AttributeError, OSError):  # Not Linux, or already reaped
+		try:
+			process.wait(timeout)
+		except subprocess.TimeoutExpired:
+			return False
+		return True
+	try:
+		return bool(select.select([pidfd], [], [], timeout)[0])
+	finally:
+		os.close(pidfd)
+
+
+async def _wait_exit(process):
+	"""Wait for a Popen to exit without blocking the event loop
+
+	On Linux the loop watches a pidfd of the process, so no thread waits
+	for it; elsewhere a thread of the loop's default executor does.
+	Returns the resource usage from _reap().
+	"""
+	loop = asyncio.get_running_loop()
+	if process.returncode is not None:
+		return None
+	try:
+		pidfd = os.pidfd_open(process.pid)
+	except (AttributeError, OSError):  # Not Linux, or already reaped
+		return await loop.run_in_executor(None, _reap, process)
+	try:
+		exited = loop.create_future()
+		loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+		try:
+			await exited
+		finally:
+			loop.remove_reader(pidfd)
+	finally:
+		os.close(pidfd)
+	return _reap(process)  # Exited, so this does not block
+
+
+class ProcessStats:
+	"""Timings of one ImageMagick process, filled in by ImageMagickBackend.run()
+
+	``cpu_time`` is the user plus system time of the process and of the
+	delegates it waited for, as reported by os.wait4(). It stays None where
+	that is not available and when the process was killed.
+	"""
+
+	def __init__(self):
+		self.spawn = 0.0  # Seconds spent starting the process
+		self.wall = 0.0  # Seconds from starting the process until it exited
+		self.cpu_time = None
+
+
+def _popen_kwargs():
+	"""Start children in their own process group so delegates die with them"""
+	if sys.platform == "win32":
+		return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+	return {"start_new_session": True}
+
+
+def _signal_process(process, kill):
+	"""Terminate (or kill) a child and any delegate processes it started
+
+	ImageMagick runs delegates such as Ghostscript as children that share
+	its output pipes, so signalling only the parent would leave them
+	running and keep communicate() waiting.
+	"""
+	try:
+		if sys.platform == "win32":
+			process.kill() if kill else process.terminate()
+		else:
+			os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+	except OSError:
+		pass
+
+
+class ImageMagickBackend:
+	"""A resolved ImageMagick installation"""
+
+	def __init__(
+		self, name, executable, version, delegates=(), read_formats=(), write_formats=()
+	):
+		self.name = name  # "magick" or "convert"
+		self.executable = executable
+		self.version = version
+		self.delegates = list(delegates)
+		self.read_formats = set(read_formats)
+		self.write_formats = set(write_formats)
+
+	@property
+	def is_legacy(self):
+		"""True for ImageMagick 6 style ``convert``/``identify`` binaries"""
+		return self.name != "magick"
+
+	def command(self, tool, *args):
+		"""Build the argv for an ImageMagick tool (convert, identify, mogrify...)"""
+		if not self.is_legacy:
+			if tool == "convert":
+				return [self.executable, *args]
+			return [self.executable, tool, *args]
+		if tool == "convert":
+			return [self.executable, *args]
+		# Legacy tools live next to the convert binary
+		sibling = Path(self.executable).with_name(tool + Path(self.executable).suffix)
+		return [str(sibling) if sibling.exists() else tool, *args]
+
+	def convert_command(self, input_path, output_path, options=(), settings=()):
+		"""Build the argv to convert one file
+
+		``settings`` (such as ``-limit`` options) go before the input, so
+		they apply while it is read; ``options`` operate on the image.
+		"""
+		return self.command(
+			"convert", *settings, str(input_path), *options, str(output_path)
+		)
+
+	def convert_group_command(self, pairs, options=(), settings=(), pair_options=None):
+		"""Build one argv converting several ``(input, output)`` pairs
+
+		Every input but the last is written with ``-write`` and then dropped
+		with ``-delete 0--1`` (which also clears multi-frame inputs), so each
+		output gets exactly the frames of its own input. ``pair_options``, if
+		given, holds the options of each pair, in place of ``options``.
+		"""
+		if pair_options is None:
+			pair_options = [options] * len(pairs)
+		args = list(settings)
+		for (input_path, output_path), options in zip(pairs[:-1], pair_options):
+			args += [str(input_path), *options, "-write", str(output_path)]
+			args += ["-delete", "0--1"]
+		input_path, output_path = pairs[-1]
+		args += [str(input_path), *pair_options[-1], str(output_path)]
+		return self.command("convert", *args)
+
+	def can_read(self, fmt):
+		"""Whether the format is readable (True when formats are unknown)"""
+		return not self.read_formats or _format_name(fmt) in self.read_formats
+
+	def can_write(self, fmt):
+		"""Whether the format is writable (True when formats are unknown)"""
+		return not self.write_formats or _format_name(fmt) in self.write_formats
+
+	def run(self, argv, timeout=60, group=None, stats=None):
+		"""Run an ImageMagick command, raising ConversionError on failure
+
+		A timed-out process is killed. When ``group`` (a ProcessGroup) is
+		given, the process can be terminated through it. A ProcessStats
+		passed as ``stats`` receives the process's timings, also when it
+		fails. Output goes to temporary files rather than pipes, so that
+		the process can be waited for without draining them.
+		"""
+		if group is not None and group.cancelled:
+			raise ConversionError(ERROR_CANCELLED)
+		with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+			started = time.perf_counter()
+			try:
+				process = subprocess.Popen(
+					argv,
+					stdout=stdout_file,
+					stderr=stderr_file,
+					**_popen_kwargs(),
+				)
+			except FileNotFoundError:
+				raise ConversionError(ERROR_MISSING_BINARY, argv[0])
+			spawned = time.perf_counter()
+
+			if group is not None:
+				group.add(process)
+			rusage = None
+			try:
+				if not _wait_exited(process, timeout):
+					_signal_process(process, kill=True)
+					_reap(process)
+					raise ConversionError(ERROR_TIMEOUT, f"after {timeout:.0f}s")
+				rusage = _reap(process)
+			finally:
+				if group is not None:
+					group.discard(process)
+				if stats is not None:
+					stats.spawn = spawned - started
+					stats.wall = time.perf_counter() - started
+					if rusage is not None:
+						stats.cpu_time = rusage.ru_utime + rusage.ru_stime
+			stdout_file.seek(0)
+			stdout = stdout_file.read().decode("utf-8", "replace")
+			stderr_file.seek(0)
+			stderr = stderr_file.read().decode("utf-8", "replace")
+
+		if process.returncode != 0:
+			if group is not None and group.cancelled:
+				raise ConversionError(ERROR_CANCELLED)
+			stderr = stderr.strip() or "Unknown error"
+			raise ConversionError(classify_error(stderr), stderr)
+		return subprocess.CompletedProcess(argv, process.returncode, stdout, stderr)
+
+	async def run_async(self, argv, timeout=60, group=None, stats=None):
+		"""Run an ImageMagick command from an asyncio event loop
+
+		Behaves like run(), but waits for the process without holding a
+		thread. Output on stdout is discarded; stderr goes to a temporary
+		file, so delegates that outlive a killed process cannot keep a pipe
+		open.
+		"""
+		if group is not None and group.cancelled:
+			raise ConversionError(ERROR_CANCELLED)
+		with tempfile.TemporaryFile() as stderr_file:
+			started = time.perf_counter()
+			try:
+				process = subprocess.Popen(
+					argv,
+					stdout=subprocess.DEVNULL,
+					stderr=stderr_file,
+					**_popen_kwargs(),
+				)
+			except FileNotFoundError:
+				raise ConversionError(ERROR_MISSING_BINARY, argv[0])
+			spawned = time.perf_counter()
+
+			if group is not None:
+				group.add(process)
+			rusage = None
+			try:
+				rusage = await asyncio.wait_for(_wait_exit(process), timeout)
+			except asyncio.TimeoutError:
+				_signal_process(process, kill=True)
+				await _wait_exit(process)
+				raise ConversionError(ERROR_TIMEOUT, f"after {timeout:.0f}s")
+			finally:
+				if group is not None:
+					group.discard(process)
+				if stats is not None:
+					stats.spawn = spawned - started
+					stats.wall = time.perf_counter() - started
+					if rusage is not None:
+						stats.cpu_time = rusage.ru_utime + rusage.ru_stime
+			stderr_file.seek(0)
+			stderr = stderr_file.read().decode("utf-8", "replace")
+
+		if process.returncode != 0:
+			if group is not None and group.cancelled:
+				raise ConversionError(ERROR_CANCELLED)
+			stderr = stderr.strip() or "Unknown error"
+			raise ConversionError(classify_error(stderr), stderr)
+		return subprocess.CompletedProcess(argv, process.returncode, None, stderr)
+
+	def _check_output_format(self, output_path):
+		output_format = Path(output_path).suffix.lstrip(".")
+		if output_format and not self.can_write(output_format):
+			raise ConversionError(ERROR_UNSUPPORTED_OUTPUT, output_format.upper())
+
+	def convert(
+		self,
+		input_path,
+		output_path,
+		options=(),
+		timeout=60,
+		group=None,
+		settings=(),
+		stats=None,
+	):
+		"""Convert one file, raising ConversionError on failure"""
+		self._check_output_format(output_path)
+		return self.run(
+			self.convert_command(input_path, output_path, options, settings),
+			timeout=timeout,
+			group=group,
+			stats=stats,
+		)
+
+	async def convert_async(
+		self,
+		input_path,
+		output_path,
+		options=(),
+		timeout=60,
+		group=None,
+		settings=(),
+		stats=None,
+	):
+		"""convert() for an asyncio event loop (see run_async())"""
+		self._check_output_format(output_path)
+		return await self.run_async(
+			self.convert_command(input_path, output_path, options, settings),
+			timeout=timeout,
+			group=group,
+			stats=stats,
+		)
+
+	def identify(self, path, fmt="%wx%h", timeout=5):
+		"""Return ``identify -format`` output for the first frame of a file"""
+		result = self.run(
+			self.command("identify", "-format", fmt, f"{path}[0]"), timeout=timeout
+		)
+		return result.stdout.strip()
+
+	def to_dict(self):
+		return {
+			"name": self.name,
+			"executable": self.executable,
+			"version": self.version,
+			"delegates": self.delegates,
+			"read_formats": sorted(self.read_formats),
+			"write_formats": sorted(self.write_formats),
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(
+			data["name"],
+			data["executable"],
+			data["version"],
+			data.get("delegates", ()),
+			data.get("read_formats", ()),
+			data.get("write_formats", ()),
+		)
+
+
+def get_cache_dir():
+	"""Return the per-user cache directory for the application"""
+	if sys.platform == "win32":
+		base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+	elif sys.platform == "darwin":
+		base = Path.home() / "Library" / "Caches"
+	else:
+		base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+	return Path(base) / "imagemagick-gui"
+
+
+def _cache_file():
+	return get_cache_dir() / "backend.json"
+
+
+def _parse_version_output(output):
+	"""Extract the version line and delegates from ``-version`` output"""
+	version = ""
+	delegates = []
+	for line in output.splitlines():
+		if line.startswith("Version:"):
+			version = line[len("Version:") :].strip()
+		elif line.startswith("Delegates"):
+			delegates = line.split(":", 1)[1].split()
+	if not version and output.strip():
+		version = output.strip().splitlines()[0]
+	return version, delegates
+
+
+def _parse_format_list(output):
+	"""Extract readable and writable formats from ``-list format`` output"""
+	read_formats = set()
+	write_formats = set()
+	for line in output.splitlines():
+		parts = line.split()
+		if len(parts) < 3:
+			continue
+		name = parts[0].rstrip("*").upper()
+		# The mode column looks like "rw+", "r--", "-w-"; the module column
+		# is optional in older releases
+		for mode in parts[1:3]:
+			if len(mode) == 3 and mode[0] in "r-" and mode[1] in "w-" and mode[2] in "+-":
+				if mode[0] == "r":
+					read_formats.add(name)
+				if mode[1] == "w":
+					write_formats.add(name)
+				break
+	return read_formats, write_formats
+
+
+def _probe(name, executable):
+	"""Query a binary for its version, delegates and formats"""
+	result = subprocess.run(
+		[executable, "-version"], capture_output=True, text=True, timeout=10
+	)
+	if result.returncode != 0 or "ImageMagick" not in result.stdout:
+		# On Windows "convert" may be the unrelated filesystem tool
+		return None
+	version, delegates = _parse_version_output(result.stdout)
+
+	read_formats, write_formats = set(), set()
+	try:
+		result = subprocess.run(
+			[executable, "-list", "format"], capture_output=True, text=True, timeout=10
+		)
+		if result.returncode == 0:
+			read_formats, write_formats = _parse_format_list(result.stdout)
+	except subprocess.TimeoutExpired:
+		pass
+
+	return ImageMagickBackend(
+		name, executable, version, delegates, read_formats, write_formats
+	)
+
+
+def _load_cached(executable, mtime_ns):
+	try:
+		with open(_cache_file(), "r", encoding="utf-8") as fh:
+			data = json.load(fh)
+	except (OSError, ValueError):
+		return None
+	if (
+		data.get("cache_version") != CACHE_VERSION
+		or data.get("executable") != executable
+		or data.get("mtime_ns") != mtime_ns
+	):
+		return None
+	try:
+		return ImageMagickBackend.from_dict(data)
+	except (KeyError, TypeError):
+		return None
+
+
+def _store_cached(backend, mtime_ns):
+	data = backend.to_dict()
+	data["cache_version"] = CACHE_VERSION
+	data["mtime_ns"] = mtime_ns
+	cache_file = _cache_file()
+	try:
+		cache_file.parent.mkdir(parents=True, exist_ok=True)
+		tmp_file = cache_file.with_suffix(".tmp")
+		with open(tmp_file, "w", encoding="utf-8") as fh:
+			json.dump(data, fh)
+		os.replace(tmp_file, cache_file)
+	except OSError:
+		pass  # The cache is an optimisation only
+
+
+_resolved = None
+_resolve_lock = threading.Lock()
+
+
+def resolve_backend(refresh=False):
+	"""Return the ImageMagickBackend to use, or None if none is installed
+
+	The result is memoised for the process and cached on disk between
+	launches; pass ``refresh=True`` to probe again.
+	"""
+	global _resolved
+	with _resolve_lock:
+		if _resolved is not None and not refresh:
+			return _resolved
+
+		for name in ("magick", "convert"):
+			executable = shutil.which(name)
+			if not executable:
+				continue
+			try:
+				mtime_ns = os.stat(executable).st_mtime_ns
+			except OSError:
+				continue
+
+			backend = None if refresh else _load_cached(executable, mtime_ns)
+			if backend is None:
+				try:
+					backend = _probe(name, executable)
+				except (OSError, subprocess.TimeoutExpired):
+					backend = None
+				if backend is None:
+					continue
+				_store_cached(backend, mtime_ns)
+
+			_resolved = backend
+			return backend
+
+		return None
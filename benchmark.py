@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Conversion benchmarks
+
+Generates a reproducible corpus with ImageMagick (tiny icons, 12 MP photos,
+multi-page TIFFs, animated GIFs and PDFs) and times the single-file path
+(ConversionEngine.convert_file(), as used by the Single Conversion tab) and
+the batch path (ConversionEngine.convert_many()) for every output format.
+Each scenario runs in its own child process so its peak memory can be
+measured. Results are written as JSON; ``--compare`` diffs them against an
+earlier run.
+
+	python benchmark.py -o results.json
+	python build.py benchmark --compare results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+	import resource
+except ImportError:  # Windows: peak memory is not reported
+	resource = None
+
+from backend import ConversionError, resolve_backend
+from engine import OUTPUT_FORMATS, ConversionEngine, measure_input
+from resources import cpu_count
+
+
+RESULTS_VERSION = 1
+MODES = ["single", "batch"]
+
+# Corpus files per kind at --scale 1: (count, size, frames/pages, extension)
+CORPUS = {
+	"icon": (24, "32x32", 1, "png"),
+	"photo": (3, "4000x3000", 1, "jpg"),
+	"multipage": (2, "1024x768", 4, "tiff"),
+	"animation": (2, "320x240", 12, "gif"),
+	"document": (2, "850x1100", 3, "pdf"),
+}
+
+# Metrics compared by --compare, and whether higher is better
+COMPARED_METRICS = {
+	"files_per_second": True,
+	"megapixels_per_second": True,
+	"latency_p50": False,
+	"latency_p95": False,
+	"peak_rss_bytes": False,
+}
+# What a result must share with an earlier one to be compared with it:
+# the scenario, and the job count and backends that ran it
+COMPARED_SETTINGS = ("mode", "format", "jobs", "pillow", "magickwand")
+
+
+def generate_corpus(backend, directory, scale=1):
+	"""Write the benchmark corpus into ``directory`` and return its files
+
+	Images are drawn with a fixed random seed so every run converts the
+	same pixels. Existing files are reused, so a corpus directory can be
+	kept between runs.
+	"""
+	os.makedirs(directory, exist_ok=True)
+	files = []
+	for kind, (count, size, frames, extension) in CORPUS.items():
+		for i in range(count * scale):
+			path = os.path.join(directory, f"{kind}_{i:03d}.{extension}")
+			files.append(path)
+			if os.path.exists(path):
+				continue
+			args = ["-seed", str(i + 1), "-size", size]
+			if kind == "animation":
+				args += ["-delay", "8"]
+			args += ["plasma:"] * frames
+			if kind == "photo":
+				args += ["-quality", "92"]
+			elif kind == "multipage":
+				args += ["-compress", "lzw"]
+			elif kind == "animation":
+				args += ["-loop", "0"]
+			tmp_path = f"{path}.tmp.{extension}"
+			backend.run(backend.command("convert", *args, tmp_path), timeout=300)
+			os.replace(tmp_path, path)
+	return files
+
+
+def percentile(values, fraction):
+	"""Nearest-rank percentile of a list of numbers (None if empty)"""
+	if not values:
+		return None
+	ordered = sorted(values)
+	rank = max(1, math.ceil(fraction * len(ordered)))
+	return ordered[rank - 1]
+
+
+def _peak_rss():
+	"""Peak RSS in bytes of this process and of its largest child, or None"""
+	if resource is None:
+		return None, None
+	# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+	unit = 1 if sys.platform == "darwin" else 1024
+	own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+	children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+	return own, children
+
+
+def run_scenario(
+	backend, files, mode, output_format, jobs=None, use_pillow=True, use_wand=False
+):
+	"""Convert ``files`` to ``output_format`` one way and measure it
+
+	Runs in the calling process; use measure_scenario() to get the peak
+	memory of the scenario on its own.
+	"""
+	with tempfile.TemporaryDirectory(prefix="imagemagick-gui-bench-") as output_dir:
+		engine = ConversionEngine(
+			backend,
+			output_format=output_format,
+			output_dir=output_dir,
+			max_workers=jobs,
+			use_pillow=use_pillow,
+			use_wand=use_wand,
+		)
+		started = time.perf_counter()
+		if mode == "single":
+			results = [
+				engine.convert_file(path, index) for index, path in enumerate(files)
+			]
+		else:
+			results = list(engine.convert_many(files))
+		seconds = time.perf_counter() - started
+
+	converted = [result for result in results if result.success]
+	latencies = [result.elapsed for result in converted]
+	pixels = sum(result.pixels for result in converted)
+	own_rss, child_rss = _peak_rss()
+	failures = {}
+	for result in results:
+		if not result.success:
+			failures[result.error.kind] = failures.get(result.error.kind, 0) + 1
+	return {
+		"mode": mode,
+		"format": output_format,
+		"jobs": engine.max_workers,
+		"pillow": engine.use_pillow,
+		"magickwand": engine.wand is not None,
+		"files": len(files),
+		"converted": len(converted),
+		"failures": failures,
+		"seconds": seconds,
+		"files_per_second": len(converted) / seconds if seconds else 0.0,
+		"megapixels_per_second": pixels / 1e6 / seconds if seconds else 0.0,
+		"latency_p50": percentile(latencies, 0.50),
+		"latency_p95": percentile(latencies, 0.95),
+		# In-process (Pillow) conversions count towards the scenario process
+		"peak_rss_bytes": None if own_rss is None else max(own_rss, child_rss),
+		"harness_rss_bytes": own_rss,
+	}
+
+
+def measure_scenario(
+	corpus_dir, scale, mode, output_format, jobs=None, use_pillow=True, use_wand=False
+):
+	"""Run one scenario in a child process, so peak memory is its own"""
+	scenario = {
+		"mode": mode,
+		"format": output_format,
+		"jobs": jobs,
+		"pillow": use_pillow,
+		"magickwand": use_wand,
+	}
+	argv = [
+		sys.executable,
+		os.path.abspath(__file__),
+		"--run-scenario",
+		json.dumps(scenario),
+		"--corpus",
+		corpus_dir,
+		"--scale",
+		str(scale),
+	]
+	process = subprocess.run(argv, capture_output=True, text=True)
+	if process.returncode != 0:
+		raise RuntimeError(process.stderr.strip() or "benchmark scenario failed")
+	return json.loads(process.stdout)
+
+
+def _corpus_summary(files):
+	summary = {}
+	for path in files:
+		kind = os.path.basename(path).split("_")[0]
+		entry = summary.setdefault(kind, {"files": 0, "bytes": 0, "megapixels": 0.0})
+		size, pixels = measure_input(path)
+		entry["files"] += 1
+		entry["bytes"] += size
+		entry["megapixels"] += pixels / 1e6
+	return summary
+
+
+def _compared_settings(run):
+	return tuple(run.get(setting) for setting in COMPARED_SETTINGS)
+
+
+def compare(old, new):
+	"""Yield ``(scenario, metric, old, new, change)`` for matching scenarios
+
+	Scenarios only match when they also ran with the same job count and
+	backends (COMPARED_SETTINGS); see unmatched() for the others.
+	``change`` is the relative improvement: positive is better, whatever
+	the direction of the metric.
+	"""
+	previous = {_compared_settings(run): run for run in old["results"]}
+	for run in new["results"]:
+		before = previous.get(_compared_settings(run))
+		if before is None:
+			continue
+		for metric, higher_is_better in COMPARED_METRICS.items():
+			a, b = before.get(metric), run.get(metric)
+			if not a or b is None:
+				continue
+			change = (b - a) / a if higher_is_better else (a - b) / a
+			yield f"{run['mode']}/{run['format']}", metric, a, b, change
+
+
+def unmatched(old, new):
+	"""Yield ``(scenario, differences)`` for scenarios in both that ran differently
+
+	``differences`` describes the settings that differ, such as
+	``jobs 4 -> 8``; compare() leaves these scenarios out.
+	"""
+	previous = {(run["mode"], run["format"]): run for run in old["results"]}
+	for run in new["results"]:
+		before = previous.get((run["mode"], run["format"]))
+		if before is None or _compared_settings(before) == _compared_settings(run):
+			continue
+		differences = [
+			f"{setting} {before.get(setting)} -> {run.get(setting)}"
+			for setting in COMPARED_SETTINGS
+			if before.get(setting) != run.get(setting)
+		]
+		yield f"{run['mode']}/{run['format']}", ", ".join(differences)
+
+
+def _format_seconds(value):
+	return "-" if value is None else f"{value * 1000:.0f} ms"
+
+
+def _format_bytes(value):
+	return "-" if value is None else f"{value / (1024 * 1024):.0f} MB"
+
+
+def main(argv=None):
+	"""Generate the corpus, run every scenario and write the results"""
+	parser = argparse.ArgumentParser(
+		description="Benchmark single-file and batch conversion on a generated corpus."
+	)
+	parser.add_argument(
+		"--corpus",
+		help="directory holding the corpus; generated if missing "
+		"(default: a temporary directory)",
+	)
+	parser.add_argument(
+		"--scale",
+		type=int,
+		default=1,
+		help="multiply the number of corpus files (default: 1)",
+	)
+	parser.add_argument(
+		"--formats",
+		nargs="+",
+		choices=OUTPUT_FORMATS,
+		default=OUTPUT_FORMATS,
+		help="output formats to benchmark (default: all)",
+	)
+	parser.add_argument(
+		"--modes",
+		nargs="+",
+		choices=MODES,
+		default=MODES,
+		help="conversion paths to benchmark (default: both)",
+	)
+	parser.add_argument(
+		"-j", "--jobs", type=int, help="parallel jobs for the batch path"
+	)
+	parser.add_argument(
+		"--no-pillow",
+		dest="use_pillow",
+		action="store_false",
+		help="convert everything with ImageMagick, even when Pillow is installed",
+	)
+	parser.add_argument(
+		"--magickwand",
+		dest="use_wand",
+		action="store_true",
+		help="convert with MagickWand worker processes instead of magick",
+	)
+	parser.add_argument(
+		"-o",
+		"--output",
+		default="benchmark-results.json",
+		help="results file (default: benchmark-results.json)",
+	)
+	parser.add_argument(
+		"--compare", metavar="RESULTS", help="earlier results file to compare with"
+	)
+	parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	backend = resolve_backend()
+	if backend is None:
+		print("error: ImageMagick not found", file=sys.stderr)
+		return 2
+
+	if args.run_scenario:
+		scenario = json.loads(args.run_scenario)
+		result = run_scenario(
+			backend,
+			generate_corpus(backend, args.corpus, args.scale),
+			scenario["mode"],
+			scenario["format"],
+			scenario["jobs"],
+			scenario["pillow"],
+			scenario["magickwand"],
+		)
+		print(json.dumps(result))
+		return 0
+
+	with tempfile.TemporaryDirectory(prefix="imagemagick-gui-corpus-") as scratch:
+		corpus_dir = args.corpus or scratch
+		print(f"Generating corpus in {corpus_dir}...", flush=True)
+		try:
+			files = generate_corpus(backend, corpus_dir, args.scale)
+		except ConversionError as e:
+			print(f"error: could not generate the corpus: {e}", file=sys.stderr)
+			return 2
+
+		report = {
+			"version": RESULTS_VERSION,
+			"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+			"machine": {
+				"platform": platform.platform(),
+				"python": platform.python_version(),
+				"cpus": cpu_count(),
+				"imagemagick": backend.version,
+			},
+			"corpus": _corpus_summary(files),
+			"results": [],
+		}
+
+		print(
+			f"{'scenario':<16}{'files/s':>10}{'MP/s':>10}{'p50':>10}{'p95':>10}"
+			f"{'peak RSS':>11}  failures"
+		)
+		for output_format in args.formats:
+			for mode in args.modes:
+				result = measure_scenario(
+					corpus_dir,
+					args.scale,
+					mode,
+					output_format,
+					args.jobs,
+					args.use_pillow,
+					args.use_wand,
+				)
+				report["results"].append(result)
+				failures = ", ".join(
+					f"{count} {kind}" for kind, count in result["failures"].items()
+				)
+				print(
+					f"{mode + '/' + output_format:<16}"
+					f"{result['files_per_second']:>10.1f}"
+					f"{result['megapixels_per_second']:>10.1f}"
+					f"{_format_seconds(result['latency_p50']):>10}"
+					f"{_format_seconds(result['latency_p95']):>10}"
+					f"{_format_bytes(result['peak_rss_bytes']):>11}  {failures}",
+					flush=True,
+				)
+
+	with open(args.output, "w", encoding="utf-8") as fh:
+		json.dump(report, fh, indent=1)
+	print(f"Results written to {args.output}")
+
+	if args.compare:
+		with open(args.compare, "r", encoding="utf-8") as fh:
+			previous = json.load(fh)
+		print(f"\nChanges since {args.compare} (positive is better):")
+		for scenario, metric, old, new, change in compare(previous, report):
+			print(f"  {scenario:<16}{metric:<24}{change:>+8.1%}")
+		for scenario, differences in unmatched(previous, report):
+			print(
+				f"warning: {scenario} not compared, it ran differently "
+				f"({differences})",
+				file=sys.stderr,
+			)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
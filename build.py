@@ -3,7 +3,8 @@
 Build script for ImageMagick GUI
 
 This script helps build and package the ImageMagick GUI application
-for distribution.
+for distribution. ``python build.py benchmark [options]`` runs the
+conversion benchmarks instead (see benchmark.py).
 """
 
 import subprocess
@@ -112,8 +113,19 @@ def test_package():
 	return True
 
 
+def run_benchmarks(argv):
+	"""Run the conversion benchmarks with the given arguments."""
+	print("⏱️  Running conversion benchmarks...")
+	import benchmark
+
+	return benchmark.main(argv)
+
+
 def main():
 	"""Main build process."""
+	if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+		sys.exit(run_benchmarks(sys.argv[2:]))
+
 	print("🚀 ImageMagick GUI - Build Process")
 	print("=" * 50)
 
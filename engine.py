@@ -0,0 +1,1937 @@
+#!/usr/bin/env python3
+"""
+Headless conversion engine
+
+GUI-independent conversion logic shared by the tkinter application and the
+``imagemagick-gui --headless`` command line. Nothing in this module imports
+tkinter, so it can run on machines without a display (or without Tk at all).
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import glob
+import heapq
+import itertools
+import json
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from backend import (
+	ConversionError,
+	ERROR_CANCELLED,
+	ERROR_FAILED,
+	ERROR_MISSING_BINARY,
+	ERROR_UNSUPPORTED_OUTPUT,
+	ProcessGroup,
+	ProcessStats,
+	resolve_backend,
+)
+from eventloop import shared_loop
+from fastpath import (
+	PILLOW_AVAILABLE,
+	PILLOW_VERSION,
+	can_convert_in_process,
+	convert_in_process,
+)
+from imageinfo import count_pages, read_header_info
+from journal import BatchJournal, find_batch
+from manifest import ManifestSet
+from outputs import OutputSpec, fan_out_options, parse_output_specs
+from pages import (
+	MIN_SPLIT_PAGES,
+	MULTI_PAGE_FORMATS,
+	PAGED_EXTENSIONS,
+	PARTS_PER_WORKER,
+	VECTOR_EXTENSIONS,
+	PagedInput,
+	PagePart,
+	numbered_output_pattern,
+	output_size,
+	page_output_path,
+)
+from progress import ProgressSnapshot, ProgressTracker
+from resources import (
+	candidate_mixes,
+	large_image_limits,
+	large_image_threshold,
+	limits_for,
+	recommended_limits,
+	recommended_workers,
+	save_calibration,
+)
+from scanner import walk_images
+from store import MAX_STORE_BYTES, OutputStore, unshare_output
+from tracing import BatchTrace, format_summary
+from wandpool import WAND_AVAILABLE, WandPool
+
+
+OUTPUT_FORMATS = ["png", "jpg", "jpeg", "bmp", "tiff", "gif", "webp", "pdf"]
+# Seconds between progress events in headless mode
+PROGRESS_INTERVAL = 1.0
+
+# Per-file timeouts grow with input size: the floor plus the time needed at
+# these (deliberately pessimistic) rates, capped at the ceiling
+TIMEOUT_FLOOR = 15.0
+TIMEOUT_CEILING = 3600.0
+TIMEOUT_BYTES_PER_SECOND = 2 * 1024 * 1024
+TIMEOUT_PIXELS_PER_SECOND = 5_000_000
+# Large-image mode keeps most of the pixel cache on disk, which is slower
+LARGE_IMAGE_TIMEOUT_FACTOR = 4
+# Tile size of TIFFs written in large-image mode, so readers can stream them
+LARGE_IMAGE_TIFF_TILE = "256x256"
+
+# Inputs below this size are grouped into shared ImageMagick invocations
+SMALL_FILE_BYTES = 512 * 1024
+GROUP_MAX_FILES = 64
+GROUP_MAX_BYTES = 8 * 1024 * 1024
+# Keep well below the Windows command line limit of 32767 characters
+GROUP_MAX_ARGV_CHARS = 24000
+# Units planned ahead per worker; queued units cost no thread while they wait
+QUEUED_UNITS_PER_WORKER = 4
+# In input order, no unit is started while this many results per worker are
+# held back behind a slow earlier file, so that they stay bounded
+HELD_RESULTS_PER_WORKER = GROUP_MAX_FILES
+
+# Order in which planned units are started (ConversionEngine.schedule)
+SCHEDULE_INPUT = "input"  # As listed; results are reported in that order
+SCHEDULE_LARGEST = "largest"  # Costliest first, to shorten the batch
+SCHEDULE_SMALLEST = "smallest"  # Cheapest first, for early results
+SCHEDULES = [SCHEDULE_INPUT, SCHEDULE_LARGEST, SCHEDULE_SMALLEST]
+# Units planned ahead when ordering by cost, so that most of a batch is known
+SCHEDULE_LOOKAHEAD = 10000
+# The planner keeps planning for up to this long before units are started,
+# so that the first units started are the costliest (or cheapest) of many
+SCHEDULE_PLAN_SECONDS = 0.05
+# Pixels of a letter-size page at 72 DPI: the cost of a vector page, whose
+# header gives no pixel count
+VECTOR_PAGE_PIXELS = 612 * 792
+
+# What converted a file, reported as ConversionResult.backend
+BACKEND_IMAGEMAGICK = "imagemagick"
+BACKEND_MAGICKWAND = "magickwand"
+BACKEND_PILLOW = "pillow"
+# Output taken from the output store (store.py) rather than converted
+BACKEND_STORE = "store"
+
+# The worker slot a batch runs the current unit in, whether on the event loop
+# or in a thread; reported as ConversionResult.worker
+_worker_slot = contextvars.ContextVar("worker_slot", default=None)
+
+
+def _worker_name():
+	return _worker_slot.get() or threading.current_thread().name
+
+
+class ConversionResult:
+	"""Outcome of converting one input file"""
+
+	def __init__(self, index, input_path, output_path, error=None, skipped=False):
+		self.index = index
+		self.input_path = input_path
+		self.output_path = output_path
+		self.error = error  # ConversionError, or None on success
+		self.skipped = skipped  # Output was already up to date
+		self.input_bytes = 0
+		self.pixels = 0  # From the input's header; 0 when unknown
+		# Timings (see tracing.BatchTrace). Files converted together in one
+		# ImageMagick call share its wall, spawn and CPU time equally.
+		self.started = None  # time.perf_counter() when the file started
+		self.elapsed = 0.0  # Wall seconds spent on this file
+		self.queue_wait = 0.0  # Seconds queued before a worker picked it up
+		self.spawn_time = 0.0  # Seconds spent starting ImageMagick
+		self.cpu_time = None  # ImageMagick's CPU seconds, None when unknown
+		self.output_bytes = 0
+		self.worker = ""  # Name of the worker slot (or thread) that converted it
+		self.large_image = False  # Converted in large-image mode
+		self.backend = ""  # BACKEND_* constant of what converted it
+		# Why a faster path (Pillow, page ranges) was not used for a file it
+		# was expected to handle
+		self.fallback = None
+		self.page_parts = 0  # Page ranges converted in parallel; 0 if not split
+		# Outputs written one per page (out-0.png, out-1.png...); 0 when the
+		# output is a single file
+		self.numbered_pages = 0
+		# How an output taken from the store was placed: "reflink", "hardlink"
+		# or "copy"
+		self.reused = None
+		# Paths of the outputs written besides output_path (engine.outputs)
+		self.extra_outputs = []
+
+	@property
+	def success(self):
+		return self.error is None
+
+	@property
+	def cancelled(self):
+		return self.error is not None and self.error.kind == ERROR_CANCELLED
+
+	@property
+	def status(self):
+		if self.error is not None:
+			return "cancelled" if self.cancelled else "failed"
+		return "skipped" if self.skipped else "ok"
+
+	def to_dict(self):
+		data = {
+			"index": self.index,
+			"input": str(self.input_path),
+			"output": str(self.output_path),
+			"status": self.status,
+			"input_bytes": self.input_bytes,
+			"pixels": self.pixels,
+			"output_bytes": self.output_bytes,
+			"elapsed": round(self.elapsed, 6),
+			"queue_wait": round(self.queue_wait, 6),
+			"spawn_time": round(self.spawn_time, 6),
+			"cpu_time": None if self.cpu_time is None else round(self.cpu_time, 6),
+			"backend": self.backend,
+			"large_image": self.large_image,
+		}
+		if self.fallback is not None:
+			data["fallback"] = self.fallback
+		if self.page_parts:
+			data["page_parts"] = self.page_parts
+		if self.numbered_pages:
+			data["numbered_pages"] = self.numbered_pages
+		if self.reused is not None:
+			data["reused"] = self.reused
+		if self.extra_outputs:
+			data["extra_outputs"] = [str(path) for path in self.extra_outputs]
+		if self.error is not None:
+			data["error_kind"] = self.error.kind
+			data["error"] = str(self.error)
+		return data
+
+
+class ConversionEngine:
+	"""Convert files with ImageMagick using a fixed set of settings
+
+	The settings are plain values captured at construction time, so an
+	engine can be handed to worker threads without touching any GUI state.
+	"""
+
+	def __init__(
+		self,
+		backend=None,
+		output_format="png",
+		outputs=None,
+		output_dir=None,
+		add_suffix=True,
+		max_workers=None,
+		min_timeout=TIMEOUT_FLOOR,
+		max_timeout=TIMEOUT_CEILING,
+		group_small_files=True,
+		incremental=False,
+		limits=None,
+		use_pillow=True,
+		use_wand=False,
+		scratch_dir=None,
+		large_image_pixels=None,
+		split_pages=True,
+		separate_pages=False,
+		density=None,
+		dedupe=False,
+		store_dir=None,
+		store_max_bytes=MAX_STORE_BYTES,
+		schedule=SCHEDULE_INPUT,
+	):
+		self.backend = backend if backend is not None else resolve_backend()
+		# Output specs (outputs.py) written for every input from one decode;
+		# the first is the primary output, the one results and manifests name
+		self.outputs = [
+			spec if isinstance(spec, OutputSpec) else OutputSpec.parse(spec)
+			for spec in outputs or [output_format]
+		]
+		self.output_format = self.outputs[0].format
+		# Only plain format conversions can skip the magick command line
+		simple = len(self.outputs) == 1 and self.outputs[0].size is None
+		self.output_dir = output_dir
+		self.add_suffix = add_suffix
+		self.max_workers = max(1, max_workers or recommended_workers(self.backend))
+		# ImageMagick threads and memory per process (resources.ResourceLimits)
+		self.limits = limits or recommended_limits(self.backend, self.max_workers)
+		self._limit_args = self.limits.arguments()
+		self.min_timeout = min_timeout
+		self.max_timeout = max(min_timeout, max_timeout)
+		# Every ImageMagick process started by this engine, for cancel()
+		self.processes = ProcessGroup()
+		self.group_small_files = group_small_files
+		# Output manifests, used to skip up-to-date files in incremental mode
+		self.manifests = ManifestSet() if incremental else None
+		# Convert simple files in-process when Pillow is installed (fastpath.py)
+		self.use_pillow = use_pillow and PILLOW_AVAILABLE and simple
+		# Convert the rest with MagickWand worker processes instead of running
+		# magick for each file (wandpool.py), when Wand is installed
+		self.wand = None
+		if use_wand and WAND_AVAILABLE and simple:
+			self.wand = WandPool(self.max_workers, self.limits)
+		# Inputs with at least this many pixels (by their header) are converted
+		# in large-image mode, keeping their pixel cache in ``scratch_dir``
+		self.scratch_dir = scratch_dir or tempfile.gettempdir()
+		self.large_image_pixels = large_image_pixels or large_image_threshold(
+			self.backend, self.limits
+		)
+		self._large_image_args = self._large_image_settings()
+		# Convert multi-page PDFs and TIFFs as page ranges on several workers
+		self.split_pages = split_pages
+		# Write one output per page, also in formats that hold several pages
+		self.separate_pages = separate_pages
+		self._output_options = []
+		if separate_pages and any(
+			spec.format in MULTI_PAGE_FORMATS for spec in self.outputs
+		):
+			self._output_options = ["+adjoin"]
+		# Resolution (DPI) at which PDFs and other vector inputs are rasterized;
+		# None for ImageMagick's default of 72
+		self.density = density
+		# Convert each distinct (contents, settings) once, reusing outputs from
+		# earlier files and batches (store.py)
+		self.store = OutputStore(store_dir, store_max_bytes) if dedupe else None
+		# SCHEDULE_* order in which units are started, by their estimated cost
+		self.schedule = schedule
+		# Set to a BatchJournal to record each file's state (journal.py); it is
+		# closed when the batch ends. The caller add()s the batch's files to it
+		# up front, so an interrupted batch lists the files not started yet
+		self.journal = None
+
+	def _input_settings(self, input_path):
+		"""Command line settings for reading one input (its density)"""
+		if self.density and Path(input_path).suffix.lower() in VECTOR_EXTENSIONS:
+			return ["-density", f"{self.density:g}"]
+		return []
+
+	def _large_image_settings(self):
+		"""Command line settings for an input converted in large-image mode"""
+		limits = large_image_limits(self.limits, self.scratch_dir)
+		args = limits.arguments()
+		args += ["-define", f"registry:temporary-path={self.scratch_dir}"]
+		if any(spec.format in ("tif", "tiff") for spec in self.outputs):
+			args += ["-define", f"tiff:tile-geometry={LARGE_IMAGE_TIFF_TILE}"]
+		return args
+
+	def is_large_image(self, pixels):
+		"""Whether an input of ``pixels`` pixels needs large-image mode"""
+		return pixels >= self.large_image_pixels
+
+	def output_path_for(self, input_path, spec=None):
+		"""Build the output path for an input file (of its primary output)"""
+		spec = spec or self.outputs[0]
+		input_file = Path(input_path)
+		directory = Path(self.output_dir) if self.output_dir else input_file.parent
+		stem = f"{input_file.stem}_converted" if self.add_suffix else input_file.stem
+		return directory / f"{stem}{spec.name_suffix()}.{spec.format}"
+
+	def extra_output_paths(self, input_path):
+		"""The paths of an input's outputs besides the primary one"""
+		return [self.output_path_for(input_path, spec) for spec in self.outputs[1:]]
+
+	def _write_options(self, input_path):
+		"""Options after the input: page options, the other outputs, the resize
+
+		Raises ConversionError if an output format cannot be written.
+		"""
+		extras = list(zip(self.outputs[1:], self.extra_output_paths(input_path)))
+		for spec, output_path in extras:
+			if self.backend is not None and not self.backend.can_write(spec.format):
+				raise ConversionError(ERROR_UNSUPPORTED_OUTPUT, spec.format.upper())
+			unshare_output(output_path)
+		return [
+			*self._output_options,
+			*fan_out_options(extras),
+			*self.outputs[0].resize_options(),
+		]
+
+	@property
+	def cancelled(self):
+		return self.processes.cancelled
+
+	def cancel(self):
+		"""Stop the conversion: kill running ImageMagick processes, drop queued work
+
+		Safe to call from any thread. Files that were not converted are
+		reported with a "cancelled" error.
+		"""
+		self.processes.cancel()
+		if self.wand is not None:
+			self.wand.cancel()
+
+	def close(self):
+		"""Stop the MagickWand workers, if any; call when no conversion runs"""
+		if self.wand is not None:
+			self.wand.close()
+
+	def timeout_for(self, input_bytes, pixels):
+		"""Return the timeout in seconds for an input of the given size"""
+		timeout = self.min_timeout + estimate_cost(input_bytes, pixels)
+		return min(timeout, self.max_timeout)
+
+	def _job_cost(self, jobs):
+		"""Estimated seconds a unit of work takes, for scheduling"""
+		if not isinstance(jobs, PagePart):
+			return sum(estimate_cost(*measure_input(path)) for _, path in jobs)
+		paged = jobs.paged
+		share = jobs.pages / paged.pages
+		input_bytes, pixels = paged.measure  # Of all pages
+		pixels *= share
+		if Path(paged.input_path).suffix.lower() in VECTOR_EXTENSIONS:
+			density = self.density or 72
+			pixels = jobs.pages * VECTOR_PAGE_PIXELS * (density / 72) ** 2
+		return estimate_cost(input_bytes * share, pixels)
+
+	def conversion_settings(self):
+		"""Settings that affect output contents, recorded in the manifest"""
+		settings = {"format": self.output_format}
+		if len(self.outputs) > 1 or self.outputs[0].size:
+			settings["outputs"] = [str(spec) for spec in self.outputs]
+		if self.density:
+			settings["density"] = self.density
+		if self._output_options:
+			settings["separate_pages"] = True
+		return settings
+
+	def batch_settings(self):
+		"""The constructor arguments that decide where and how files are converted
+
+		Journaled with a batch, so that resuming it converts the remaining
+		files the same way.
+		"""
+		return {
+			"output_format": self.output_format,
+			"outputs": [str(spec) for spec in self.outputs],
+			"output_dir": str(self.output_dir) if self.output_dir else None,
+			"add_suffix": self.add_suffix,
+			"incremental": self.manifests is not None,
+			"split_pages": self.split_pages,
+			"separate_pages": self.separate_pages,
+			"density": self.density,
+			"dedupe": self.store is not None,
+		}
+
+	def _store_settings(self, input_path):
+		"""What, besides the input's contents, decides an output's contents
+
+		That includes what converts the input: Pillow, MagickWand and the
+		magick command write different bytes with the same settings.
+		"""
+		settings = self.conversion_settings()
+		settings["imagemagick"] = self.backend.version if self.backend else ""
+		settings["producer"] = self._producer(input_path)
+		if settings["producer"] == BACKEND_PILLOW:
+			settings["pillow"] = PILLOW_VERSION
+		return settings
+
+	def _producer(self, input_path):
+		"""The BACKEND_* constant of what _convert_file() converts an input with
+
+		Judged before converting it, like _convert_file() does, so files
+		Pillow turns down after all are stored under "pillow" too, which
+		only keeps them from being shared with runs without Pillow.
+		"""
+		if self.use_pillow and can_convert_in_process(input_path, self.output_format):
+			return BACKEND_PILLOW
+		if self.wand is not None and not self._input_settings(input_path):
+			return BACKEND_MAGICKWAND
+		return BACKEND_IMAGEMAGICK
+
+	def convert_file(self, input_path, index=0, measure=None):
+		"""Convert a single file and return its ConversionResult
+
+		``measure`` is the input's ``(bytes, pixels)`` if already known.
+		"""
+		if measure is None:
+			measure = measure_input(input_path)
+		stats = ProcessStats()
+		large = self.is_large_image(measure[1])
+		timeout = self._file_timeout(measure, large)
+		started = time.perf_counter()
+		result = self._convert_file(input_path, index, timeout, stats, large)
+		return self._timed_result(result, started, stats, measure)
+
+	async def _convert_file_async(self, input_path, index, measure):
+		"""convert_file() with ImageMagick, waiting for it on the event loop"""
+		stats = ProcessStats()
+		large = self.is_large_image(measure[1])
+		output_path = self.output_path_for(input_path)
+		settings = self._large_image_args if large else self._limit_args
+		unshare_output(output_path)
+		started = time.perf_counter()
+		try:
+			await self.backend.convert_async(
+				input_path,
+				output_path,
+				options=self._write_options(input_path),
+				timeout=self._file_timeout(measure, large),
+				group=self.processes,
+				settings=settings + self._input_settings(input_path),
+				stats=stats,
+			)
+			error = None
+		except ConversionError as e:
+			error = e
+		result = self._file_result(index, input_path, output_path, error)
+		result.backend = BACKEND_IMAGEMAGICK
+		result.large_image = large
+		return self._timed_result(result, started, stats, measure)
+
+	def _file_timeout(self, measure, large):
+		timeout = self.timeout_for(*measure)
+		if large:
+			timeout = min(timeout * LARGE_IMAGE_TIMEOUT_FACTOR, self.max_timeout)
+		return timeout
+
+	def _timed_result(self, result, started, stats, measure):
+		"""Fill in the timings and sizes of a single file's result"""
+		result.started = started
+		result.elapsed = time.perf_counter() - started
+		result.spawn_time = stats.spawn
+		result.cpu_time = stats.cpu_time
+		result.worker = _worker_name()
+		result.input_bytes, result.pixels = measure
+		if result.success:
+			result.output_bytes, result.numbered_pages = output_size(result.output_path)
+			result.output_bytes += sum(
+				output_size(path)[0] for path in result.extra_outputs
+			)
+		return result
+
+	def _file_result(self, index, input_path, output_path, error):
+		"""The result of an ImageMagick call that raised ``error`` (None if none)"""
+		extras = self.extra_output_paths(input_path)
+		if error is None:
+			missing = [
+				path for path in [output_path, *extras] if not _output_written(path)
+			]
+			if missing == [output_path]:
+				error = ConversionError(ERROR_FAILED, "no output file was written")
+			elif missing:
+				error = ConversionError(ERROR_FAILED, f"{missing[0].name} was not written")
+		result = ConversionResult(index, input_path, output_path, error)
+		result.extra_outputs = extras
+		return result
+
+	def _convert_file(self, input_path, index, timeout, stats=None, large=False):
+		output_path = self.output_path_for(input_path)
+		fallback = None
+		if (
+			not large
+			and self.use_pillow
+			and can_convert_in_process(input_path, self.output_format)
+		):
+			if self.cancelled:
+				error = ConversionError(ERROR_CANCELLED)
+				return ConversionResult(index, input_path, output_path, error)
+			try:
+				if convert_in_process(input_path, output_path, self.output_format):
+					result = ConversionResult(index, input_path, output_path)
+					result.backend = BACKEND_PILLOW
+					return result
+			except Exception as e:
+				fallback = f"Pillow failed: {e}"
+
+		# Large images need per-file limits, and density and page options are
+		# command line settings too, which only the magick command takes (as
+		# are extra outputs, but then the engine has no MagickWand workers)
+		input_settings = self._input_settings(input_path)
+		converter = self.wand
+		if large or input_settings or self._output_options or self.wand is None:
+			converter = self.backend
+		if converter is None:
+			error = ConversionError(ERROR_MISSING_BINARY)
+			return ConversionResult(index, input_path, output_path, error)
+		settings = self._large_image_args if large else self._limit_args
+		unshare_output(output_path)
+		try:
+			converter.convert(
+				input_path,
+				output_path,
+				options=self._write_options(input_path),
+				timeout=timeout,
+				group=self.processes,
+				settings=settings + input_settings,
+				stats=stats,
+			)
+			error = None
+		except ConversionError as e:
+			error = e
+		result = self._file_result(index, input_path, output_path, error)
+		result.backend = (
+			BACKEND_MAGICKWAND if converter is self.wand else BACKEND_IMAGEMAGICK
+		)
+		result.fallback = fallback
+		result.large_image = large
+		return result
+
+	def convert_group(self, jobs, measures):
+		"""Convert several small files with a single ImageMagick invocation
+
+		``jobs`` is a list of ``(index, input_path)`` and ``measures`` maps
+		each index to the input's ``(bytes, pixels)``. Each file's outcome is
+		decided by whether its output was written; files whose output is
+		missing afterwards are retried on their own so that their error is
+		reported (and classified) individually. Large images (which compress
+		well enough to be small files), inputs read with settings of their
+		own (a density) and files that Pillow can convert are converted on
+		their own instead.
+		"""
+		alone, jobs = self._split_group(jobs, measures, self.use_pillow)
+		results = [
+			self.convert_file(path, index, measures[index]) for index, path in alone
+		]
+		if not self._can_group(jobs):
+			return results + [
+				self.convert_file(path, index, measures[index]) for index, path in jobs
+			]
+
+		pairs, before, argv, timeout = self._group_command(jobs, measures)
+		stats = ProcessStats()
+		started = time.perf_counter()
+		try:
+			self.backend.run(argv, timeout=timeout, group=self.processes, stats=stats)
+		except ConversionError:
+			pass  # Attributed per file below
+		converted, missing = self._group_results(
+			jobs, pairs, before, measures, started, stats
+		)
+		return (
+			results
+			+ converted
+			+ [self.convert_file(path, index, measures[index]) for index, path in missing]
+		)
+
+	async def _convert_group_async(self, jobs, measures):
+		"""convert_group() for files only ImageMagick converts, on the event loop"""
+		alone, jobs = self._split_group(jobs, measures, pillow=False)
+		if not self._can_group(jobs):
+			alone += jobs
+			jobs = []
+		results = []
+		if jobs:
+			pairs, before, argv, timeout = self._group_command(jobs, measures)
+			stats = ProcessStats()
+			started = time.perf_counter()
+			try:
+				await self.backend.run_async(
+					argv, timeout=timeout, group=self.processes, stats=stats
+				)
+			except ConversionError:
+				pass  # Attributed per file below
+			results, missing = self._group_results(
+				jobs, pairs, before, measures, started, stats
+			)
+			alone += missing
+		for index, path in alone:
+			results.append(await self._convert_file_async(path, index, measures[index]))
+		return results
+
+	def _split_group(self, jobs, measures, pillow):
+		"""Split jobs into ``(alone, grouped)``, by whether they share a call"""
+		alone = []
+		grouped = []
+		for index, path in jobs:
+			if (
+				self.is_large_image(measures[index][1])
+				or self._input_settings(path)
+				or (pillow and can_convert_in_process(path, self.output_format))
+			):
+				alone.append((index, path))
+			else:
+				grouped.append((index, path))
+		return alone, grouped
+
+	def _can_group(self, jobs):
+		return not (
+			len(jobs) <= 1
+			or self.backend is None
+			or self.wand is not None  # Starts no process per file to save
+			# Fails fast
+			or not all(self.backend.can_write(spec.format) for spec in self.outputs)
+		)
+
+	def _group_command(self, jobs, measures):
+		"""``(pairs, before, argv, timeout)`` of the magick call for a group"""
+		pairs = [(path, self.output_path_for(path)) for _, path in jobs]
+		for _, output_path in pairs:
+			unshare_output(output_path)
+		before = [_stat_signature(output_path) for _, output_path in pairs]
+		argv = self.backend.convert_group_command(
+			pairs,
+			settings=self._limit_args,
+			pair_options=[self._write_options(path) for path, _ in pairs],
+		)
+		timeout = min(
+			sum(self.timeout_for(*measures[index]) for index, _ in jobs),
+			self.max_timeout,
+		)
+		return pairs, before, argv, timeout
+
+	def _group_results(self, jobs, pairs, before, measures, started, stats):
+		"""Results of a group's magick call, and the jobs whose output is missing"""
+		share = (time.perf_counter() - started) / len(jobs)
+		worker = _worker_name()
+		results = []
+		missing = []
+		for position, ((index, input_path), (_, output_path), old) in enumerate(
+			zip(jobs, pairs, before)
+		):
+			new = _stat_signature(output_path)
+			extras = self.extra_output_paths(input_path)
+			# The primary output is written last, after the input's others
+			if new is None or new == old or not all(map(_output_written, extras)):
+				missing.append((index, input_path))
+				continue
+			result = ConversionResult(index, input_path, output_path)
+			result.extra_outputs = extras
+			result.input_bytes, result.pixels = measures[index]
+			# Laid end to end, so a timeline shows the call's files in order
+			result.started = started + position * share
+			result.elapsed = share
+			result.spawn_time = stats.spawn / len(jobs)
+			if stats.cpu_time is not None:
+				result.cpu_time = stats.cpu_time / len(jobs)
+			result.output_bytes = new[0] + sum(output_size(path)[0] for path in extras)
+			result.worker = worker
+			result.backend = BACKEND_IMAGEMAGICK
+			results.append(result)
+		return results, missing
+
+	def _runs_in_thread(self, jobs):
+		"""Whether a unit does blocking work besides waiting for ImageMagick
+
+		Those units run on the worker threads: page ranges (which join their
+		parts), and conversions with MagickWand, the output store or
+		manifests (which hash inputs). Files that Pillow converts are found
+		once the unit is measured, see _measure_unit().
+		"""
+		return (
+			isinstance(jobs, PagePart)
+			or self.backend is None
+			or self.wand is not None
+			or self.store is not None
+			or self.manifests is not None
+		)
+
+	def _measure_unit(self, jobs):
+		"""Measure a unit's inputs; None if Pillow converts any of them"""
+		if self.use_pillow and any(
+			can_convert_in_process(path, self.output_format) for _, path in jobs
+		):
+			return None
+		return {index: measure_input(path) for index, path in jobs}
+
+	def _run_unit(self, jobs, queued=None):
+		"""Convert one unit of work and measure its inputs
+
+		``queued`` is the time.perf_counter() at which the unit was queued.
+		"""
+		if isinstance(jobs, PagePart):
+			return self._run_page_part(jobs, queued)
+		queue_wait = time.perf_counter() - queued if queued is not None else 0.0
+		measures = {index: measure_input(path) for index, path in jobs}
+		if self.cancelled:
+			results = self._cancelled_results(jobs)
+		else:
+			results = self._convert_unit(jobs, measures)
+		return self._unit_results(results, measures, queue_wait)
+
+	async def _run_unit_async(self, jobs, queued, measures):
+		"""_run_unit() for a unit only ImageMagick converts, on the event loop"""
+		queue_wait = time.perf_counter() - queued
+		if self.cancelled:
+			results = self._cancelled_results(jobs)
+		else:
+			results = await self._convert_group_async(jobs, measures)
+		return self._unit_results(results, measures, queue_wait)
+
+	def _cancelled_results(self, jobs):
+		return [
+			ConversionResult(
+				index,
+				input_path,
+				self.output_path_for(input_path),
+				ConversionError(ERROR_CANCELLED),
+			)
+			for index, input_path in jobs
+		]
+
+	@staticmethod
+	def _unit_results(results, measures, queue_wait):
+		for result in results:
+			result.input_bytes, result.pixels = measures[result.index]
+			result.queue_wait = queue_wait
+		return results
+
+	def _run_page_part(self, part, queued=None):
+		"""Convert one page range of a PagedInput
+
+		The worker that finishes the last range completes the input and
+		returns its result; the others return nothing.
+		"""
+		paged = part.paged
+		part.started = time.perf_counter()
+		if queued is not None:
+			part.queue_wait = part.started - queued
+		part.worker = _worker_name()
+		stats = ProcessStats()
+		try:
+			if self.cancelled:
+				raise ConversionError(ERROR_CANCELLED)
+			self._convert_page_range(part, stats)
+		except ConversionError as e:
+			part.error = e
+		except Exception as e:  # Reported for the input once every range is done
+			part.error = ConversionError(ERROR_FAILED, str(e))
+		part.elapsed = time.perf_counter() - part.started
+		part.spawn_time = stats.spawn
+		part.cpu_time = stats.cpu_time
+		if not paged.finish():
+			return []
+		try:
+			return [self._finish_pages(paged)]
+		finally:
+			paged.remove_part_dir()
+
+	def _convert_page_range(self, part, stats):
+		"""Write a range's numbered outputs, or its pages for joining"""
+		paged = part.paged
+		input_bytes, pixels = paged.measure
+		part_pixels = pixels * part.pages // paged.pages
+		large = self.is_large_image(part_pixels)
+		timeout = self.timeout_for(input_bytes, part_pixels)
+		if large:
+			timeout = min(timeout * LARGE_IMAGE_TIMEOUT_FACTOR, self.max_timeout)
+		settings = self._large_image_args if large else self._limit_args
+		if paged.numbered:
+			# Scene numbers, and so output names, continue from the range's start
+			options = ["-scene", str(part.first), *self._output_options]
+			output_path = numbered_output_pattern(paged.output_path)
+			for page in range(part.first, part.last + 1):
+				unshare_output(page_output_path(paged.output_path, page))
+		else:
+			options = []
+			output_path = part.part_path
+		self.backend.convert(
+			part.source,
+			output_path,
+			options=options,
+			timeout=timeout,
+			group=self.processes,
+			settings=settings + self._input_settings(paged.input_path),
+			stats=stats,
+		)
+
+	def _finish_pages(self, paged):
+		"""Join an input's converted ranges into its result
+
+		If a range failed, the input is converted again in one piece, so
+		that a failure is reported (and classified) as for any other file.
+		"""
+		parts = paged.parts
+		started = min(part.started for part in parts)
+		error = paged.error
+		join_stats = ProcessStats()
+		if error is None and not paged.numbered:
+			input_bytes, pixels = paged.measure
+			large = self.is_large_image(pixels)
+			part_paths = [part.part_path for part in parts]
+			part_bytes = sum(os.path.getsize(path) for path in part_paths)
+			timeout = self.timeout_for(part_bytes, pixels)
+			if large:
+				timeout = min(timeout * LARGE_IMAGE_TIMEOUT_FACTOR, self.max_timeout)
+			argv = self.backend.command(
+				"convert",
+				*(self._large_image_args if large else self._limit_args),
+				*part_paths,
+				str(paged.output_path),
+			)
+			unshare_output(paged.output_path)
+			try:
+				self.backend.run(
+					argv, timeout=timeout, group=self.processes, stats=join_stats
+				)
+			except ConversionError as e:
+				error = e
+
+		if error is not None and error.kind != ERROR_CANCELLED and not self.cancelled:
+			result = self.convert_file(paged.input_path, paged.index, paged.measure)
+			result.fallback = f"converting page ranges failed: {error}"
+		else:
+			result = ConversionResult(
+				paged.index, paged.input_path, paged.output_path, error
+			)
+			result.spawn_time = sum(part.spawn_time for part in parts) + join_stats.spawn
+			cpu_times = [part.cpu_time for part in parts + [join_stats]]
+			cpu_times = [cpu for cpu in cpu_times if cpu is not None]
+			result.cpu_time = sum(cpu_times) if cpu_times else None
+			result.worker = parts[0].worker
+			result.backend = BACKEND_IMAGEMAGICK
+			result.page_parts = len(parts)
+			result.input_bytes, result.pixels = paged.measure
+			if result.success:
+				result.output_bytes, result.numbered_pages = output_size(
+					paged.output_path
+				)
+		result.started = started
+		result.elapsed = time.perf_counter() - started
+		result.queue_wait = parts[0].queue_wait
+
+		if result.success and self.manifests is not None:
+			self.manifests.for_output(result.output_path).record(
+				result.input_path,
+				self._manifest_output(result.output_path),
+				self.conversion_settings(),
+			)
+		return result
+
+	def _manifest_output(self, output_path):
+		"""The file a manifest entry tracks: the output, or its first page"""
+		first_page = page_output_path(output_path, 0)
+		if not os.path.exists(output_path) and os.path.exists(first_page):
+			return first_page
+		return output_path
+
+	def _convert_unit(self, jobs, measures):
+		"""Convert one unit of work, skipping files that are already up to date"""
+		settings = self.conversion_settings()
+		results = []
+		pending = jobs
+		if self.manifests is not None:
+			pending = []
+			for index, input_path in jobs:
+				output_path = self.output_path_for(input_path)
+				extras = self.extra_output_paths(input_path)
+				manifest = self.manifests.for_output(output_path)
+				if manifest.is_current(
+					input_path, self._manifest_output(output_path), settings
+				) and all(map(_output_written, extras)):
+					result = ConversionResult(index, input_path, output_path, skipped=True)
+					result.extra_outputs = extras
+					results.append(result)
+				else:
+					pending.append((index, input_path))
+
+		if not pending:
+			return results
+		if self.store is None:
+			converted = self.convert_group(pending, measures)
+		else:
+			converted = self._convert_deduplicated(pending, measures)
+		for result in converted:
+			if result.success and self.manifests is not None:
+				self.manifests.for_output(result.output_path).record(
+					result.input_path, self._manifest_output(result.output_path), settings
+				)
+			results.append(result)
+		return results
+
+	def _convert_deduplicated(self, jobs, measures):
+		"""Convert the files whose contents were not converted before
+
+		The others get their output from the output store. A file whose
+		contents another worker is converting waits for it, but only after
+		this unit's own conversions, so two workers never wait for each other.
+		"""
+		results = []
+		keys = {}  # index -> store key
+		owned = []  # Files converted here, their keys claimed
+		waiting = []  # Files whose key another worker claimed
+		for index, input_path in jobs:
+			key = self.store.key(input_path, self._store_settings(input_path))
+			if key is None:
+				owned.append((index, input_path))
+				continue
+			keys[index] = key
+			if not self.store.claim(key):
+				waiting.append((index, input_path))
+				continue
+			result = self._fetch_stored(index, input_path, key)
+			if result is None:
+				owned.append((index, input_path))
+			else:
+				self.store.release(key)
+				results.append(result)
+
+		try:
+			if owned:
+				for result in self.convert_group(owned, measures):
+					key = keys.get(result.index)
+					if key is not None and result.success:
+						self._store_outputs(key, result.input_path)
+					results.append(result)
+		finally:
+			for index, _ in owned:
+				if index in keys:
+					self.store.release(keys[index])
+
+		for index, input_path in waiting:
+			self.store.wait(keys[index])
+			result = self._fetch_stored(index, input_path, keys[index])
+			if result is None:  # Failed there; convert it to report its error
+				result = self.convert_file(input_path, index, measures[index])
+			results.append(result)
+		return results
+
+	def _store_entries(self, key, input_path):
+		"""``(store key, output path)`` of each of an input's outputs"""
+		paths = [self.output_path_for(input_path), *self.extra_output_paths(input_path)]
+		return [
+			(key if number == 0 else f"{key}-{number}", path)
+			for number, path in enumerate(paths)
+		]
+
+	def _store_outputs(self, key, input_path):
+		"""Store an input's fresh outputs, unless some are numbered per page"""
+		entries = self._store_entries(key, input_path)
+		if all(os.path.isfile(path) for _, path in entries):
+			for entry_key, path in entries:
+				self.store.add(entry_key, path)
+
+	def _fetch_stored(self, index, input_path, key):
+		"""A result placing the stored outputs for ``key``, or None if not stored"""
+		started = time.perf_counter()
+		methods = []
+		for entry_key, path in self._store_entries(key, input_path):
+			method = self.store.fetch(entry_key, path)
+			if method is None:
+				return None
+			methods.append(method)
+		output_path = self.output_path_for(input_path)
+		result = ConversionResult(index, input_path, output_path)
+		result.extra_outputs = self.extra_output_paths(input_path)
+		result.started = started
+		result.elapsed = time.perf_counter() - started
+		result.worker = _worker_name()
+		result.backend = BACKEND_STORE
+		result.reused = methods[0]
+		result.output_bytes = sum(
+			output_size(path)[0] for path in [output_path, *result.extra_outputs]
+		)
+		return result
+
+	def _split_pages(self, index, input_path):
+		"""Plan a multi-page PDF or TIFF as a PagedInput; None to convert it whole"""
+		if (
+			not self.split_pages
+			or self.max_workers < 2
+			or self.backend is None
+			or Path(input_path).suffix.lower() not in PAGED_EXTENSIONS
+			or not self.backend.can_write(self.output_format)  # Fails fast whole
+			# Several outputs are written from one decode of the whole input
+			or len(self.outputs) > 1
+			or self.outputs[0].size is not None
+		):
+			return None
+		measure = measure_input(input_path)
+		# Small TIFFs convert faster in one piece, but a PDF's pages take long
+		# to rasterize however small the file is
+		if measure[0] <= SMALL_FILE_BYTES and Path(input_path).suffix.lower() != ".pdf":
+			return None
+		pages = count_pages(input_path)
+		# A page count that cannot be read converts the input in one piece
+		if pages is None or pages < MIN_SPLIT_PAGES:
+			return None
+		output_path = self.output_path_for(input_path)
+		if self.manifests is not None and self.manifests.for_output(
+			output_path
+		).is_current(
+			input_path, self._manifest_output(output_path), self.conversion_settings()
+		):
+			return None  # Skipped by _convert_unit()
+
+		numbered = bool(
+			self._output_options or self.output_format not in MULTI_PAGE_FORMATS
+		)
+		paged = PagedInput(
+			index,
+			input_path,
+			output_path,
+			pages,
+			self.max_workers * PARTS_PER_WORKER,
+			numbered,
+			measure,
+		)
+		try:
+			paged.make_part_dir(self.scratch_dir)
+		except OSError:
+			return None
+		return paged
+
+	def _plan_units(self, files):
+		"""Split files into units of work: single large files or groups of small ones
+
+		Small files are grouped in input order, bounded by file count, total
+		size and command line length. Groups are also kept small enough that
+		every worker gets a share of the batch. Multi-page PDFs and TIFFs
+		are planned as a PagedInput, whose page ranges are units of their own.
+		"""
+		max_files = GROUP_MAX_FILES
+		if hasattr(files, "__len__"):
+			max_files = min(max_files, max(1, -(-len(files) // self.max_workers)))
+
+		group = []
+		group_bytes = 0
+		group_chars = 0
+		# MagickWand workers start no process per file, so grouping saves nothing
+		grouping = self.group_small_files and self.wand is None
+		for index, input_path in enumerate(files):
+			paged = self._split_pages(index, input_path)
+			if paged is not None:
+				yield paged
+				continue
+			size = None
+			if grouping:
+				try:
+					size = os.path.getsize(input_path)
+				except OSError:
+					pass
+			if size is None or size > SMALL_FILE_BYTES:
+				yield [(index, input_path)]
+				continue
+
+			chars = 2 * len(str(input_path)) + 32
+			if group and (
+				len(group) >= max_files
+				or group_bytes + size > GROUP_MAX_BYTES
+				or group_chars + chars > GROUP_MAX_ARGV_CHARS
+			):
+				yield group
+				group, group_bytes, group_chars = [], 0, 0
+			group.append((index, input_path))
+			group_bytes += size
+			group_chars += chars
+		if group:
+			yield group
+
+	def convert_many(self, files):
+		"""Convert files with a bounded number of workers, yielding results in order
+
+		The batch runs on the shared event loop (see submit_many()); this
+		generator hands its results over to the calling thread.
+		"""
+		results = queue.SimpleQueue()
+		future = self.submit_many(files, results.put)
+		future.add_done_callback(lambda _: results.put(None))
+		try:
+			while True:
+				result = results.get()
+				if result is None:
+					break
+				yield result
+		finally:
+			if not future.done():  # The consumer stopped early
+				self.cancel()
+				concurrent.futures.wait([future])
+		future.result()  # Raises whatever stopped the batch
+
+	def submit_many(self, files, on_result):
+		"""Start converting files on the shared event loop and return at once
+
+		Work is split into units by _plan_units(), and ``QUEUED_UNITS_PER_WORKER``
+		units per worker are queued at a time, ``max_workers`` of them running.
+		A unit that only runs ImageMagick is awaited on the event loop, so it
+		holds no thread while its processes run; other units run on worker
+		threads. ``files`` is iterated on a thread of its own and may block.
+
+		``on_result`` is called on the event loop's thread with each result,
+		in input order: results that finish early are held back until every
+		earlier file has been reported, so consumers see the same order as a
+		serial run. Once ``HELD_RESULTS_PER_WORKER`` results per worker are
+		held back, no unit is started until the earliest file is done.
+		Returns a concurrent.futures.Future that is done once the batch is
+		over.
+
+		After cancel(), no further work is started: files already queued are
+		reported as cancelled and the remaining files are not reported at all.
+		"""
+		return shared_loop().submit(self._convert_many(files, on_result))
+
+	async def _convert_many(self, files, on_result):
+		try:
+			await self._convert_units(self._plan_units(files), on_result)
+		finally:
+			loop = asyncio.get_running_loop()
+			await loop.run_in_executor(None, self._finish_batch)
+
+	def _finish_batch(self):
+		if self.manifests is not None:
+			self.manifests.save()
+		if self.journal is not None:
+			self.journal.close(finished=not self.cancelled)
+		self.close()
+
+	async def _convert_units(self, units, on_result):
+		loop = asyncio.get_running_loop()
+		free_slots = [f"worker-{slot}" for slot in reversed(range(self.max_workers))]
+		# Plans units (next() may wait for a folder scan), one at a time,
+		# while planned units run
+		planner = concurrent.futures.ThreadPoolExecutor(1, "engine-planner")
+		# Runs units with blocking work; threads are only started when needed
+		pool = concurrent.futures.ThreadPoolExecutor(self.max_workers, "engine-worker")
+		planning = None  # Future of the next planned unit
+		exhausted = False
+		pending = []  # Heap of (priority, sequence, unit, queued) not started yet
+		sequence = itertools.count()
+		running = {}  # asyncio.Task -> (the unit it runs, its worker slot)
+		ordered = self.schedule == SCHEDULE_INPUT
+		lookahead = self.max_workers * QUEUED_UNITS_PER_WORKER
+		if not ordered:
+			lookahead = SCHEDULE_LOOKAHEAD
+		completed = {}  # index -> ConversionResult, waiting to be reported
+		next_index = 0
+		held_limit = self.max_workers * HELD_RESULTS_PER_WORKER
+
+		try:
+			while True:
+				if (
+					planning is None
+					and not exhausted
+					and not self.cancelled
+					and len(pending) + len(running) < lookahead
+				):
+					planning = loop.run_in_executor(
+						planner,
+						self._plan_next,
+						units,
+						lookahead - len(pending) - len(running),
+					)
+				# After cancel(), queued units still run to report their files
+				# as cancelled
+				# The earliest file is always running by then, since units start
+				# in input order
+				while (
+					pending
+					and free_slots
+					and not (ordered and running and len(completed) >= held_limit)
+				):
+					_, _, jobs, queued = heapq.heappop(pending)
+					slot = free_slots.pop()
+					task = loop.create_task(self._run_job(jobs, queued, slot, pool))
+					running[task] = (jobs, slot)
+
+				waiting = set(running)
+				if planning is not None:
+					waiting.add(planning)
+				if not waiting:
+					break
+
+				done, _ = await asyncio.wait(
+					waiting, return_when=asyncio.FIRST_COMPLETED
+				)
+				if planning in done:
+					planned, exhausted = planning.result()
+					planning = None
+					# The ranges of a paged input are queued together, so that a
+					# cancelled batch never leaves an input partly queued
+					queued = time.perf_counter()
+					for jobs, cost in planned:
+						priority = {SCHEDULE_LARGEST: -cost, SCHEDULE_SMALLEST: cost}
+						heapq.heappush(
+							pending,
+							(priority.get(self.schedule, 0), next(sequence), jobs, queued),
+						)
+
+				for task in done:
+					if task not in running:
+						continue
+					jobs, slot = running.pop(task)
+					free_slots.append(slot)
+					try:
+						results = task.result()
+					except Exception as e:
+						if isinstance(jobs, PagePart):  # Only the last range raises
+							jobs = [(jobs.paged.index, jobs.paged.input_path)]
+						error = ConversionError(ERROR_FAILED, str(e))
+						results = [
+							ConversionResult(
+								index, input_path, self.output_path_for(input_path), error
+							)
+							for index, input_path in jobs
+						]
+					for result in results:
+						# Journaled as soon as done, even if reported later
+						if self.journal is not None:
+							self.journal.record(result)
+						if ordered:
+							completed[result.index] = result
+						else:
+							on_result(result)
+
+				while next_index in completed:
+					on_result(completed.pop(next_index))
+					next_index += 1
+
+			# After cancel(), files that were never queued leave gaps in the
+			# order; report the results held back behind them
+			for index in sorted(completed):
+				on_result(completed[index])
+		finally:
+			planner.shutdown(wait=False)
+			pool.shutdown(wait=False)
+
+	def _plan_next(self, units, limit):
+		"""Plan the next units, as ``([(jobs, cost)], exhausted)``
+
+		Runs on the planner thread. In input order one unit is planned at a
+		time; otherwise up to ``limit`` units are planned for up to
+		SCHEDULE_PLAN_SECONDS, with their costs estimated.
+		"""
+		ordered = self.schedule == SCHEDULE_INPUT
+		deadline = time.perf_counter() + SCHEDULE_PLAN_SECONDS
+		planned = []
+		for _ in range(max(limit, 1)):
+			unit = next(units, None)
+			if unit is None:
+				return planned, True
+			jobs = unit.parts if isinstance(unit, PagedInput) else [unit]
+			if ordered:
+				return [(job, 0.0) for job in jobs], False
+			planned.extend((job, self._job_cost(job)) for job in jobs)
+			if self.cancelled or time.perf_counter() >= deadline:
+				break
+		return planned, False
+
+	async def _run_job(self, jobs, queued, slot, pool):
+		"""Run one unit in a worker slot, and return its results"""
+		loop = asyncio.get_running_loop()
+		_worker_slot.set(slot)  # Local to this task
+		if self.journal is not None:
+			if isinstance(jobs, PagePart):
+				self.journal.running([jobs.paged.input_path])
+			else:
+				self.journal.running([path for _, path in jobs])
+		if not self._runs_in_thread(jobs):
+			measures = await loop.run_in_executor(pool, self._measure_unit, jobs)
+			if measures is not None:
+				return await self._run_unit_async(jobs, queued, measures)
+		# The thread sees this task's worker slot too
+		run = functools.partial(
+			contextvars.copy_context().run, self._run_unit, jobs, queued
+		)
+		return await loop.run_in_executor(pool, run)
+
+
+def estimate_cost(input_bytes, pixels):
+	"""Rough seconds to convert an input, at the timeouts' pessimistic rates
+
+	Good for comparing inputs (to schedule the costliest first) rather than
+	for predicting how long they take.
+	"""
+	return input_bytes / TIMEOUT_BYTES_PER_SECOND + pixels / TIMEOUT_PIXELS_PER_SECOND
+
+
+def measure_input(path):
+	"""Return ``(bytes, pixels)`` for an input file; unknown values are 0"""
+	try:
+		size = os.path.getsize(path)
+	except OSError:
+		return 0, 0
+	info = read_header_info(path)
+	if info is None or not info["width"] or not info["height"]:
+		return size, 0
+	return size, info["width"] * info["height"] * (info["pages"] or 1)
+
+
+def create_progress_tracker(files):
+	"""Create a ProgressTracker sized from the inputs' total bytes"""
+	total_bytes = 0
+	for path in files:
+		try:
+			total_bytes += os.path.getsize(path)
+		except OSError:
+			pass
+	return ProgressTracker(len(files), total_bytes)
+
+
+def calibrate(backend, files, output_format="png", mixes=None, report=None):
+	"""Measure which mix of processes and threads converts ``files`` fastest
+
+	Each ``(workers, threads)`` mix (default: resources.candidate_mixes())
+	converts the same files into a scratch directory, and
+	``report(result)`` is called with each mix's measurements. The fastest
+	mix is remembered for this machine and ImageMagick build (see
+	resources.recommended_workers()) and returned with all the results as
+	``(best, results)``; ``best`` is None if every mix failed.
+	"""
+	# Read the files once so the first mix does not pay for a cold disk cache
+	measures = [measure_input(path) for path in files]
+	for path in files:
+		try:
+			with open(path, "rb") as fh:
+				while fh.read(1024 * 1024):
+					pass
+		except OSError:
+			pass
+	pixels = sum(measure[1] for measure in measures)
+
+	results = []
+	for workers, threads in mixes or candidate_mixes():
+		with tempfile.TemporaryDirectory(prefix="imagemagick-gui-calibrate-") as scratch:
+			engine = ConversionEngine(
+				backend,
+				output_format=output_format,
+				output_dir=scratch,
+				max_workers=workers,
+				limits=limits_for(workers, threads=threads),
+				# Only ImageMagick processes honour the mix being timed
+				use_pillow=False,
+				use_wand=False,
+			)
+			started = time.monotonic()
+			converted = sum(1 for result in engine.convert_many(files) if result.success)
+			elapsed = max(time.monotonic() - started, 1e-9)
+		result = {
+			"workers": workers,
+			"threads": threads,
+			"converted": converted,
+			"seconds": elapsed,
+			"files_per_second": converted / elapsed,
+			"megapixels_per_second": pixels / 1e6 / elapsed if converted else 0.0,
+		}
+		results.append(result)
+		if report is not None:
+			report(result)
+
+	# Only mixes that converted everything are comparable
+	complete = [result for result in results if result["converted"] == len(files)]
+	if not complete:
+		return None, results
+	best = max(complete, key=lambda result: result["files_per_second"])
+	save_calibration(backend, best)
+	return best, results
+
+
+def _stat_signature(path):
+	"""Return (size, mtime_ns) of a file, or None if it does not exist"""
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return stat.st_size, stat.st_mtime_ns
+
+
+def _output_written(path):
+	"""Whether an output exists, as one file or numbered per page
+
+	Multi-page inputs in single-image formats give numbered outputs.
+	"""
+	return os.path.exists(path) or os.path.exists(page_output_path(path, 0))
+
+
+def expand_inputs(
+	patterns, recursive=False, include=(), exclude=(), max_depth=None, sniff=False
+):
+	"""Expand files, directories and glob patterns into a list of input files
+
+	Directories contribute the image files they contain (and, with
+	``recursive``, those of their subdirectories down to ``max_depth``),
+	filtered as described in scanner.walk_images(). Returns ``(files,
+	unmatched)`` where ``unmatched`` lists patterns that matched nothing.
+	"""
+	if not recursive:
+		max_depth = 0
+	files = []
+	seen = set()
+	unmatched = []
+
+	def add(path):
+		if path not in seen:
+			seen.add(path)
+			files.append(path)
+
+	for pattern in patterns:
+		before = len(files)
+		if os.path.isdir(pattern):
+			for path in walk_images(pattern, include, exclude, max_depth, sniff):
+				add(path)
+		elif glob.has_magic(pattern):
+			for path in sorted(glob.glob(pattern, recursive=True)):
+				if os.path.isfile(path):
+					add(path)
+		elif os.path.isfile(pattern):
+			add(pattern)
+		if len(files) == before:
+			unmatched.append(pattern)
+
+	return files, unmatched
+
+
+def _emit(progress, event, **fields):
+	"""Write one progress event to stdout"""
+	if progress == "json":
+		print(json.dumps({"event": event, **fields}), flush=True)
+	elif event == "file":
+		status = {"ok": "✅", "skipped": "⏭️ ", "failed": "❌", "cancelled": "🛑"}[
+			fields["status"]
+		]
+		line = f"{status} [{fields['index'] + 1}/{fields['total']}] {fields['input']}"
+		if fields["status"] in ("failed", "cancelled"):
+			line += f" - {fields['error']}"
+		elif fields["backend"]:
+			mode = ", large-image mode" if fields["large_image"] else ""
+			if "page_parts" in fields:
+				mode += f", {fields['page_parts']} page ranges"
+			if "numbered_pages" in fields:
+				mode += f", {fields['numbered_pages']} page files"
+			if "reused" in fields:
+				mode += f", {fields['reused']}"
+			if "extra_outputs" in fields:
+				mode += f", {len(fields['extra_outputs']) + 1} outputs"
+			line += f" ({fields['backend']}{mode})"
+		if "fallback" in fields:
+			line += f" [{fields['fallback']}]"
+		print(line, flush=True)
+	elif event == "resume":
+		print(
+			f"Resuming batch {fields['batch']}: {fields['remaining']} of "
+			f"{fields['total']} files left",
+			flush=True,
+		)
+	elif event == "progress":
+		print(f"[progress] {ProgressSnapshot(**fields).describe()}", flush=True)
+	elif event == "done":
+		print(
+			f"Batch conversion complete: {fields['successful']} successful, "
+			f"{fields['failed']} failed, {fields['skipped']} up to date, "
+			f"{fields['cancelled']} cancelled ({fields['elapsed']:.1f}s)",
+			flush=True,
+		)
+	elif event == "summary":
+		for line in format_summary(fields):
+			print(line, flush=True)
+	elif event == "calibration":
+		print(
+			f"{fields['workers']} jobs x {fields['threads']} threads: "
+			f"{fields['files_per_second']:.1f} files/s, "
+			f"{fields['megapixels_per_second']:.1f} MP/s",
+			flush=True,
+		)
+	elif event == "calibrated":
+		print(
+			f"Fastest: {fields['workers']} jobs x {fields['threads']} threads "
+			"(used by default from now on)",
+			flush=True,
+		)
+
+
+def _output_specs_arg(text):
+	"""Parse --format: comma-separated output specs in OUTPUT_FORMATS"""
+	try:
+		specs = parse_output_specs(text)
+	except ValueError as e:
+		raise argparse.ArgumentTypeError(str(e))
+	for spec in specs:
+		if spec.format not in OUTPUT_FORMATS:
+			raise argparse.ArgumentTypeError(
+				f"invalid format {spec.format!r} (choose from "
+				f"{', '.join(OUTPUT_FORMATS)})"
+			)
+	return specs
+
+
+def build_arg_parser():
+	parser = argparse.ArgumentParser(
+		prog="imagemagick-gui --headless",
+		description="Convert images with ImageMagick without starting the GUI.",
+	)
+	parser.add_argument(
+		"inputs", nargs="*", help="input files, directories or glob patterns"
+	)
+	parser.add_argument(
+		"-f",
+		"--format",
+		default=[OutputSpec("png")],
+		type=_output_specs_arg,
+		metavar="FORMAT[:WxH],...",
+		help="output format (default: png); give several to write them all from "
+		"one decode of each input, and a size to shrink an output to fit, e.g. "
+		"png,webp,jpg:320x320",
+	)
+	parser.add_argument(
+		"-o",
+		"--output-dir",
+		help="write outputs here instead of next to each input",
+	)
+	parser.add_argument(
+		"--no-suffix",
+		dest="add_suffix",
+		action="store_false",
+		help='do not add the "_converted" suffix to output filenames',
+	)
+	parser.add_argument(
+		"-r", "--recursive", action="store_true", help="descend into subdirectories"
+	)
+	parser.add_argument(
+		"--max-depth",
+		type=int,
+		help="with -r, descend at most this many directory levels",
+	)
+	parser.add_argument(
+		"--include",
+		action="append",
+		default=[],
+		metavar="GLOB",
+		help="only take files matching this pattern from directories (repeatable)",
+	)
+	parser.add_argument(
+		"--exclude",
+		action="append",
+		default=[],
+		metavar="GLOB",
+		help="skip files and subdirectories matching this pattern (repeatable)",
+	)
+	parser.add_argument(
+		"--sniff",
+		action="store_true",
+		help="also take files with unknown extensions whose contents are images",
+	)
+	parser.add_argument(
+		"-j",
+		"--jobs",
+		type=int,
+		help="number of parallel conversions (default: calibrated, else CPU count)",
+	)
+	parser.add_argument(
+		"--threads",
+		type=int,
+		help="ImageMagick threads per process (default: CPUs shared between jobs)",
+	)
+	parser.add_argument(
+		"--calibrate",
+		action="store_true",
+		help="time several jobs x threads mixes on the inputs and remember the "
+		"fastest, instead of converting",
+	)
+	parser.add_argument(
+		"--no-grouping",
+		dest="group_small_files",
+		action="store_false",
+		help="run one ImageMagick process per file instead of grouping small files",
+	)
+	parser.add_argument(
+		"--no-pillow",
+		dest="use_pillow",
+		action="store_false",
+		help="convert every file with ImageMagick, even when Pillow is installed",
+	)
+	parser.add_argument(
+		"--magickwand",
+		dest="use_wand",
+		action="store_true",
+		help="convert with the MagickWand library in long-lived worker processes "
+		"instead of running magick for each file (needs the Wand package)",
+	)
+	parser.add_argument(
+		"--schedule",
+		choices=SCHEDULES,
+		default=SCHEDULE_INPUT,
+		help="order in which files start: as listed (results are reported in "
+		"that order), largest first (the batch finishes sooner) or smallest "
+		"first (results come sooner), by size and pixel count (default: input)",
+	)
+	parser.add_argument(
+		"--scratch-dir",
+		metavar="DIR",
+		help="where large images keep their pixel cache (default: the "
+		"temporary directory); pick a fast disk with plenty of space",
+	)
+	parser.add_argument(
+		"--large-image-mp",
+		type=float,
+		metavar="MP",
+		help="convert inputs of at least this many megapixels in large-image "
+		"mode (default: when the pixel cache would exceed a job's memory limit)",
+	)
+	parser.add_argument(
+		"--density",
+		type=float,
+		metavar="DPI",
+		help="resolution at which PDFs and other vector inputs are rasterized "
+		"(default: ImageMagick's 72)",
+	)
+	parser.add_argument(
+		"--no-split-pages",
+		dest="split_pages",
+		action="store_false",
+		help="convert multi-page PDFs and TIFFs in one piece instead of as page "
+		"ranges on several jobs",
+	)
+	parser.add_argument(
+		"--separate-pages",
+		action="store_true",
+		help="write one output per page (out-0.tiff, out-1.tiff...) also in "
+		"formats that hold several pages",
+	)
+	parser.add_argument(
+		"--dedupe",
+		action="store_true",
+		help="convert identical inputs once and reuse the output for the other "
+		"copies and in later runs (kept in a content-addressed output store)",
+	)
+	parser.add_argument(
+		"--store-dir",
+		metavar="DIR",
+		help="where --dedupe keeps its outputs (default: the user cache directory)",
+	)
+	parser.add_argument(
+		"--store-max-mb",
+		type=int,
+		default=MAX_STORE_BYTES // (1024 * 1024),
+		metavar="MB",
+		help="evict the least recently used outputs beyond this size (default: "
+		f"{MAX_STORE_BYTES // (1024 * 1024)})",
+	)
+	parser.add_argument(
+		"--incremental",
+		action="store_true",
+		help="skip files whose output is up to date according to the manifest",
+	)
+	parser.add_argument(
+		"--resume",
+		nargs="?",
+		type=int,
+		const=0,
+		metavar="BATCH",
+		help="resume the last batch (or batch BATCH) that did not finish: convert "
+		"its files that are not done, failed ones included, with its settings; "
+		"takes no inputs",
+	)
+	parser.add_argument(
+		"--no-journal",
+		dest="journal",
+		action="store_false",
+		help="do not record the batch in the journal that --resume reads",
+	)
+	parser.add_argument(
+		"--min-timeout",
+		type=float,
+		default=TIMEOUT_FLOOR,
+		help=f"per-file timeout floor in seconds (default: {TIMEOUT_FLOOR:.0f})",
+	)
+	parser.add_argument(
+		"--max-timeout",
+		type=float,
+		default=TIMEOUT_CEILING,
+		help=f"per-file timeout ceiling in seconds (default: {TIMEOUT_CEILING:.0f})",
+	)
+	parser.add_argument(
+		"--timings",
+		action="append",
+		default=[],
+		metavar="FILE",
+		help="write per-file timings: FILE.csv, FILE.json or a Chrome trace "
+		"FILE.trace.json (repeatable)",
+	)
+	parser.add_argument(
+		"--progress",
+		choices=["json", "text"],
+		default="json",
+		help="progress output on stdout: JSON lines or plain text (default: json)",
+	)
+	return parser
+
+
+def main(argv=None):
+	"""Run a headless batch conversion; returns the process exit code"""
+	parser = build_arg_parser()
+	args = parser.parse_args(argv)
+	settings = {
+		"output_format": args.format[0].format,
+		"outputs": [str(spec) for spec in args.format],
+		"output_dir": args.output_dir,
+		"add_suffix": args.add_suffix,
+		"incremental": args.incremental,
+		"split_pages": args.split_pages,
+		"separate_pages": args.separate_pages,
+		"density": args.density,
+		"dedupe": args.dedupe,
+	}
+
+	resumed = None
+	if args.resume is not None:
+		if args.inputs:
+			parser.error("--resume takes no inputs")
+		resumed = find_batch(args.resume or None)
+		if resumed is None:
+			print("error: no unfinished batch to resume", file=sys.stderr)
+			return 2
+		files = resumed.remaining
+		# Batches journaled before there were output specs have only a format
+		settings.update({"outputs": None, **resumed.settings})
+	else:
+		if not args.inputs:
+			parser.error("the following arguments are required: inputs")
+		files, unmatched = expand_inputs(
+			args.inputs,
+			recursive=args.recursive,
+			include=args.include,
+			exclude=args.exclude,
+			max_depth=args.max_depth,
+			sniff=args.sniff,
+		)
+		for pattern in unmatched:
+			print(f"warning: no input files match {pattern!r}", file=sys.stderr)
+		if not files:
+			print("error: no input files", file=sys.stderr)
+			return 2
+
+	backend = resolve_backend()
+	if backend is None:
+		print("error: ImageMagick not found", file=sys.stderr)
+		return 2
+
+	if args.calibrate:
+		return _run_calibration(args, backend, files)
+
+	if settings["output_dir"]:
+		os.makedirs(settings["output_dir"], exist_ok=True)
+	if args.scratch_dir and not os.path.isdir(args.scratch_dir):
+		print(f"error: no such directory: {args.scratch_dir}", file=sys.stderr)
+		return 2
+	if args.density is not None and args.density <= 0:
+		print("error: --density must be positive", file=sys.stderr)
+		return 2
+
+	limits = None
+	if args.threads:
+		workers = args.jobs or recommended_workers(backend)
+		limits = limits_for(workers, threads=args.threads)
+	engine = ConversionEngine(
+		backend,
+		max_workers=args.jobs,
+		min_timeout=args.min_timeout,
+		max_timeout=args.max_timeout,
+		group_small_files=args.group_small_files,
+		limits=limits,
+		use_pillow=args.use_pillow,
+		use_wand=args.use_wand,
+		scratch_dir=args.scratch_dir,
+		large_image_pixels=(
+			int(args.large_image_mp * 1e6) if args.large_image_mp else None
+		),
+		store_dir=args.store_dir,
+		store_max_bytes=args.store_max_mb * 1024 * 1024,
+		schedule=args.schedule,
+		**settings,
+	)
+	if args.use_wand and engine.wand is None:
+		print(
+			"warning: the Wand package is not installed; running magick instead",
+			file=sys.stderr,
+		)
+	if args.journal:
+		if resumed is not None:
+			engine.journal = BatchJournal.resume(resumed.id)
+		else:
+			engine.journal = BatchJournal.create(engine.batch_settings())
+			if engine.journal is not None:
+				engine.journal.add(files)
+		if engine.journal is None:
+			print("warning: could not open the batch journal", file=sys.stderr)
+
+	def on_signal(signum, frame):
+		# Stop cleanly on the first signal; a second one interrupts as usual
+		if engine.cancelled:
+			raise KeyboardInterrupt
+		print("Cancelling...", file=sys.stderr)
+		threading.Thread(target=engine.cancel, daemon=True).start()
+
+	signal.signal(signal.SIGINT, on_signal)
+	signal.signal(signal.SIGTERM, on_signal)
+
+	total = len(files)
+	successful = 0
+	failed = 0
+	skipped = 0
+	started = time.monotonic()
+	tracker = create_progress_tracker(files)
+	trace = BatchTrace(record=bool(args.timings), schedule=engine.schedule)
+	last_report = started
+	_emit(
+		args.progress,
+		"start",
+		total=total,
+		total_bytes=tracker.total_bytes,
+		backend=backend.version,
+		pillow=engine.use_pillow,
+		magickwand=engine.wand is not None,
+		large_image_pixels=engine.large_image_pixels,
+		split_pages=engine.split_pages,
+		density=engine.density,
+		dedupe=engine.store is not None,
+		schedule=engine.schedule,
+		jobs=engine.max_workers,
+		limits=engine.limits.describe(),
+		batch=engine.journal.id if engine.journal is not None else None,
+	)
+	if resumed is not None:
+		_emit(
+			args.progress,
+			"resume",
+			batch=resumed.id,
+			remaining=len(resumed.remaining),
+			total=resumed.total,
+		)
+	for result in engine.convert_many(files):
+		if result.skipped:
+			skipped += 1
+		elif result.success:
+			successful += 1
+		elif not result.cancelled:
+			failed += 1
+		tracker.record(result.input_bytes, result.pixels)
+		trace.add(result)
+		_emit(args.progress, "file", total=total, **result.to_dict())
+
+		now = time.monotonic()
+		if now - last_report >= PROGRESS_INTERVAL:
+			last_report = now
+			_emit(args.progress, "progress", **tracker.snapshot().to_dict())
+	_emit(
+		args.progress,
+		"done",
+		total=total,
+		successful=successful,
+		failed=failed,
+		skipped=skipped,
+		# Includes files that were never started
+		cancelled=total - successful - failed - skipped,
+		elapsed=time.monotonic() - started,
+	)
+	summary = trace.summary()
+	if summary["formats"]:
+		_emit(args.progress, "summary", **summary)
+	for path in args.timings:
+		try:
+			trace.export(path)
+		except OSError as e:
+			print(f"warning: could not write {path}: {e}", file=sys.stderr)
+	if engine.cancelled:
+		return 130
+	return 0 if failed == 0 else 1
+
+
+def _run_calibration(args, backend, files):
+	"""Headless ``--calibrate``: time the mixes and report the fastest"""
+	best, _ = calibrate(
+		backend,
+		files,
+		output_format=args.format[0].format,
+		report=lambda result: _emit(args.progress, "calibration", **result),
+	)
+	if best is None:
+		print("error: no mix converted every input", file=sys.stderr)
+		return 1
+	_emit(args.progress, "calibrated", **best)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Background asyncio event loop
+
+ConversionEngine runs its batches on one asyncio event loop, on a daemon
+thread of its own shared by every engine. Waiting for an ImageMagick
+process there takes no thread, so a batch of thousands of files runs on a
+handful of threads however many processes it starts; only work that blocks
+in Python (Pillow, MagickWand, hashing) goes to worker threads.
+"""
+
+import asyncio
+import threading
+
+
+_lock = threading.Lock()
+_shared = None
+
+
+class EventLoopThread:
+	"""An asyncio event loop running forever on a daemon thread"""
+
+	def __init__(self, name="event-loop"):
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+		self.thread.start()
+
+	def _run(self):
+		asyncio.set_event_loop(self.loop)
+		self.loop.run_forever()
+
+	def submit(self, coroutine):
+		"""Run a coroutine on the loop; returns a concurrent.futures.Future
+
+		Safe to call from any thread.
+		"""
+		return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+	def stop(self):
+		"""Stop the loop and wait for its thread; call when nothing runs on it"""
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+		self.loop.close()
+
+
+def shared_loop():
+	"""The process-wide EventLoopThread, started on first use"""
+	global _shared
+	with _lock:
+		if _shared is None:
+			_shared = EventLoopThread("engine-loop")
+		return _shared
@@ -0,0 +1,151 @@
+"""
+In-process conversions with Pillow
+
+Starting a magick process costs more than converting a small PNG, JPEG,
+WebP, BMP or GIF, so when Pillow is installed the engine converts those
+itself, in its worker threads (Pillow releases the GIL while it decodes and
+encodes). Everything else goes to ImageMagick: PDFs, TIFFs and other
+formats, animations, 16-bit and float images, very large images, and any
+file Pillow fails on.
+
+Outputs follow ImageMagick's defaults so they match what ``magick in out``
+writes: JPEG quality 92 (JPEG to JPEG keeps the input's quantization),
+PNG zlib level 7, WebP quality 75, and EXIF and ICC profiles carried over.
+"""
+
+import os
+
+try:
+	from PIL import Image, __version__ as PILLOW_VERSION, features
+except ImportError:  # Optional: every file then goes to ImageMagick
+	Image = None
+	PILLOW_VERSION = None
+
+from imageinfo import read_header_info
+
+
+PILLOW_AVAILABLE = Image is not None
+
+# Output extension -> Pillow format
+OUTPUT_FORMATS = {
+	"png": "PNG",
+	"jpg": "JPEG",
+	"jpeg": "JPEG",
+	"webp": "WEBP",
+	"bmp": "BMP",
+	"gif": "GIF",
+}
+# Input formats (as reported by imageinfo) converted in-process
+INPUT_FORMATS = {"PNG", "JPEG", "WEBP", "BMP", "GIF"}
+# Pillow modes converted in-process; others (16-bit, float...) need ImageMagick
+INPUT_MODES = {"1", "L", "LA", "P", "RGB", "RGBA", "CMYK"}
+# Larger images go to ImageMagick, whose memory is bounded by -limit
+MAX_PIXELS = 50_000_000
+
+JPEG_QUALITY = 92
+PNG_COMPRESS_LEVEL = 7
+WEBP_QUALITY = 75
+# Formats whose Pillow writer takes exif= and icc_profile=
+_PROFILE_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+def _can_write(fmt):
+	if fmt == "WEBP" and not features.check("webp"):
+		return False
+	Image.init()
+	return fmt in Image.SAVE
+
+
+def can_convert_in_process(input_path, output_format):
+	"""Whether a file looks simple enough for Pillow, judging by its header
+
+	Animated GIFs cannot be told apart from their header, so
+	convert_in_process() may still decline a file this accepts.
+	"""
+	if not PILLOW_AVAILABLE:
+		return False
+	fmt = OUTPUT_FORMATS.get(output_format.lower())
+	if fmt is None or not _can_write(fmt):
+		return False
+	info = read_header_info(input_path)
+	return (
+		info is not None
+		and info["format"] in INPUT_FORMATS
+		and info["pages"] in (1, None)
+		and info["width"] * info["height"] <= MAX_PIXELS
+	)
+
+
+def _prepare(image, fmt):
+	"""Convert an image to a mode the output format can store
+
+	Alpha is dropped for JPEG and CMYK becomes RGB for every other format,
+	as ImageMagick does.
+	"""
+	mode = image.mode
+	has_alpha = mode in ("RGBA", "LA") or (
+		mode == "P" and "transparency" in image.info
+	)
+	if fmt == "JPEG":
+		if mode in ("L", "RGB", "CMYK"):
+			return image
+		return image.convert("L" if mode in ("1", "LA") else "RGB")
+	if mode == "CMYK":
+		return image.convert("RGB")
+	if fmt == "WEBP" and mode not in ("RGB", "RGBA"):
+		return image.convert("RGBA" if has_alpha else "RGB")
+	if mode == "LA" and fmt in ("BMP", "GIF"):
+		return image.convert("RGBA")
+	return image
+
+
+def convert_in_process(input_path, output_path, output_format):
+	"""Convert a file with Pillow
+
+	Returns False, without writing anything, when the file turns out to
+	need ImageMagick after all (e.g. an animation). Errors are raised as
+	they come; the caller falls back to ImageMagick. The output is written
+	under a temporary name and renamed, so a failure leaves no partial file.
+	"""
+	fmt = OUTPUT_FORMATS[output_format.lower()]
+	with Image.open(input_path) as image:
+		if (
+			image.format not in INPUT_FORMATS
+			or image.mode not in INPUT_MODES
+			or getattr(image, "n_frames", 1) > 1
+			or image.width * image.height > MAX_PIXELS
+		):
+			return False
+
+		options = {}
+		if fmt == "JPEG":
+			if image.format == "JPEG":
+				options.update(quality="keep", subsampling="keep")
+			else:
+				options["quality"] = JPEG_QUALITY
+		elif fmt == "PNG":
+			options["compress_level"] = PNG_COMPRESS_LEVEL
+		elif fmt == "WEBP":
+			options["quality"] = WEBP_QUALITY
+		if fmt in _PROFILE_FORMATS:
+			if image.info.get("exif"):
+				options["exif"] = image.info["exif"]
+			# A CMYK profile no longer applies once the pixels are RGB
+			if image.info.get("icc_profile") and (
+				image.mode != "CMYK" or fmt == "JPEG"
+			):
+				options["icc_profile"] = image.info["icc_profile"]
+
+		image.load()
+		output = _prepare(image, fmt)
+		tmp_path = f"{output_path}.part"
+		try:
+			output.save(tmp_path, format=fmt, **options)
+			os.replace(tmp_path, output_path)
+		except BaseException:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			raise
+	return True
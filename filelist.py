@@ -0,0 +1,386 @@
+"""
+Batch file list
+
+FileListModel holds the files of a batch in display order, indexed by path
+so that adding a file (including the duplicate check) and removing one
+cost O(1) per file. Sizes and dimensions are looked up lazily, for the rows
+on screen or when the list is sorted by them. FileListView shows the model
+in a Treeview that only ever holds the rows currently visible, so
+scrolling, sorting and clearing cost about the same for ten files as for
+half a million.
+"""
+
+import os
+
+try:
+	import tkinter as tk
+	from tkinter import font as tkfont, ttk
+except ImportError:  # The model works without Tk
+	tk = None
+
+from imageinfo import read_header_info
+
+
+COLUMNS = ("name", "size", "dimensions", "status")
+HEADINGS = {
+	"name": "File",
+	"size": "Size",
+	"dimensions": "Dimensions",
+	"status": "Status",
+}
+STATUS_LABELS = {
+	"": "",
+	"ok": "✅ Done",
+	"skipped": "⏭️ Up to date",
+	"failed": "❌ Failed",
+	"cancelled": "🛑 Cancelled",
+}
+# Lines scrolled per mouse wheel step
+WHEEL_LINES = 3
+
+
+def format_size(size):
+	if size < 1024 * 1024:
+		return f"{size / 1024:.0f} KB"
+	return f"{size / (1024 * 1024):.1f} MB"
+
+
+def _name_key(path):
+	# Cheaper than os.path.basename(), which matters when sorting 500k paths
+	cut = path.rfind(os.sep)
+	if os.altsep:
+		cut = max(cut, path.rfind(os.altsep))
+	return path[cut + 1 :].lower()
+
+
+class FileListModel:
+	"""Ordered, path-indexed list of the files in a batch
+
+	Files are identified by their path. Sizes, dimensions and statuses are
+	kept in dicts beside the list rather than in per-file objects, which
+	keeps adding hundreds of thousands of files fast. Only the main thread
+	changes the list; set_status() may be called from the conversion thread.
+	"""
+
+	def __init__(self):
+		self._index = set()
+		self._order = []  # Paths in display order
+		self._sizes = {}  # path -> bytes (0 if unreadable)
+		self._dimensions = {}  # path -> (width, height), (0, 0) if unknown
+		self._statuses = {}  # path -> ConversionResult.status of the last batch
+		self.sort_column = None
+		self.sort_reverse = False
+
+	def __len__(self):
+		return len(self._order)
+
+	def __contains__(self, path):
+		return path in self._index
+
+	def path_at(self, row):
+		return self._order[row]
+
+	def paths(self):
+		"""The paths in display order (do not modify the returned list)"""
+		return self._order
+
+	def window(self, top, rows):
+		"""Return ``(top, paths)`` for ``rows`` rows shown from row ``top``
+
+		``top`` is clamped so that the window stays within the list and is
+		filled where the list is long enough.
+		"""
+		top = max(0, min(top, len(self._order) - rows))
+		return top, self._order[top : top + rows]
+
+	def add(self, paths):
+		"""Append the files that are not listed yet; returns how many were added
+
+		New files go at the end, so a sorted list stops being sorted.
+		"""
+		index = self._index
+		added = []
+		for path in paths:
+			if path not in index:
+				index.add(path)
+				added.append(path)
+		if added:
+			self._order.extend(added)
+			self.sort_column = None
+		return len(added)
+
+	def remove(self, paths):
+		"""Remove files; returns how many of them were listed"""
+		removed = self._index.intersection(paths)
+		if removed:
+			self._index -= removed
+			self._order = [path for path in self._order if path not in removed]
+			for path in removed:
+				self._sizes.pop(path, None)
+				self._dimensions.pop(path, None)
+				self._statuses.pop(path, None)
+		return len(removed)
+
+	def clear(self):
+		self._index = set()
+		self._order = []
+		self._sizes = {}
+		self._dimensions = {}
+		self._statuses = {}
+		self.sort_column = None
+
+	def size(self, path):
+		size = self._sizes.get(path)
+		if size is None:
+			try:
+				size = os.path.getsize(path)
+			except OSError:
+				size = 0
+			self._sizes[path] = size
+		return size
+
+	def dimensions(self, path):
+		dimensions = self._dimensions.get(path)
+		if dimensions is None:
+			info = read_header_info(path)
+			if info is not None and info["width"] and info["height"]:
+				dimensions = (info["width"], info["height"])
+			else:
+				dimensions = (0, 0)
+			self._dimensions[path] = dimensions
+		return dimensions
+
+	def _pixels(self, path):
+		width, height = self.dimensions(path)
+		return width * height
+
+	def status(self, path):
+		return self._statuses.get(path, "")
+
+	def set_status(self, path, status):
+		if path in self._index:
+			self._statuses[path] = status
+
+	def reset_status(self):
+		self._statuses = {}
+
+	def sort(self, column, reverse=False):
+		"""Sort by a column
+
+		Sizes and dimensions that are not known yet are looked up first,
+		so the first sort by them reads every file's metadata.
+		"""
+		key = {
+			"name": _name_key,
+			"size": self.size,
+			"dimensions": self._pixels,
+			"status": self.status,
+		}[column]
+		self._order.sort(key=key, reverse=reverse)
+		self.sort_column = column
+		self.sort_reverse = reverse
+
+	def row_values(self, path):
+		"""The column values shown for a file"""
+		width, height = self.dimensions(path)
+		status = self.status(path)
+		return (
+			os.path.basename(path),
+			format_size(self.size(path)),
+			f"{width}x{height}" if width else "",
+			STATUS_LABELS.get(status, status),
+		)
+
+
+class FileListView(ttk.Frame if tk is not None else object):
+	"""Treeview showing the rows of a FileListModel that fit on screen
+
+	The Treeview holds one item per visible row; scrolling rewrites their
+	values instead of moving items, and the selection is kept here by path
+	rather than in the Treeview. ``on_select(path, row)`` is called when a
+	single file is clicked or reached with the keyboard.
+	"""
+
+	def __init__(self, parent, model, on_select=None):
+		super().__init__(parent)
+		self.model = model
+		self.on_select = on_select
+		self.top = 0  # Model row shown in the first visible row
+		self.visible = 1  # Rows that fit in the widget
+		self.selected = set()  # Paths
+		self.anchor = None  # Row where shift-click ranges start
+
+		self.columnconfigure(0, weight=1)
+		self.rowconfigure(0, weight=1)
+
+		self.tree = ttk.Treeview(
+			self, columns=COLUMNS, show="headings", selectmode="none", height=10
+		)
+		for column in COLUMNS:
+			self.tree.heading(
+				column, text=HEADINGS[column], command=lambda c=column: self.sort_by(c)
+			)
+		self.tree.column("name", width=220, stretch=True)
+		self.tree.column("size", width=80, stretch=False, anchor=tk.E)
+		self.tree.column("dimensions", width=90, stretch=False, anchor=tk.E)
+		self.tree.column("status", width=100, stretch=False)
+		self.tree.tag_configure("selected", background="#3874d8", foreground="white")
+		self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+		self.scrollbar = ttk.Scrollbar(
+			self, orient=tk.VERTICAL, command=self._on_scrollbar
+		)
+		self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+		self.tree.bind("<Configure>", self._on_resize)
+		self.tree.bind("<Map>", self._on_resize)
+		self.tree.bind("<Button-1>", self._on_click)
+		self.tree.bind("<Shift-Button-1>", lambda e: self._on_click(e, extend=True))
+		self.tree.bind("<Control-Button-1>", lambda e: self._on_click(e, toggle=True))
+		self.tree.bind("<MouseWheel>", self._on_wheel)
+		self.tree.bind("<Button-4>", lambda e: self.scroll(-WHEEL_LINES))
+		self.tree.bind("<Button-5>", lambda e: self.scroll(WHEEL_LINES))
+		self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+		self.tree.bind("<Down>", lambda e: self._move_selection(1))
+		self.tree.bind("<Prior>", lambda e: self._move_selection(-self.visible))
+		self.tree.bind("<Next>", lambda e: self._move_selection(self.visible))
+		self._ensure_rows()
+
+	def _ensure_rows(self):
+		rows = len(self.tree.get_children())
+		for n in range(rows, self.visible):
+			self.tree.insert("", tk.END, iid=f"row{n}")
+		for n in range(self.visible, rows):
+			self.tree.delete(f"row{n}")
+
+	def _row_metrics(self):
+		"""Return ``(header_height, row_height)`` in pixels"""
+		bbox = self.tree.bbox("row0")
+		if bbox:
+			return bbox[1], bbox[3]
+		# Not drawn yet: estimate from the theme and font
+		row_height = ttk.Style(self).lookup("Treeview", "rowheight")
+		try:
+			row_height = int(row_height)
+		except (TypeError, ValueError):
+			row_height = tkfont.nametofont("TkDefaultFont").metrics("linespace") + 2
+		return row_height + 4, row_height
+
+	def _on_resize(self, event=None):
+		header_height, row_height = self._row_metrics()
+		height = self.tree.winfo_height()
+		visible = max(1, (height - header_height) // max(1, row_height))
+		if visible != self.visible:
+			self.visible = visible
+			self._ensure_rows()
+			self.refresh()
+
+	def refresh(self):
+		"""Redraw the visible rows from the model"""
+		total = len(self.model)
+		self.top, paths = self.model.window(self.top, self.visible)
+		for n in range(self.visible):
+			if n < len(paths):
+				path = paths[n]
+				tags = ("selected",) if path in self.selected else ()
+				values = self.model.row_values(path)
+				self.tree.item(f"row{n}", values=values, tags=tags)
+			else:
+				self.tree.item(f"row{n}", values=("", "", "", ""), tags=())
+
+		if total:
+			last = min(1.0, (self.top + self.visible) / total)
+			self.scrollbar.set(self.top / total, last)
+		else:
+			self.scrollbar.set(0.0, 1.0)
+
+		for column in COLUMNS:
+			text = HEADINGS[column]
+			if column == self.model.sort_column:
+				text += " ▼" if self.model.sort_reverse else " ▲"
+			self.tree.heading(column, text=text)
+
+	def reset(self):
+		"""Forget the selection and scroll to the top"""
+		self.selected = set()
+		self.anchor = None
+		self.top = 0
+		self.refresh()
+
+	def selected_paths(self):
+		return [path for path in self.model.paths() if path in self.selected]
+
+	def sort_by(self, column):
+		"""Sort by a column; clicking the sorted column again reverses it"""
+		reverse = column == self.model.sort_column and not self.model.sort_reverse
+		self.model.sort(column, reverse)
+		self.anchor = None
+		self.refresh()
+
+	def scroll(self, rows):
+		self.top += rows
+		self.refresh()
+
+	def see(self, row):
+		if row < self.top:
+			self.top = row
+		elif row >= self.top + self.visible:
+			self.top = row - self.visible + 1
+		self.refresh()
+
+	def _on_scrollbar(self, action, amount, unit=None):
+		if action == "moveto":
+			self.top = int(float(amount) * len(self.model))
+		elif unit == "pages":
+			self.top += int(amount) * self.visible
+		else:
+			self.top += int(amount)
+		self.refresh()
+
+	def _on_wheel(self, event):
+		# Windows reports multiples of 120 per notch, macOS small deltas
+		notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+		self.scroll(-notches * WHEEL_LINES)
+
+	def _row_at(self, y):
+		iid = self.tree.identify_row(y)
+		if not iid:
+			return None
+		row = self.top + int(iid[len("row") :])
+		return row if row < len(self.model) else None
+
+	def _on_click(self, event, extend=False, toggle=False):
+		if self.tree.identify_region(event.x, event.y) == "heading":
+			return None  # Let the heading's sort command run
+		self.tree.focus_set()
+		row = self._row_at(event.y)
+		if row is None:
+			return "break"
+		paths = self.model.paths()
+		path = paths[row]
+		if extend and self.anchor is not None:
+			low, high = sorted((self.anchor, row))
+			self.selected = set(paths[low : high + 1])
+		elif toggle:
+			self.selected ^= {path}
+			self.anchor = row
+		else:
+			self.selected = {path}
+			self.anchor = row
+		self.refresh()
+		if self.selected == {path} and self.on_select is not None:
+			self.on_select(path, row)
+		return "break"
+
+	def _move_selection(self, step):
+		total = len(self.model)
+		if not total:
+			return "break"
+		row = 0 if self.anchor is None else max(0, min(total - 1, self.anchor + step))
+		path = self.model.path_at(row)
+		self.selected = {path}
+		self.anchor = row
+		self.see(row)
+		if self.on_select is not None:
+			self.on_select(path, row)
+		return "break"
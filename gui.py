@@ -0,0 +1,1584 @@
+"""
+ImageMagick GUI Application
+
+A simple GUI application that provides an interface to ImageMagick's
+image conversion functionality using tkinter. Started by main.py, which
+only imports this module (and so tkinter) when the GUI is wanted.
+"""
+
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from backend import ConversionError, ERROR_CANCELLED, resolve_backend
+from engine import (
+	BACKEND_PILLOW,
+	ConversionEngine,
+	ConversionResult,
+	OUTPUT_FORMATS,
+	SCHEDULE_INPUT,
+	SCHEDULE_LARGEST,
+	SCHEDULE_SMALLEST,
+	calibrate,
+	create_progress_tracker,
+)
+from fastpath import PILLOW_AVAILABLE
+from filelist import FileListModel, FileListView
+from imageinfo import MetadataLoader
+from journal import BatchJournal, find_batch
+from outputs import parse_output_specs
+from pages import page_output_path
+from progress import format_duration
+from resources import recommended_workers
+from scanner import FolderScan, parse_patterns
+from thumbnails import ThumbnailCache
+from wandpool import WAND_AVAILABLE
+from tracing import BatchTrace, format_summary
+
+
+# Output log: queued messages are written in bulk on a timer, and only the
+# newest LOG_MAX_LINES lines are kept in the widget
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_MAX_BATCH = 5000
+LOG_MAX_LINES = 5000
+# Batch progress is redrawn at this fixed interval, however fast files finish
+PROGRESS_REFRESH_MS = 250
+# Calibration converts at most this many files from the batch list per mix
+CALIBRATION_FILES = 24
+
+LOG_LEVELS = {
+	"Everything": logging.DEBUG,
+	"Info": logging.INFO,
+	"Warnings": logging.WARNING,
+	"Errors only": logging.ERROR,
+}
+# Batch order choices -> ConversionEngine schedule
+SCHEDULES = {
+	"As listed": SCHEDULE_INPUT,
+	"Largest first": SCHEDULE_LARGEST,
+	"Smallest first": SCHEDULE_SMALLEST,
+}
+
+
+class ImageMagickGUI:
+	def __init__(self, root):
+		self.root = root
+		self.root.title("ImageMagick GUI Converter")
+		self.root.geometry("1200x900")
+		self.root.resizable(True, True)
+
+		# Variables
+		self.input_file_path = tk.StringVar()
+		# Comma-separated output specs (outputs.py); the first is the primary
+		self.output_specs = tk.StringVar(value="png")
+		self.output_choices = list(OUTPUT_FORMATS)  # Listed specs, in order
+		self.output_lists = []  # The Listbox of each tab, showing output_specs
+		self.add_suffix = tk.BooleanVar(value=True)
+		self.output_directory = tk.StringVar()
+		self.use_custom_output_dir = tk.BooleanVar(value=False)
+		self.max_workers = tk.IntVar(value=os.cpu_count() or 1)
+		self.schedule = tk.StringVar(value="As listed")
+		self.group_small_files = tk.BooleanVar(value=True)
+		self.use_pillow = tk.BooleanVar(value=PILLOW_AVAILABLE)
+		self.use_wand = tk.BooleanVar(value=False)
+		self.incremental = tk.BooleanVar(value=False)
+		self.dedupe = tk.BooleanVar(value=False)
+		self.record_timings = tk.BooleanVar(value=False)
+		self.scratch_dir = tk.StringVar()
+		self.split_pages = tk.BooleanVar(value=True)
+		self.separate_pages = tk.BooleanVar(value=False)
+		self.density = tk.StringVar()
+		self.is_converting = False
+		self.files = FileListModel()  # Files for batch conversion
+		self.folder_include = tk.StringVar()
+		self.folder_exclude = tk.StringVar()
+		self.folder_max_depth = tk.StringVar()
+		self.folder_sniff = tk.BooleanVar(value=False)
+		self.folder_scans = {}  # Running FolderScan -> files added to the list so far
+		self.current_preview_file = None
+		self.backend = None  # Resolved by check_imagemagick()
+		self.log_queue = queue.SimpleQueue()
+		self.log_level = tk.StringVar(value="Everything")
+		self.log_file = None  # Optional file receiving every log message
+		self.batch_tracker = None  # ProgressTracker of the running batch
+		# Results of the running batch, put by the engine's event loop and
+		# taken by _refresh_batch_progress() on the main thread
+		self.batch_results = queue.SimpleQueue()
+		self.batch_future = None  # concurrent.futures.Future of the running batch
+		self.batch_counts = collections.Counter()
+		self.batch_trace = None  # BatchTrace of the running or last batch
+		self.active_engine = None  # ConversionEngine of the running conversion
+
+		self.setup_ui()
+		self.root.after(LOG_FLUSH_INTERVAL_MS, self._flush_log)
+		self.check_imagemagick()
+		self.max_workers.set(recommended_workers(self.backend))
+		self.metadata_loader = MetadataLoader(self.backend)
+		self.thumbnail_cache = ThumbnailCache(self.backend)
+		self.preview_photo = None  # Keeps the shown thumbnail alive
+
+	def setup_ui(self):
+		"""Set up the user interface"""
+		# Create a notebook for tabs
+		notebook = ttk.Notebook(self.root)
+		notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+		# Single conversion tab
+		single_frame = ttk.Frame(notebook, padding="20")
+		notebook.add(single_frame, text="Single Conversion")
+
+		# Batch conversion tab
+		batch_frame = ttk.Frame(notebook, padding="20")
+		notebook.add(batch_frame, text="Batch Conversion")
+
+		self.setup_single_conversion_tab(single_frame)
+		self.setup_batch_conversion_tab(batch_frame)
+
+		# Bind common quit shortcuts
+		self.root.bind_all("<Control-q>", lambda e: self._on_quit())
+		self.root.bind_all("<Control-Q>", lambda e: self._on_quit())
+		self.root.bind_all("<Command-q>", lambda e: self._on_quit())
+		self.root.bind_all("<Command-Q>", lambda e: self._on_quit())
+
+	def setup_single_conversion_tab(self, parent):
+		"""Set up the single conversion tab"""
+		# Configure grid weights
+		parent.columnconfigure(1, weight=1)
+		parent.rowconfigure(7, weight=1)
+
+		# Title
+		title_label = ttk.Label(
+			parent, text="Single Image Converter", font=("Arial", 16, "bold")
+		)
+		title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
+
+		# Input file selection
+		ttk.Label(parent, text="Input File:").grid(row=1, column=0, sticky=tk.W, pady=5)
+		input_entry = ttk.Entry(
+			parent, textvariable=self.input_file_path, state="readonly", width=50
+		)
+		input_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(10, 5), pady=5)
+		browse_btn = ttk.Button(parent, text="Browse", command=self.browse_file)
+		browse_btn.grid(row=1, column=2, padx=(5, 0), pady=5)
+
+		# Output format selection
+		ttk.Label(parent, text="Output Formats:").grid(
+			row=2, column=0, sticky=(tk.W, tk.N), pady=5
+		)
+		format_list = self._create_output_list(parent)
+		format_list.grid(row=2, column=1, sticky=tk.W, padx=(10, 0), pady=5)
+
+		# Output directory selection
+		output_dir_frame = ttk.Frame(parent)
+		output_dir_frame.grid(
+			row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5
+		)
+		output_dir_frame.columnconfigure(1, weight=1)
+
+		ttk.Checkbutton(
+			output_dir_frame,
+			text="Custom output directory:",
+			variable=self.use_custom_output_dir,
+			command=self.toggle_output_directory,
+		).grid(row=0, column=0, sticky=tk.W)
+
+		self.output_dir_entry = ttk.Entry(
+			output_dir_frame, textvariable=self.output_directory, state="disabled"
+		)
+		self.output_dir_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 5))
+
+		self.output_dir_btn = ttk.Button(
+			output_dir_frame,
+			text="Browse",
+			command=self.browse_output_directory,
+			state="disabled",
+		)
+		self.output_dir_btn.grid(row=0, column=2, padx=(5, 0))
+
+		# Add suffix checkbox
+		suffix_checkbox = ttk.Checkbutton(
+			parent,
+			text='Add "_converted" suffix to filename',
+			variable=self.add_suffix,
+		)
+		suffix_checkbox.grid(row=4, column=0, columnspan=3, sticky=tk.W, pady=5)
+
+		# Convert and cancel buttons
+		action_frame = ttk.Frame(parent)
+		action_frame.grid(row=5, column=0, columnspan=3, pady=20)
+
+		self.convert_btn = ttk.Button(
+			action_frame,
+			text="Convert Image",
+			command=self.convert_image,
+			style="Accent.TButton",
+		)
+		self.convert_btn.grid(row=0, column=0, padx=(0, 5))
+
+		self.cancel_btn = ttk.Button(
+			action_frame, text="Cancel", command=self.cancel_conversion, state="disabled"
+		)
+		self.cancel_btn.grid(row=0, column=1, padx=(5, 0))
+
+		# Progress bar
+		self.progress = ttk.Progressbar(parent, mode="indeterminate")
+		self.progress.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+
+		# Status label
+		self.status_label = ttk.Label(parent, text="Ready", foreground="green")
+		self.status_label.grid(row=7, column=0, columnspan=3, pady=5, sticky=tk.N)
+
+		# Output info frame
+		info_frame = ttk.LabelFrame(parent, text="Conversion Info", padding="10")
+		info_frame.grid(
+			row=8, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10
+		)
+		info_frame.columnconfigure(0, weight=1)
+		parent.rowconfigure(8, weight=1)
+
+		# Output text area with scrollbar
+		text_frame = ttk.Frame(info_frame)
+		text_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+		text_frame.columnconfigure(0, weight=1)
+		text_frame.rowconfigure(0, weight=1)
+
+		self.output_text = tk.Text(
+			text_frame, height=8, width=70, wrap=tk.WORD, state=tk.DISABLED
+		)
+		scrollbar = ttk.Scrollbar(
+			text_frame, orient=tk.VERTICAL, command=self.output_text.yview
+		)
+		self.output_text.configure(yscrollcommand=scrollbar.set)
+
+		self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+		scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+		# Log controls
+		log_controls = ttk.Frame(info_frame)
+		log_controls.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+
+		ttk.Label(log_controls, text="Show:").grid(row=0, column=0, sticky=tk.W)
+		ttk.Combobox(
+			log_controls,
+			textvariable=self.log_level,
+			values=list(LOG_LEVELS),
+			state="readonly",
+			width=12,
+		).grid(row=0, column=1, sticky=tk.W, padx=(5, 10))
+
+		self.log_file_btn = ttk.Button(
+			log_controls, text="Log to File...", command=self.toggle_log_file
+		)
+		self.log_file_btn.grid(row=0, column=2, sticky=tk.W)
+
+	def setup_batch_conversion_tab(self, parent):
+		"""Set up the batch conversion tab"""
+		# Configure grid weights
+		parent.columnconfigure(0, weight=1)
+		parent.columnconfigure(1, weight=1)
+		parent.rowconfigure(2, weight=1)
+
+		# Title
+		title_label = ttk.Label(
+			parent, text="Batch Image Converter", font=("Arial", 16, "bold")
+		)
+		title_label.grid(row=0, column=0, columnspan=2, pady=(0, 20))
+
+		# Left panel - File list
+		left_frame = ttk.LabelFrame(parent, text="Files to Convert", padding="10")
+		left_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5))
+		left_frame.columnconfigure(0, weight=1)
+		left_frame.rowconfigure(1, weight=1)
+
+		# File list buttons
+		btn_frame = ttk.Frame(left_frame)
+		btn_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+		btn_frame.columnconfigure(3, weight=1)
+
+		ttk.Button(btn_frame, text="Add Files", command=self.add_files).grid(
+			row=0, column=0, padx=(0, 5)
+		)
+		ttk.Button(btn_frame, text="Add Folder", command=self.add_folder).grid(
+			row=0, column=1, padx=(0, 5)
+		)
+		ttk.Button(btn_frame, text="Remove", command=self.remove_selected_files).grid(
+			row=0, column=2, padx=(0, 5)
+		)
+		ttk.Button(btn_frame, text="Clear All", command=self.clear_file_list).grid(
+			row=0, column=4
+		)
+
+		# File list (click a column heading to sort)
+		self.file_view = FileListView(
+			left_frame, self.files, on_select=self.on_file_select
+		)
+		self.file_view.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+		# Add Folder options
+		folder_frame = ttk.LabelFrame(left_frame, text="Add Folder Options", padding="5")
+		folder_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
+		folder_frame.columnconfigure(1, weight=1)
+
+		ttk.Label(folder_frame, text="Include:").grid(row=0, column=0, sticky=tk.W)
+		ttk.Entry(folder_frame, textvariable=self.folder_include).grid(
+			row=0, column=1, sticky=(tk.W, tk.E), padx=(5, 0), pady=2
+		)
+		ttk.Label(folder_frame, text="Exclude:").grid(row=1, column=0, sticky=tk.W)
+		ttk.Entry(folder_frame, textvariable=self.folder_exclude).grid(
+			row=1, column=1, sticky=(tk.W, tk.E), padx=(5, 0), pady=2
+		)
+		ttk.Label(folder_frame, text="Max depth:").grid(row=2, column=0, sticky=tk.W)
+		ttk.Spinbox(
+			folder_frame, textvariable=self.folder_max_depth, from_=0, to=100, width=5
+		).grid(row=2, column=1, sticky=tk.W, padx=(5, 0), pady=2)
+		ttk.Checkbutton(
+			folder_frame,
+			text="Detect images by content, not just extension",
+			variable=self.folder_sniff,
+		).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
+		ttk.Label(
+			folder_frame,
+			text="Patterns are separated by ';', e.g. *.png; raw/*. "
+			"Leave max depth empty for no limit.",
+			foreground="gray",
+		).grid(row=4, column=0, columnspan=2, sticky=tk.W)
+
+		# Right panel - Preview and settings
+		right_frame = ttk.Frame(parent)
+		right_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(5, 0))
+		right_frame.columnconfigure(0, weight=1)
+		right_frame.rowconfigure(0, weight=1)
+
+		# Preview frame
+		preview_frame = ttk.LabelFrame(right_frame, text="Preview", padding="10")
+		preview_frame.grid(
+			row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10)
+		)
+		preview_frame.columnconfigure(0, weight=1)
+		preview_frame.rowconfigure(0, weight=1)
+
+		self.preview_label = ttk.Label(
+			preview_frame, text="Select a file to preview", anchor="center"
+		)
+		self.preview_label.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+		# Settings frame
+		settings_frame = ttk.LabelFrame(
+			right_frame, text="Batch Settings", padding="10"
+		)
+		settings_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+
+		# Output formats
+		ttk.Label(settings_frame, text="Output Formats:").grid(
+			row=0, column=0, sticky=(tk.W, tk.N), pady=5
+		)
+		batch_format_list = self._create_output_list(settings_frame)
+		batch_format_list.grid(row=0, column=1, sticky=tk.W, padx=(10, 0), pady=5)
+
+		# Output directory
+		ttk.Checkbutton(
+			settings_frame,
+			text="Custom output directory:",
+			variable=self.use_custom_output_dir,
+			command=self.toggle_output_directory,
+		).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		self.batch_output_dir_entry = ttk.Entry(
+			settings_frame,
+			textvariable=self.output_directory,
+			state="disabled",
+			width=30,
+		)
+		self.batch_output_dir_entry.grid(
+			row=2, column=0, sticky=(tk.W, tk.E), padx=(0, 5), pady=5
+		)
+
+		self.batch_output_dir_btn = ttk.Button(
+			settings_frame,
+			text="Browse",
+			command=self.browse_output_directory,
+			state="disabled",
+		)
+		self.batch_output_dir_btn.grid(row=2, column=1, padx=(5, 0), pady=5)
+
+		# Add suffix
+		ttk.Checkbutton(
+			settings_frame,
+			text='Add "_converted" suffix',
+			variable=self.add_suffix,
+		).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# Parallel jobs
+		ttk.Label(settings_frame, text="Parallel jobs:").grid(
+			row=4, column=0, sticky=tk.W, pady=5
+		)
+		jobs_frame = ttk.Frame(settings_frame)
+		jobs_frame.grid(row=4, column=1, sticky=tk.W, padx=(10, 0), pady=5)
+		ttk.Spinbox(
+			jobs_frame,
+			textvariable=self.max_workers,
+			from_=1,
+			to=max(64, (os.cpu_count() or 1) * 4),
+			width=5,
+		).grid(row=0, column=0, sticky=tk.W)
+		self.calibrate_btn = ttk.Button(
+			jobs_frame, text="Calibrate", command=self.calibrate_workers
+		)
+		self.calibrate_btn.grid(row=0, column=1, padx=(5, 0))
+		# Largest first finishes big batches sooner; smallest first shows
+		# results sooner
+		ttk.Label(jobs_frame, text="Order:").grid(row=0, column=2, padx=(10, 0))
+		ttk.Combobox(
+			jobs_frame,
+			textvariable=self.schedule,
+			values=list(SCHEDULES),
+			state="readonly",
+			width=14,
+		).grid(row=0, column=3, sticky=tk.W, padx=(5, 0))
+
+		# Group small files
+		ttk.Checkbutton(
+			settings_frame,
+			text="Group small files into one ImageMagick call",
+			variable=self.group_small_files,
+		).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# In-process conversions (only offered when Pillow is installed)
+		ttk.Checkbutton(
+			settings_frame,
+			text="Convert simple PNG/JPEG/WebP/BMP/GIF files with Pillow"
+			if PILLOW_AVAILABLE
+			else "Convert simple files with Pillow (not installed)",
+			variable=self.use_pillow,
+			state="normal" if PILLOW_AVAILABLE else "disabled",
+		).grid(row=6, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# MagickWand workers (only offered when Wand is installed)
+		ttk.Checkbutton(
+			settings_frame,
+			text="Use the MagickWand library instead of a process per file"
+			if WAND_AVAILABLE
+			else "Use the MagickWand library (Wand not installed)",
+			variable=self.use_wand,
+			state="normal" if WAND_AVAILABLE else "disabled",
+		).grid(row=7, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# Incremental mode
+		ttk.Checkbutton(
+			settings_frame,
+			text="Skip files whose output is up to date",
+			variable=self.incremental,
+		).grid(row=8, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# Output store
+		ttk.Checkbutton(
+			settings_frame,
+			text="Convert identical files once (reuses earlier outputs)",
+			variable=self.dedupe,
+		).grid(row=9, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# Timing trace
+		ttk.Checkbutton(
+			settings_frame,
+			text="Record per-file timings for export",
+			variable=self.record_timings,
+		).grid(row=10, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		# Multi-page documents
+		ttk.Checkbutton(
+			settings_frame,
+			text="Split multi-page PDFs and TIFFs across jobs",
+			variable=self.split_pages,
+		).grid(row=11, column=0, columnspan=2, sticky=tk.W, pady=5)
+		ttk.Checkbutton(
+			settings_frame,
+			text="Write one output file per page",
+			variable=self.separate_pages,
+		).grid(row=12, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+		ttk.Label(settings_frame, text="PDF density (DPI):").grid(
+			row=13, column=0, sticky=tk.W, pady=5
+		)
+		ttk.Entry(settings_frame, textvariable=self.density, width=8).grid(
+			row=13, column=1, sticky=tk.W, padx=(10, 0), pady=5
+		)
+
+		# Scratch directory for the pixel caches of large images
+		ttk.Label(settings_frame, text="Scratch directory:").grid(
+			row=14, column=0, sticky=tk.W, pady=5
+		)
+		scratch_frame = ttk.Frame(settings_frame)
+		scratch_frame.grid(row=14, column=1, sticky=tk.W, padx=(10, 0), pady=5)
+		ttk.Entry(scratch_frame, textvariable=self.scratch_dir, width=20).grid(
+			row=0, column=0, sticky=tk.W
+		)
+		ttk.Button(
+			scratch_frame, text="Browse", command=self.browse_scratch_directory
+		).grid(row=0, column=1, padx=(5, 0))
+
+		# Convert and cancel buttons
+		batch_action_frame = ttk.Frame(settings_frame)
+		batch_action_frame.grid(row=15, column=0, columnspan=2, pady=20)
+
+		self.batch_convert_btn = ttk.Button(
+			batch_action_frame,
+			text="Convert All Images",
+			command=self.batch_convert_images,
+			style="Accent.TButton",
+		)
+		self.batch_convert_btn.grid(row=0, column=0, padx=(0, 5))
+
+		self.resume_batch_btn = ttk.Button(
+			batch_action_frame, text="Resume Batch", command=self.resume_batch
+		)
+		self.resume_batch_btn.grid(row=0, column=1, padx=(5, 0))
+
+		self.batch_cancel_btn = ttk.Button(
+			batch_action_frame,
+			text="Cancel",
+			command=self.cancel_conversion,
+			state="disabled",
+		)
+		self.batch_cancel_btn.grid(row=0, column=2, padx=(5, 0))
+
+		self.export_timings_btn = ttk.Button(
+			batch_action_frame,
+			text="Export Timings...",
+			command=self.export_timings,
+			state="disabled",
+		)
+		self.export_timings_btn.grid(row=0, column=3, padx=(5, 0))
+
+		# Progress and status for batch
+		batch_progress_frame = ttk.Frame(parent)
+		batch_progress_frame.grid(
+			row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=10
+		)
+		batch_progress_frame.columnconfigure(0, weight=1)
+
+		self.batch_progress = ttk.Progressbar(batch_progress_frame, mode="determinate")
+		self.batch_progress.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=5)
+
+		self.batch_status_label = ttk.Label(
+			batch_progress_frame, text="Ready for batch conversion", foreground="green"
+		)
+		self.batch_status_label.grid(row=1, column=0, pady=5)
+
+	def _create_output_list(self, parent):
+		"""A multi-select list of output specs, with an entry to add specs
+
+		Every selected spec is written from one decode of each input. The
+		lists of both tabs show the same selection, kept in output_specs.
+		"""
+		frame = ttk.Frame(parent)
+		listbox = tk.Listbox(
+			frame, selectmode=tk.MULTIPLE, exportselection=False, height=4, width=16
+		)
+		listbox.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E))
+		scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=listbox.yview)
+		scrollbar.grid(row=0, column=2, sticky=(tk.N, tk.S))
+		listbox.config(yscrollcommand=scrollbar.set)
+		listbox.bind("<<ListboxSelect>>", lambda e: self._on_output_select(listbox))
+
+		spec_entry = ttk.Entry(frame, width=12)
+		spec_entry.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+		spec_entry.bind("<Return>", lambda e: self._add_output_spec(spec_entry))
+		ttk.Button(
+			frame, text="Add", command=lambda: self._add_output_spec(spec_entry)
+		).grid(row=1, column=1, columnspan=2, sticky=tk.W, padx=(5, 0), pady=(5, 0))
+
+		self.output_lists.append(listbox)
+		self._show_output_specs()
+		return frame
+
+	def _show_output_specs(self):
+		"""Show output_specs as the selection of every output list"""
+		selected = self.output_specs.get().split(",")
+		for spec in selected:
+			if spec not in self.output_choices:
+				self.output_choices.append(spec)
+		for listbox in self.output_lists:
+			listbox.delete(0, tk.END)
+			listbox.insert(tk.END, *self.output_choices)
+			for position, spec in enumerate(self.output_choices):
+				if spec in selected:
+					listbox.selection_set(position)
+
+	def _on_output_select(self, listbox):
+		"""Take an output list's selection; at least one spec stays selected"""
+		selected = [listbox.get(position) for position in listbox.curselection()]
+		if selected:
+			self.output_specs.set(",".join(selected))
+		self._show_output_specs()
+
+	def _add_output_spec(self, entry):
+		"""Add the specs typed in ``entry`` (such as ``jpg:320x320``) and select them"""
+		try:
+			specs = parse_output_specs(entry.get())
+			for spec in specs:
+				if spec.format not in OUTPUT_FORMATS:
+					raise ValueError(f"{spec.format.upper()} is not an output format")
+		except ValueError as e:
+			messagebox.showerror("Output Formats", str(e))
+			return
+		selected = self.output_specs.get().split(",")
+		selected += [str(spec) for spec in specs if str(spec) not in selected]
+		self.output_specs.set(",".join(selected))
+		self._show_output_specs()
+		entry.delete(0, tk.END)
+
+	def browse_file(self):
+		"""Open file browser to select input image"""
+		file_types = [
+			("Image files", "*.png *.jpg *.jpeg *.bmp *.tiff *.gif *.webp *.pdf"),
+			("PNG files", "*.png"),
+			("JPEG files", "*.jpg *.jpeg"),
+			("BMP files", "*.bmp"),
+			("TIFF files", "*.tiff"),
+			("GIF files", "*.gif"),
+			("WebP files", "*.webp"),
+			("PDF files", "*.pdf"),
+			("All files", "*.*"),
+		]
+
+		filename = filedialog.askopenfilename(
+			title="Select Image File", filetypes=file_types, initialdir=str(Path.home())
+		)
+
+		if filename:
+			self.input_file_path.set(filename)
+			self.log_message(f"Selected input file: {filename}")
+			self.update_preview(filename)
+
+	def toggle_output_directory(self):
+		"""Toggle the output directory selection"""
+		if self.use_custom_output_dir.get():
+			self.output_dir_entry.config(state="normal")
+			self.output_dir_btn.config(state="normal")
+			if hasattr(self, "batch_output_dir_entry"):
+				self.batch_output_dir_entry.config(state="normal")
+				self.batch_output_dir_btn.config(state="normal")
+		else:
+			self.output_dir_entry.config(state="disabled")
+			self.output_dir_btn.config(state="disabled")
+			if hasattr(self, "batch_output_dir_entry"):
+				self.batch_output_dir_entry.config(state="disabled")
+				self.batch_output_dir_btn.config(state="disabled")
+
+	def browse_output_directory(self):
+		"""Browse for output directory"""
+		directory = filedialog.askdirectory(title="Select Output Directory")
+		if directory:
+			self.output_directory.set(directory)
+
+	def browse_scratch_directory(self):
+		"""Browse for the directory holding large images' pixel caches"""
+		directory = filedialog.askdirectory(title="Select Scratch Directory")
+		if directory:
+			self.scratch_dir.set(directory)
+
+	def add_files(self):
+		"""Add files to the batch conversion list"""
+		file_types = [
+			("Image files", "*.png *.jpg *.jpeg *.bmp *.tiff *.gif *.webp *.pdf"),
+			("PNG files", "*.png"),
+			("JPEG files", "*.jpg *.jpeg"),
+			("BMP files", "*.bmp"),
+			("TIFF files", "*.tiff"),
+			("GIF files", "*.gif"),
+			("WebP files", "*.webp"),
+			("PDF files", "*.pdf"),
+			("All files", "*.*"),
+		]
+
+		filenames = filedialog.askopenfilenames(
+			title="Select Image Files",
+			filetypes=file_types,
+			initialdir=str(Path.home()),
+		)
+
+		self._append_files(filenames)
+		self.batch_status_label.config(
+			text=f"Ready for batch conversion ({len(self.files)} files)",
+			foreground="green",
+		)
+
+	def _append_files(self, filenames):
+		"""Add files that are not in the batch list yet (runs on main thread)"""
+		added = self.files.add(filenames)
+		if added:
+			self.file_view.refresh()
+		return added
+
+	def add_folder(self):
+		"""Add the image files in a folder tree to the batch list
+
+		The folder is walked on a background thread and files are added in
+		chunks as they are found; a batch started before the walk finishes
+		picks up the rest of the files as they arrive.
+		"""
+		directory = filedialog.askdirectory(
+			title="Select Folder", initialdir=str(Path.home())
+		)
+		if not directory:
+			return
+
+		max_depth = self.folder_max_depth.get().strip()
+		try:
+			max_depth = int(max_depth) if max_depth else None
+		except ValueError:
+			messagebox.showerror("Error", "Max depth must be a whole number")
+			return
+
+		scan = FolderScan(
+			[directory],
+			self._on_scan_chunk,
+			self._on_scan_done,
+			include=parse_patterns(self.folder_include.get()),
+			exclude=parse_patterns(self.folder_exclude.get()),
+			max_depth=max_depth,
+			sniff=self.folder_sniff.get(),
+		)
+		self.folder_scans[scan] = 0
+		self.log_message(f"Scanning {directory}...")
+		scan.start()
+
+	def _on_scan_chunk(self, scan, paths):
+		"""Receive a chunk of found files (runs on the scan thread)"""
+		self.root.after(0, self._add_scanned_files, scan, paths)
+
+	def _add_scanned_files(self, scan, paths):
+		"""Add a chunk of found files to the batch list (runs on main thread)"""
+		if scan not in self.folder_scans:
+			return  # Cleared while the chunk was on its way
+		self.folder_scans[scan] += len(paths)
+		self._append_files(paths)
+		if not self.is_converting:
+			self.batch_status_label.config(
+				text=f"Scanning... ({len(self.files)} files)", foreground="orange"
+			)
+
+	def _on_scan_done(self, scan):
+		"""Receive the end of a folder scan (runs on the scan thread)"""
+		self.root.after(0, self._scan_finished, scan)
+
+	def _scan_finished(self, scan):
+		"""Report a finished folder scan (runs on main thread)"""
+		if self.folder_scans.pop(scan, None) is None:
+			return
+		if scan.cancelled:
+			return
+		self.log_message(
+			f"Found {len(scan.found)} image files in {scan.roots[0]} "
+			f"({format_duration(scan.elapsed)})"
+		)
+		if not self.is_converting:
+			self.batch_status_label.config(
+				text=f"Ready for batch conversion ({len(self.files)} files)",
+				foreground="green",
+			)
+
+	def remove_selected_files(self):
+		"""Remove selected files from the batch list"""
+		self.files.remove(self.file_view.selected_paths())
+		self.file_view.reset()
+
+		self.batch_status_label.config(
+			text=f"Ready for batch conversion ({len(self.files)} files)",
+			foreground="green",
+		)
+
+	def clear_file_list(self):
+		"""Clear all files from the batch list, stopping running folder scans"""
+		for scan in self.folder_scans:
+			scan.cancel()
+		self.folder_scans.clear()
+		self.files.clear()
+		self.file_view.reset()
+		self.preview_label.config(text="Select a file to preview")
+		self._show_thumbnail(None)
+		self.current_preview_file = None
+		self.batch_status_label.config(
+			text="Ready for batch conversion", foreground="green"
+		)
+
+	def on_file_select(self, selected_file, index):
+		"""Handle file selection in the file list"""
+		self.update_preview(selected_file)
+		# Render the neighbours' thumbnails while the user looks at this one
+		neighbours = [
+			self.files.path_at(i)
+			for i in (index + 1, index - 1, index + 2)
+			if 0 <= i < len(self.files)
+		]
+		self.thumbnail_cache.prefetch(neighbours)
+
+	def update_preview(self, filename):
+		"""Update the preview with file information (without external image libraries)
+
+		Dimensions and the thumbnail are looked up on background threads;
+		cached results are shown immediately and the rest fill in when the
+		lookups finish.
+		"""
+		if not filename or not os.path.exists(filename):
+			self.preview_label.config(text="File not found")
+			self._show_thumbnail(None)
+			return
+
+		self.current_preview_file = filename
+		info = self.metadata_loader.request(filename, self._on_preview_metadata)
+		self._render_preview(filename, info)
+		self._show_thumbnail(
+			self.thumbnail_cache.request(filename, self._on_preview_thumbnail)
+		)
+
+	def _on_preview_metadata(self, filename, info):
+		"""Receive looked-up metadata (runs on the metadata thread)"""
+		self.root.after(0, self._apply_preview_metadata, filename, info)
+
+	def _apply_preview_metadata(self, filename, info):
+		"""Show looked-up metadata if the file is still selected (runs on main thread)"""
+		if filename == self.current_preview_file:
+			self._render_preview(filename, info)
+
+	def _on_preview_thumbnail(self, filename, thumbnail):
+		"""Receive a rendered thumbnail (runs on a thumbnail thread)"""
+		self.root.after(0, self._apply_preview_thumbnail, filename, thumbnail)
+
+	def _apply_preview_thumbnail(self, filename, thumbnail):
+		"""Show a rendered thumbnail if the file is still selected (runs on main thread)"""
+		if filename == self.current_preview_file:
+			self._show_thumbnail(thumbnail)
+
+	def _show_thumbnail(self, thumbnail):
+		"""Show a thumbnail PNG above the preview text, or clear it when None"""
+		self.preview_photo = None
+		if thumbnail is not None:
+			try:
+				self.preview_photo = tk.PhotoImage(file=str(thumbnail))
+			except tk.TclError:
+				pass  # Tk builds without PNG support just show the text
+		self.preview_label.config(image=self.preview_photo or "", compound=tk.TOP)
+
+	def _render_preview(self, filename, info):
+		"""Render the preview text; ``info`` is None while the lookup is pending"""
+		try:
+			# Get file information
+			file_path = Path(filename)
+			file_size = os.path.getsize(filename)
+			file_size_mb = file_size / (1024 * 1024)
+
+			if info is None:
+				dimensions = "Loading..."
+			elif info.get("width") and info.get("height"):
+				dimensions = f"{info['width']}x{info['height']}"
+			else:
+				dimensions = "Unknown"
+			image_format = file_path.suffix.upper().lstrip(".")
+			if info and info.get("format"):
+				image_format = info["format"]
+
+			preview_text = f"File: {file_path.name}\n"
+			preview_text += f"Size: {file_size_mb:.2f} MB\n"
+			preview_text += f"Dimensions: {dimensions}\n"
+			preview_text += f"Format: {image_format}\n"
+			preview_text += f"Path: {filename}"
+
+			self.preview_label.config(text=preview_text, justify=tk.LEFT)
+
+		except Exception as e:
+			self.preview_label.config(text=f"Error reading file info:\n{str(e)}")
+
+	def batch_convert_images(self, resume=None):
+		"""Convert all images in the batch list
+
+		``resume`` is the journal.ResumableBatch the list was loaded from, if
+		any; its journal is then continued instead of starting a new one.
+		"""
+		if self.is_converting:
+			return
+
+		if not self.files:
+			messagebox.showerror("Error", "Please add files to convert")
+			return
+
+		scratch_dir = self.scratch_dir.get().strip()
+		if scratch_dir and not os.path.isdir(scratch_dir):
+			messagebox.showerror("Error", f"Scratch directory not found: {scratch_dir}")
+			return
+
+		# The engine converts on its event loop; results come back through a queue
+		self.is_converting = True
+		self.batch_convert_btn.config(state="disabled", text="Converting...")
+		self.resume_batch_btn.config(state="disabled")
+		self.batch_progress.config(
+			mode="determinate", maximum=len(self.files), value=0
+		)
+		self.batch_status_label.config(text="Converting images...", foreground="orange")
+
+		self.batch_tracker = None
+		self.batch_counts = collections.Counter()
+		self.export_timings_btn.config(state="disabled")
+		self.files.reset_status()
+		self.file_view.refresh()
+		self.active_engine = self._create_engine()
+		self.batch_trace = BatchTrace(
+			record=self.record_timings.get(), schedule=self.active_engine.schedule
+		)
+		self.log_message(
+			f"Running {self.active_engine.max_workers} parallel jobs, "
+			f"ImageMagick limited to {self.active_engine.limits.describe()}",
+			logging.DEBUG,
+		)
+		self.batch_cancel_btn.config(state="normal")
+		files = list(self.files.paths())
+		# Journal the batch so that it can be resumed if it is interrupted
+		if resume is not None:
+			journal = BatchJournal.resume(resume.id)
+		else:
+			journal = BatchJournal.create(self.active_engine.batch_settings())
+			if journal is not None:
+				journal.add(files)
+		if journal is None:
+			self.log_message(
+				"Could not open the batch journal; this batch cannot be resumed",
+				logging.WARNING,
+			)
+		self.active_engine.journal = journal
+		# Folder scans still running feed the rest of their files to the batch
+		scans = [(scan, added) for scan, added in self.folder_scans.items()]
+		inputs = self._batch_inputs(self.active_engine, files, scans)
+		self.batch_results = queue.SimpleQueue()
+		results = self.batch_results
+		self.batch_future = self.active_engine.submit_many(inputs, results.put)
+		self.batch_future.add_done_callback(lambda _: results.put(None))
+		self.root.after(PROGRESS_REFRESH_MS, self._refresh_batch_progress)
+
+	def resume_batch(self):
+		"""Load the last batch that did not finish and convert what is left
+
+		Files that were done are skipped; failed ones are tried again. The
+		batch's own output settings are restored first.
+		"""
+		if self.is_converting:
+			return
+		batch = find_batch()
+		if batch is None:
+			messagebox.showinfo("Resume Batch", "There is no unfinished batch.")
+			return
+		if not messagebox.askyesno(
+			"Resume Batch",
+			f"Resume {batch.describe()}?\n\nThis replaces the batch list and "
+			"output settings.",
+		):
+			return
+
+		settings = batch.settings
+		# Batches journaled before there were output specs have only a format
+		self.output_specs.set(
+			",".join(settings.get("outputs") or [settings["output_format"]])
+		)
+		self._show_output_specs()
+		self.add_suffix.set(settings["add_suffix"])
+		self.use_custom_output_dir.set(bool(settings["output_dir"]))
+		self.output_directory.set(settings["output_dir"] or "")
+		self.toggle_output_directory()
+		self.incremental.set(settings["incremental"])
+		self.split_pages.set(settings["split_pages"])
+		self.separate_pages.set(settings["separate_pages"])
+		self.density.set(f"{settings['density']:g}" if settings["density"] else "")
+		self.dedupe.set(settings["dedupe"])
+
+		self.clear_file_list()
+		self._append_files(batch.remaining)
+		self.log_message(f"Resuming {batch.describe()}")
+		self.batch_convert_images(resume=batch)
+
+	def calibrate_workers(self):
+		"""Find the fastest number of parallel jobs using files from the batch list"""
+		if self.is_converting:
+			return
+		if self.backend is None:
+			messagebox.showerror("Error", "ImageMagick not found")
+			return
+		if not self.files:
+			messagebox.showerror(
+				"Error", "Add some typical files to the batch list to calibrate with"
+			)
+			return
+
+		paths = self.files.paths()
+		step = max(1, len(paths) // CALIBRATION_FILES)
+		sample = paths[::step][:CALIBRATION_FILES]
+		self.is_converting = True
+		self.calibrate_btn.config(state="disabled", text="Calibrating...")
+		self.batch_convert_btn.config(state="disabled")
+		self.resume_batch_btn.config(state="disabled")
+		self.log_message(f"Calibrating with {len(sample)} files...")
+		threading.Thread(
+			target=self._perform_calibration,
+			args=(sample, parse_output_specs(self.output_specs.get())[0].format),
+			daemon=True,
+		).start()
+
+	def _perform_calibration(self, sample, output_format):
+		"""Time each jobs x threads mix (runs in separate thread)"""
+
+		def report(result):
+			self.log_message(
+				f"{result['workers']} jobs x {result['threads']} threads: "
+				f"{result['files_per_second']:.1f} files/s, "
+				f"{result['megapixels_per_second']:.1f} MP/s"
+			)
+
+		try:
+			best, _ = calibrate(self.backend, sample, output_format, report=report)
+		except Exception as e:
+			self.log_message(f"Calibration failed: {e}", logging.ERROR)
+			best = None
+		self.root.after(0, self._calibration_complete, best)
+
+	def _calibration_complete(self, best):
+		"""Apply the calibration result (runs on main thread)"""
+		self.is_converting = False
+		self.calibrate_btn.config(state="normal", text="Calibrate")
+		self.batch_convert_btn.config(state="normal")
+		self.resume_batch_btn.config(state="normal")
+		if best is None:
+			self.log_message(
+				"Calibration did not finish: some files failed to convert",
+				logging.WARNING,
+			)
+			return
+		self.max_workers.set(best["workers"])
+		self.log_message(
+			f"Fastest: {best['workers']} jobs x {best['threads']} threads "
+			"(remembered for this machine)"
+		)
+
+	def _create_engine(self):
+		"""Snapshot the current settings into a ConversionEngine
+
+		Tk variables must only be read on the main thread, so worker threads
+		get an engine holding plain values instead.
+		"""
+		try:
+			max_workers = max(1, int(self.max_workers.get()))
+		except (tk.TclError, ValueError):
+			max_workers = os.cpu_count() or 1
+
+		output_dir = None
+		if self.use_custom_output_dir.get() and self.output_directory.get():
+			output_dir = self.output_directory.get()
+
+		# Blank (or not a positive number) leaves ImageMagick's default
+		try:
+			density = float(self.density.get())
+		except ValueError:
+			density = None
+		if density is not None and density <= 0:
+			density = None
+
+		return ConversionEngine(
+			self.backend,
+			outputs=parse_output_specs(self.output_specs.get()),
+			output_dir=output_dir,
+			add_suffix=self.add_suffix.get(),
+			max_workers=max_workers,
+			group_small_files=self.group_small_files.get(),
+			incremental=self.incremental.get(),
+			use_pillow=self.use_pillow.get(),
+			use_wand=self.use_wand.get(),
+			scratch_dir=self.scratch_dir.get().strip() or None,
+			split_pages=self.split_pages.get(),
+			separate_pages=self.separate_pages.get(),
+			density=density,
+			dedupe=self.dedupe.get(),
+			schedule=SCHEDULES.get(self.schedule.get(), SCHEDULE_INPUT),
+		)
+
+	def _batch_inputs(self, engine, files, scans=()):
+		"""Yield the files of a batch (runs on the engine's planner thread)
+
+		Files that the ``(scan, already_listed)`` pairs in ``scans`` find
+		later are yielded after ``files``. Sizing up the files for the
+		progress tracker happens here too, off the main thread.
+		"""
+		tracker = create_progress_tracker(files)
+		self.batch_tracker = tracker
+		yield from files
+		yield from self._follow_scans(engine, tracker, scans, set(files))
+
+	def _record_batch_result(self, result):
+		"""Log and count one result of the batch (runs on main thread)
+
+		Unless the batch is ordered by size, the engine reports results in
+		input order, so the log and the progress bar read the same as a
+		serial run.
+		"""
+		counts = self.batch_counts
+		tracker = self.batch_tracker
+		input_name = Path(result.input_path).name
+		self.log_message(
+			f"Converting {result.index+1}/{tracker.total}: {input_name}",
+			logging.DEBUG,
+		)
+		if result.skipped:
+			# Up-to-date outputs count as successes
+			counts["successful"] += 1
+			counts["skipped"] += 1
+			self.log_message(f"⏭️  Up to date: {result.output_path.name}", logging.DEBUG)
+		elif result.success:
+			counts["successful"] += 1
+			mode = ", large-image mode" if result.large_image else ""
+			if result.page_parts:
+				mode += f", {result.page_parts} page ranges in parallel"
+			if result.numbered_pages:
+				mode += f", {result.numbered_pages} page files"
+			if result.reused is not None:
+				mode += f", {result.reused}"
+			if result.extra_outputs:
+				mode += f", {len(result.extra_outputs) + 1} outputs"
+			self.log_message(
+				f"✅ Success: {result.output_path.name} ({result.backend}{mode})",
+				logging.DEBUG,
+			)
+		elif result.cancelled:
+			counts["cancelled"] += 1
+			self.log_message(f"🛑 Cancelled: {input_name}", logging.DEBUG)
+		else:
+			counts["failed"] += 1
+			self.log_message(f"{input_name}: {result.error}", logging.ERROR)
+			self.log_message(f"❌ Failed: {input_name}", logging.ERROR)
+		if result.fallback is not None:
+			self.log_message(
+				f"{input_name}: {result.fallback}; used ImageMagick", logging.DEBUG
+			)
+		# Shown by the file list the next time the progress timer redraws it
+		self.files.set_status(result.input_path, result.status)
+		tracker.record(result.input_bytes, result.pixels)
+		if self.batch_trace is not None:
+			self.batch_trace.add(result)
+
+	def _follow_scans(self, engine, tracker, scans, known):
+		"""Yield files found by folder scans after the batch started
+
+		Each file is added to the batch's journal before it is yielded, so
+		that resuming an interrupted batch also converts the late files.
+		"""
+		for scan, start in scans:
+			for path in scan.follow(start, stop=lambda: engine.cancelled):
+				if path in known:
+					continue
+				known.add(path)
+				if engine.journal is not None:
+					engine.journal.add([path])
+				try:
+					size = os.path.getsize(path)
+				except OSError:
+					size = 0
+				tracker.add_files(1, size)
+				yield path
+
+	def _refresh_batch_progress(self):
+		"""Redraw the batch progress bar and throughput (runs on main thread)"""
+		if not self.is_converting:
+			return
+		started = time.perf_counter()
+		while True:
+			try:
+				result = self.batch_results.get_nowait()
+			except queue.Empty:
+				break
+			if result is None:  # The batch is over
+				self._batch_conversion_complete()
+				return
+			self._record_batch_result(result)
+		if self.batch_tracker is not None:
+			snapshot = self.batch_tracker.snapshot()
+			self.batch_progress.config(
+				maximum=max(1, snapshot.total), value=snapshot.completed
+			)
+			self.batch_status_label.config(
+				text=snapshot.describe(), foreground="orange"
+			)
+		self.file_view.refresh()
+		if self.batch_trace is not None:
+			# Time spent on the main thread shows up on the timeline
+			self.batch_trace.add_event(
+				"redraw", "Tk main thread", started, time.perf_counter() - started
+			)
+		self.root.after(PROGRESS_REFRESH_MS, self._refresh_batch_progress)
+
+	def _batch_conversion_complete(self):
+		"""Handle batch conversion completion (runs on main thread)"""
+		successful = self.batch_counts["successful"]
+		failed = self.batch_counts["failed"]
+		skipped = self.batch_counts["skipped"]
+		cancelled = self.batch_counts["cancelled"]
+		error = self.batch_future.exception()
+		if error is not None:
+			self.log_message(f"❌ Error: {error}", logging.ERROR)
+		self.is_converting = False
+		self.active_engine = None
+		self.batch_convert_btn.config(state="normal", text="Convert All Images")
+		self.resume_batch_btn.config(state="normal")
+		self.batch_cancel_btn.config(state="disabled", text="Cancel")
+		self.file_view.refresh()
+		if self.batch_tracker is not None:
+			snapshot = self.batch_tracker.snapshot()
+			self.batch_progress.config(
+				maximum=max(1, snapshot.total), value=snapshot.completed
+			)
+			self.log_message(
+				f"Processed {snapshot.bytes_done / (1024 * 1024):.1f} MB in "
+				f"{format_duration(snapshot.elapsed)}"
+			)
+
+		summary = f"Batch conversion complete: {successful} successful, {failed} failed"
+		if skipped:
+			summary += f" ({skipped} already up to date)"
+		if cancelled:
+			summary += f", {cancelled} cancelled"
+		self.log_message(summary)
+		if self.batch_trace is not None:
+			for line in format_summary(self.batch_trace.summary()):
+				self.log_message(line)
+			if self.batch_trace.records:
+				self.export_timings_btn.config(state="normal")
+
+		total = successful + failed
+		if cancelled:
+			self.batch_status_label.config(
+				text=f"Cancelled: {successful}/{total + cancelled} images converted",
+				foreground="orange",
+			)
+		elif successful == total:
+			self.batch_status_label.config(
+				text=f"All {total} images converted successfully!", foreground="green"
+			)
+			messagebox.showinfo(
+				"Success", f"All {total} images converted successfully!"
+			)
+		elif successful > 0:
+			self.batch_status_label.config(
+				text=f"{successful}/{total} images converted", foreground="orange"
+			)
+			messagebox.showwarning(
+				"Partial Success",
+				f"{successful} of {total} images converted successfully.\n{failed} failed.",
+			)
+		else:
+			self.batch_status_label.config(
+				text=f"All {total} conversions failed", foreground="red"
+			)
+			messagebox.showerror(
+				"Error", f"All {total} conversions failed. Check the log for details."
+			)
+
+	def check_imagemagick(self):
+		"""Resolve the ImageMagick backend used by every conversion"""
+		self.backend = resolve_backend()
+		if self.backend is None:
+			self.log_message("⚠️  WARNING: ImageMagick not found!", logging.WARNING)
+			self.log_message("Please install ImageMagick:", logging.WARNING)
+			self.log_message("  macOS: brew install imagemagick", logging.WARNING)
+			self.log_message(
+				"  Ubuntu: sudo apt-get install imagemagick", logging.WARNING
+			)
+			self.log_message("  Windows: Download from imagemagick.org", logging.WARNING)
+			self.status_label.config(text="ImageMagick not found", foreground="red")
+		elif self.backend.is_legacy:
+			self.log_message(f"ImageMagick found (legacy): {self.backend.version}")
+		else:
+			self.log_message(f"ImageMagick found: {self.backend.version}")
+
+	def convert_image(self):
+		"""Convert the selected image to the specified format"""
+		if self.is_converting:
+			return
+
+		input_path = self.input_file_path.get().strip()
+		if not input_path:
+			messagebox.showerror("Error", "Please select an input file")
+			return
+
+		if not os.path.exists(input_path):
+			messagebox.showerror("Error", "Input file does not exist")
+			return
+
+		# Start conversion in a separate thread
+		self.is_converting = True
+		self.convert_btn.config(state="disabled", text="Converting...")
+		self.progress.start(10)
+		self.status_label.config(text="Converting...", foreground="orange")
+
+		self.active_engine = self._create_engine()
+		self.cancel_btn.config(state="normal")
+		conversion_thread = threading.Thread(
+			target=self._perform_conversion, args=(self.active_engine, input_path)
+		)
+		conversion_thread.daemon = True
+		conversion_thread.start()
+
+	def _perform_conversion(self, engine, input_path):
+		"""Perform the actual conversion (runs in separate thread)"""
+		try:
+			input_file = Path(input_path)
+			output_path = engine.output_path_for(input_path)
+
+			self.log_message(f"Converting: {input_file.name}")
+			output_paths = [output_path, *engine.extra_output_paths(input_path)]
+			self.log_message(f"Output: {', '.join(path.name for path in output_paths)}")
+			formats = ", ".join(str(spec).upper() for spec in engine.outputs)
+			self.log_message(f"Format: {formats}")
+
+			# A multi-page PDF or TIFF is split into page ranges on every job
+			results = list(engine.convert_many([input_path]))
+			if not results:  # Cancelled before it started
+				error = ConversionError(ERROR_CANCELLED)
+				results = [ConversionResult(0, input_path, output_path, error)]
+			result = results[0]
+			if result.numbered_pages:
+				self.log_message(
+					f"Wrote {result.numbered_pages} pages: "
+					f"{page_output_path(output_path, 0).name} ... "
+					f"{page_output_path(output_path, result.numbered_pages - 1).name}"
+				)
+			if not result.success and not result.cancelled:
+				self.log_message(f"Error: {result.error}", logging.ERROR)
+			if result.fallback is not None:
+				self.log_message(f"{result.fallback}; used ImageMagick", logging.DEBUG)
+			timing = f"Took {result.elapsed:.2f}s"
+			if result.backend == BACKEND_PILLOW:
+				timing += " (converted in-process with Pillow)"
+			elif result.cpu_time is not None:
+				timing += f" ({result.cpu_time:.2f}s ImageMagick CPU time)"
+			self.log_message(timing, logging.DEBUG)
+
+			# Update UI on main thread
+			self.root.after(
+				0,
+				self._conversion_complete,
+				result.success,
+				str(output_path),
+				result.cancelled,
+				result.numbered_pages,
+			)
+
+		except Exception as e:
+			self.root.after(0, self._conversion_error, str(e))
+		finally:
+			engine.close()
+
+	def _conversion_complete(
+		self, success, output_path, cancelled=False, numbered_pages=0
+	):
+		"""Handle conversion completion (runs on main thread)
+
+		A multi-page input converted to a single-image format is written as
+		``numbered_pages`` numbered files instead of ``output_path``.
+		"""
+		self.progress.stop()
+		self.is_converting = False
+		self.active_engine = None
+		self.convert_btn.config(state="normal", text="Convert Image")
+		self.cancel_btn.config(state="disabled", text="Cancel")
+
+		if cancelled:
+			self.status_label.config(text="Conversion cancelled", foreground="orange")
+			self.log_message("🛑 Conversion cancelled", logging.WARNING)
+		elif success:
+			if numbered_pages:
+				first = page_output_path(output_path, 0)
+				last = page_output_path(output_path, numbered_pages - 1)
+				saved = f"{first.name} ... {last.name} ({numbered_pages} pages)"
+				location = f"{first} ... {last.name} ({numbered_pages} pages)"
+			else:
+				saved = os.path.basename(output_path)
+				location = output_path
+			self.status_label.config(text="Conversion successful!", foreground="green")
+			self.log_message("✅ Conversion completed successfully!")
+			self.log_message(f"Output saved: {location}")
+
+			# Show success dialog
+			messagebox.showinfo(
+				"Success", f"Image converted successfully!\nSaved as: {saved}"
+			)
+		else:
+			self.status_label.config(text="Conversion failed", foreground="red")
+			self.log_message("❌ Conversion failed!", logging.ERROR)
+			messagebox.showerror(
+				"Error", "Image conversion failed. Check the log for details."
+			)
+
+	def _conversion_error(self, error_msg):
+		"""Handle conversion error (runs on main thread)"""
+		self.progress.stop()
+		self.is_converting = False
+		self.active_engine = None
+		self.convert_btn.config(state="normal", text="Convert Image")
+		self.cancel_btn.config(state="disabled", text="Cancel")
+		self.status_label.config(text="Error occurred", foreground="red")
+
+		self.log_message(f"❌ Error: {error_msg}", logging.ERROR)
+		messagebox.showerror("Error", f"An error occurred: {error_msg}")
+
+	def cancel_conversion(self):
+		"""Stop the running conversion
+
+		Running ImageMagick processes are terminated and queued files are
+		dropped; the conversion then finishes as usual and reports
+		the files that did not run as cancelled.
+		"""
+		engine = self.active_engine
+		if engine is None or engine.cancelled:
+			return
+		engine.cancel()
+		self.cancel_btn.config(state="disabled", text="Cancelling...")
+		self.batch_cancel_btn.config(state="disabled", text="Cancelling...")
+		self.log_message("Cancelling conversion...", logging.WARNING)
+
+	def log_message(self, message, level=logging.INFO):
+		"""Add a message to the output log (safe to call from any thread)
+
+		Messages are queued and written to the widget by _flush_log().
+		"""
+		self.log_queue.put((level, message))
+
+	def _flush_log(self):
+		"""Write queued log messages in one bulk insert (runs on main thread)"""
+		threshold = LOG_LEVELS.get(self.log_level.get(), logging.DEBUG)
+		lines = []
+		try:
+			for _ in range(LOG_MAX_BATCH):
+				level, message = self.log_queue.get_nowait()
+				if self.log_file is not None:
+					self.log_file.write(f"{message}\n")
+				if level >= threshold:
+					lines.append(message)
+		except queue.Empty:
+			pass
+
+		if self.log_file is not None:
+			self.log_file.flush()
+
+		if lines:
+			self.output_text.config(state=tk.NORMAL)
+			self.output_text.insert(tk.END, "\n".join(lines) + "\n")
+			# Drop the oldest lines beyond the cap; "end-1c" is on the last line
+			line_count = int(self.output_text.index("end-1c").split(".")[0]) - 1
+			if line_count > LOG_MAX_LINES:
+				self.output_text.delete(
+					"1.0", f"{line_count - LOG_MAX_LINES + 1}.0"
+				)
+			self.output_text.see(tk.END)
+			self.output_text.config(state=tk.DISABLED)
+
+		self.root.after(LOG_FLUSH_INTERVAL_MS, self._flush_log)
+
+	def toggle_log_file(self):
+		"""Start or stop copying every log message to a file"""
+		if self.log_file is not None:
+			self.log_file.close()
+			self.log_file = None
+			self.log_file_btn.config(text="Log to File...")
+			return
+
+		filename = filedialog.asksaveasfilename(
+			title="Save Log As",
+			defaultextension=".log",
+			filetypes=[("Log files", "*.log"), ("All files", "*.*")],
+		)
+		if not filename:
+			return
+		try:
+			self.log_file = open(filename, "a", encoding="utf-8")
+		except OSError as e:
+			messagebox.showerror("Error", f"Could not open log file: {e}")
+			return
+		self.log_file_btn.config(text="Stop Logging to File")
+		self.log_message(f"Logging to {filename}")
+
+	def export_timings(self):
+		"""Save the per-file timings of the last batch"""
+		if self.batch_trace is None or not self.batch_trace.records:
+			return
+		filename = filedialog.asksaveasfilename(
+			title="Export Timings As",
+			defaultextension=".csv",
+			filetypes=[
+				("CSV files", "*.csv"),
+				("Chrome trace (chrome://tracing, Perfetto)", "*.trace.json"),
+				("JSON files", "*.json"),
+			],
+		)
+		if not filename:
+			return
+		try:
+			self.batch_trace.export(filename)
+		except OSError as e:
+			messagebox.showerror("Error", f"Could not export timings: {e}")
+			return
+		self.log_message(f"Timings exported to {filename}")
+
+	def _on_quit(self, event=None):
+		"""Handle quit shortcut; confirm if a conversion is running."""
+		if self.is_converting:
+			# Ask user to confirm aborting an ongoing conversion
+			quit_anyway = messagebox.askyesno(
+				"Quit", "A conversion is in progress. Quit anyway?"
+			)
+			if not quit_anyway:
+				return
+			if self.active_engine is not None:
+				self.active_engine.cancel()
+		# Cleanly close the app
+		for scan in self.folder_scans:
+			scan.cancel()
+		self.thumbnail_cache.shutdown()
+		if self.log_file is not None:
+			self.log_file.close()
+		try:
+			self.root.destroy()
+		except Exception:
+			pass
+
+
+def run():
+	"""Start the GUI and run it until its window is closed"""
+	root = tk.Tk()
+
+	# Set up the application icon and style
+	try:
+		# Try to use a nicer theme if available
+		style = ttk.Style()
+		available_themes = style.theme_names()
+		if "aqua" in available_themes:  # macOS
+			style.theme_use("aqua")
+		elif "clam" in available_themes:  # Cross-platform
+			style.theme_use("clam")
+	except:
+		pass  # Use default theme if styling fails
+
+	# Create and run the application
+	app = ImageMagickGUI(root)
+
+	# Center the window on screen
+	root.update_idletasks()
+	width = root.winfo_width()
+	height = root.winfo_height()
+	x = (root.winfo_screenwidth() // 2) - (width // 2)
+	y = (root.winfo_screenheight() // 2) - (height // 2)
+	root.geometry(f"{width}x{height}+{x}+{y}")
+
+	# Start the GUI event loop
+	root.mainloop()
+
@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+Image metadata lookup
+
+Reads width, height, page count and the true format of common image files
+straight from their headers (PNG, JPEG, GIF, BMP, WebP and TIFF), falling
+back to ImageMagick's identify only for formats it does not recognise.
+count_pages() also counts the pages of PDFs, from their page tree.
+
+For the preview pane, lookups run on a single background worker that always
+serves the most recent request (older pending requests are dropped when the
+selection moves on) and results are kept in a bounded LRU cache keyed by
+``(path, size, mtime)``, so revisiting a file is instant.
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from backend import ConversionError, resolve_backend
+
+
+# Enough for every fixed-position header handled below
+HEADER_BYTES = 64
+# Sizes of the DIB headers that BMP versions (OS/2, V1 to V5) start with
+BMP_HEADER_SIZES = {12, 40, 52, 56, 64, 108, 124}
+# Upper bound on IFDs walked when counting TIFF pages
+MAX_TIFF_PAGES = 10000
+# End of a PDF searched for startxref (the spec puts it in the last 1024)
+PDF_TAIL_BYTES = 4096
+# Bytes read of a PDF object or trailer; enough for the /Kids of a flat tree
+PDF_OBJECT_BYTES = 256 * 1024
+# Older cross-reference sections (incremental updates) followed at most
+MAX_PDF_XREF_SECTIONS = 64
+# Bytes at the start of a PDF searched for its page tree when the
+# cross-references cannot be read, in chunks of PDF_CHUNK_BYTES
+PDF_SCAN_BYTES = 4 * 1024 * 1024
+PDF_CHUNK_BYTES = 1024 * 1024
+# A /Pages dictionary of the page tree and its /Count, in either order
+_PDF_PAGES_COUNT = re.compile(
+	rb"/Type\s*/Pages\b[^>]{0,4096}?/Count\s+(\d+)"
+	rb"|/Count\s+(\d+)[^>]{0,4096}?/Type\s*/Pages\b"
+)
+_PDF_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_PDF_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PDF_PREV = re.compile(rb"/Prev\s+(\d+)")
+_PDF_PAGES_REF = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_PDF_COUNT = re.compile(rb"/Count\s+(\d+)(?!\s+\d+\s+R)")
+
+
+class LRUCache:
+	"""A small thread-safe least-recently-used cache"""
+
+	def __init__(self, max_entries=1024):
+		self.max_entries = max_entries
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		with self._lock:
+			try:
+				self._entries.move_to_end(key)
+			except KeyError:
+				return default
+			return self._entries[key]
+
+	def put(self, key, value):
+		with self._lock:
+			self._entries[key] = value
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+
+def cache_key(path):
+	"""Return the ``(path, size, mtime_ns)`` cache key for a file, or None"""
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _info(width, height, fmt, pages=1):
+	return {"width": width, "height": height, "format": fmt, "pages": pages}
+
+
+def _png_info(fh, head):
+	if head[12:16] != b"IHDR":
+		return None
+	width, height = struct.unpack(">II", head[16:24])
+	pages = 1
+	# An APNG announces its frame count in an acTL chunk before IDAT
+	fh.seek(8)
+	for _ in range(32):
+		chunk = fh.read(8)
+		if len(chunk) < 8:
+			break
+		length, chunk_type = struct.unpack(">I4s", chunk)
+		if chunk_type == b"acTL":
+			pages = struct.unpack(">I", fh.read(4))[0] or 1
+			break
+		if chunk_type == b"IDAT":
+			break
+		fh.seek(length + 4, os.SEEK_CUR)
+	return _info(width, height, "PNG", pages)
+
+
+# Start-of-frame markers (baseline, progressive, lossless, arithmetic...)
+_JPEG_SOF_MARKERS = {
+	0xC0,
+	0xC1,
+	0xC2,
+	0xC3,
+	0xC5,
+	0xC6,
+	0xC7,
+	0xC9,
+	0xCA,
+	0xCB,
+	0xCD,
+	0xCE,
+	0xCF,
+}
+
+
+def _jpeg_info(fh, head):
+	"""Scan JPEG segments up to the first start-of-frame marker"""
+	fh.seek(2)
+	while True:
+		byte = fh.read(1)
+		if not byte:
+			return None
+		if byte != b"\xff":
+			continue
+		marker = fh.read(1)
+		while marker == b"\xff":  # Fill bytes
+			marker = fh.read(1)
+		if not marker:
+			return None
+		code = marker[0]
+		if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+			continue  # Markers without a length
+		if code == 0xD9 or code == 0xDA:
+			return None  # End of image or start of scan before any SOF
+		length_bytes = fh.read(2)
+		if len(length_bytes) < 2:
+			return None
+		length = struct.unpack(">H", length_bytes)[0]
+		if length < 2:
+			return None  # The length counts its own two bytes
+		if code in _JPEG_SOF_MARKERS:
+			segment = fh.read(5)
+			if len(segment) < 5:
+				return None
+			height, width = struct.unpack(">HH", segment[1:5])
+			return _info(width, height, "JPEG")
+		fh.seek(length - 2, os.SEEK_CUR)
+
+
+def _gif_info(fh, head):
+	width, height = struct.unpack("<HH", head[6:10])
+	# Counting frames would mean reading the whole file
+	return _info(width, height, "GIF", None)
+
+
+def _is_bmp(head):
+	"""Whether a header starting with "BM" has a valid DIB header after it
+
+	Text and other files can start with "BM" too.
+	"""
+	if len(head) < 30:
+		return False
+	header_size = struct.unpack("<I", head[14:18])[0]
+	if header_size not in BMP_HEADER_SIZES:
+		return False
+	if header_size == 12:  # OS/2 BITMAPCOREHEADER
+		planes, bits = struct.unpack("<HH", head[22:26])
+	else:
+		planes, bits = struct.unpack("<HH", head[26:30])
+	return planes > 0 and bits > 0
+
+
+def _bmp_info(fh, head):
+	header_size = struct.unpack("<I", head[14:18])[0]
+	if header_size == 12:  # OS/2 BITMAPCOREHEADER
+		width, height = struct.unpack("<HH", head[18:22])
+	else:
+		width, height = struct.unpack("<ii", head[18:26])
+	return _info(abs(width), abs(height), "BMP")
+
+
+def _webp_info(fh, head):
+	chunk = head[12:16]
+	if chunk == b"VP8 ":
+		# Lossy: keyframe header, then the start code 9d 01 2a
+		if head[23:26] != b"\x9d\x01\x2a":
+			return None
+		width, height = struct.unpack("<HH", head[26:30])
+		return _info(width & 0x3FFF, height & 0x3FFF, "WEBP")
+	if chunk == b"VP8L":
+		if head[20] != 0x2F:
+			return None
+		bits = struct.unpack("<I", head[21:25])[0]
+		return _info((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, "WEBP")
+	if chunk == b"VP8X":
+		flags = head[20]
+		width = int.from_bytes(head[24:27], "little") + 1
+		height = int.from_bytes(head[27:30], "little") + 1
+		animated = bool(flags & 0x02)
+		return _info(width, height, "WEBP", None if animated else 1)
+	return None
+
+
+def _tiff_info(fh, head):
+	endian = "<" if head[:2] == b"II" else ">"
+	offset = struct.unpack(endian + "I", head[4:8])[0]
+	width = height = None
+	pages = 0
+	seen = set()
+	while offset and offset not in seen and pages < MAX_TIFF_PAGES:
+		seen.add(offset)
+		fh.seek(offset)
+		count_bytes = fh.read(2)
+		if len(count_bytes) < 2:
+			break
+		count = struct.unpack(endian + "H", count_bytes)[0]
+		entries = fh.read(count * 12)
+		next_bytes = fh.read(4)
+		if len(entries) < count * 12 or len(next_bytes) < 4:
+			break
+		if pages == 0:
+			for i in range(count):
+				entry = entries[i * 12 : i * 12 + 12]
+				tag, field_type = struct.unpack(endian + "HH", entry[:4])
+				if tag not in (256, 257):  # ImageWidth, ImageLength
+					continue
+				value = entry[8:12]
+				if field_type == 3:  # SHORT
+					value = struct.unpack(endian + "H", value[:2])[0]
+				else:
+					value = struct.unpack(endian + "I", value)[0]
+				if tag == 256:
+					width = value
+				else:
+					height = value
+		pages += 1
+		offset = struct.unpack(endian + "I", next_bytes)[0]
+	if width is None or height is None:
+		return None
+	return _info(width, height, "TIFF", pages or 1)
+
+
+def _sniff(head):
+	"""Return the header parser for the file's magic bytes, or None"""
+	if head.startswith(b"\x89PNG\r\n\x1a\n"):
+		return _png_info
+	if head.startswith(b"\xff\xd8\xff"):
+		return _jpeg_info
+	if head[:6] in (b"GIF87a", b"GIF89a"):
+		return _gif_info
+	if head.startswith(b"BM") and _is_bmp(head):
+		return _bmp_info
+	if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+		return _webp_info
+	if head[:4] in (b"II*\x00", b"MM\x00*"):
+		return _tiff_info
+	return None
+
+
+def is_image_file(path):
+	"""Whether a file's magic bytes identify a supported input format"""
+	try:
+		with open(path, "rb") as fh:
+			head = fh.read(HEADER_BYTES)
+	except OSError:
+		return False
+	return _sniff(head) is not None or head.startswith(b"%PDF-")
+
+
+def read_header_info(path):
+	"""Read dimensions, page count and format from a file's header
+
+	Returns a dict with ``width``, ``height``, ``format`` and ``pages``
+	(None when it cannot be known cheaply), or None when the format is not
+	recognised or the header is malformed.
+	"""
+	try:
+		with open(path, "rb") as fh:
+			head = fh.read(HEADER_BYTES)
+			parser = _sniff(head)
+			if parser is None or len(head) < 30:
+				return None
+			return parser(fh, head)
+	except (OSError, struct.error, IndexError):
+		return None
+
+
+def _pdf_xref_lookup(fh, xref, number):
+	"""Look up object ``number`` in the cross-reference table at offset ``xref``
+
+	Returns ``(offset, trailer)``: the object's offset, or None if this
+	section does not list it, and the trailer dictionary that follows.
+	Raises ValueError when there is no table there, as in PDFs that keep
+	their cross-references in streams.
+	"""
+	fh.seek(xref)
+	if fh.readline().strip() != b"xref":
+		raise ValueError("no cross-reference table")
+	offset = None
+	while True:
+		line = fh.readline()
+		if not line or line.lstrip().startswith(b"trailer"):
+			break
+		start, count = (int(field) for field in line.split())
+		entries = fh.tell()
+		if start <= number < start + count:
+			# Entries are 20 bytes: offset, generation, n (in use) or f (free)
+			fh.seek(entries + (number - start) * 20)
+			entry = fh.read(20).split()
+			if len(entry) == 3 and entry[2] == b"n":
+				offset = int(entry[0])
+		fh.seek(entries + count * 20)
+	if not line:
+		raise ValueError("no trailer")
+	trailer = (line + fh.read(PDF_OBJECT_BYTES)).split(b"startxref")[0]
+	return offset, trailer
+
+
+def _pdf_object(fh, xref, number):
+	"""The body of object ``number``, looked up from the section at ``xref``
+
+	Older sections are searched through the trailers' /Prev. Returns None
+	if the object is not found.
+	"""
+	for _ in range(MAX_PDF_XREF_SECTIONS):
+		offset, trailer = _pdf_xref_lookup(fh, xref, number)
+		if offset is not None:
+			fh.seek(offset)
+			data = fh.read(PDF_OBJECT_BYTES)
+			match = re.match(rb"\s*%d\s+\d+\s+obj\b" % number, data)
+			if match is None:
+				return None
+			return data[match.end() :].split(b"endobj")[0]
+		prev = _PDF_PREV.search(trailer)
+		if prev is None:
+			return None
+		xref = int(prev.group(1))
+	return None
+
+
+def _pdf_trailer_pages(fh, size):
+	"""The /Count of the page tree reached from the trailer, or None
+
+	Follows startxref to the trailer's /Root catalog and from there to its
+	/Pages, reading only those few objects.
+	"""
+	fh.seek(max(0, size - PDF_TAIL_BYTES))
+	startxref = _PDF_STARTXREF.findall(fh.read(PDF_TAIL_BYTES))
+	if not startxref:
+		return None
+	xref = int(startxref[-1])
+	root = _PDF_ROOT.search(_pdf_xref_lookup(fh, xref, -1)[1])
+	if root is None:
+		return None
+	catalog = _pdf_object(fh, xref, int(root.group(1)))
+	pages_ref = catalog and _PDF_PAGES_REF.search(catalog)
+	if not pages_ref:
+		return None
+	tree = _pdf_object(fh, xref, int(pages_ref.group(1)))
+	count = tree and _PDF_COUNT.search(tree)
+	return int(count.group(1)) if count else None
+
+
+def _pdf_scanned_pages(fh):
+	"""The /Count of the root of the page tree in the start of a PDF, or None
+
+	Only the root has no /Parent, so a count that is found is the total
+	even though the rest of the file is not read.
+	"""
+	tail = b""
+	scanned = 0
+	while scanned < PDF_SCAN_BYTES:
+		chunk = fh.read(PDF_CHUNK_BYTES)
+		if not chunk:
+			break
+		scanned += len(chunk)
+		# Overlap the chunks so a dictionary across a boundary is found
+		data = tail + chunk
+		tail = data[-8192:]
+		for match in _PDF_PAGES_COUNT.finditer(data):
+			start = max(0, data.rfind(b"<<", 0, match.start()))
+			end = data.find(b">>", match.end())
+			if b"/Parent" not in data[start : end if end >= 0 else None]:
+				return int(match.group(1) or match.group(2))
+	return None
+
+
+def count_pdf_pages(path):
+	"""Read the page count of a PDF from its page tree, or None if not found
+
+	The trailer at the end of the file leads to the page tree through the
+	cross-reference table, so usually only a few small reads are needed.
+	PDFs whose cross-references cannot be followed (cross-reference
+	streams, damaged files) fall back to searching the first
+	PDF_SCAN_BYTES for the root of the page tree. Page trees kept in
+	compressed object streams are not found either way.
+	"""
+	try:
+		with open(path, "rb") as fh:
+			if fh.read(5) != b"%PDF-":
+				return None
+			try:
+				pages = _pdf_trailer_pages(fh, os.fstat(fh.fileno()).st_size)
+			except ValueError:
+				pages = None
+			if not pages:
+				fh.seek(0)
+				pages = _pdf_scanned_pages(fh)
+	except OSError:
+		return None
+	return pages or None
+
+
+def count_pages(path):
+	"""Number of pages of a TIFF or PDF, or None for other or unreadable files"""
+	info = read_header_info(path)
+	if info is not None:
+		return info["pages"] if info["format"] == "TIFF" else None
+	return count_pdf_pages(path)
+
+
+def get_image_info(backend, path):
+	"""Return image metadata, from the header when possible, else via identify"""
+	info = read_header_info(path)
+	if info is None:
+		info = identify_info(backend, path)
+	return info
+
+
+def identify_info(backend, path):
+	"""Look up width, height and format with ImageMagick's identify"""
+	info = _info(None, None, None, None)
+	if backend is None:
+		return info
+	try:
+		output = backend.identify(path, "%w %h %m")
+	except ConversionError:
+		return info
+	parts = output.split()
+	if len(parts) >= 3 and parts[0].isdigit() and parts[1].isdigit():
+		info["width"] = int(parts[0])
+		info["height"] = int(parts[1])
+		info["format"] = parts[2]
+	return info
+
+
+class MetadataLoader:
+	"""Look up image metadata on a background thread
+
+	Only the newest request is served: a request that is still waiting when
+	another one arrives is dropped, and callbacks are not delivered for
+	requests that were superseded while they ran.
+	"""
+
+	def __init__(self, backend, cache_size=1024):
+		self.backend = backend
+		self.cache = LRUCache(cache_size)
+		self._condition = threading.Condition()
+		self._pending = None  # (key, path, callback)
+		self._generation = 0
+		self._thread = None
+
+	def lookup(self, path):
+		"""Return cached metadata for a file, or None if it is not cached"""
+		key = cache_key(path)
+		return None if key is None else self.cache.get(key)
+
+	def request(self, path, callback):
+		"""Fetch metadata for a file
+
+		Returns the metadata right away when it is cached or can be read
+		from the file header. Otherwise returns
+		None and later calls ``callback(path, info)`` from the worker thread,
+		unless a newer request has been made by then.
+		"""
+		key = cache_key(path)
+		if key is None:
+			return None
+		info = self.cache.get(key)
+		if info is None:
+			info = read_header_info(path)
+			if info is not None:
+				self.cache.put(key, info)
+		if info is not None:
+			with self._condition:
+				# A cache hit still supersedes whatever was pending
+				self._generation += 1
+				self._pending = None
+			return info
+
+		with self._condition:
+			self._generation += 1
+			self._pending = (key, path, callback)
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, daemon=True)
+				self._thread.start()
+			self._condition.notify()
+		return None
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while self._pending is None:
+					self._condition.wait()
+				key, path, callback = self._pending
+				self._pending = None
+				generation = self._generation
+
+			info = self.cache.get(key)
+			if info is None:
+				info = get_image_info(self.backend, path)
+				self.cache.put(key, info)
+
+			with self._condition:
+				current = generation == self._generation
+			if current:
+				callback(path, info)
+
+
+def _generate_corpus(backend, directory, count):
+	"""Write a synthetic corpus of ``count`` files per format with ImageMagick"""
+	sizes = ["16x16", "640x480", "1920x1080", "4000x3000"]
+	files = []
+	for fmt in ["png", "jpg", "gif", "bmp", "webp", "tiff"]:
+		if not backend.can_write(fmt):
+			continue
+		for i in range(count):
+			path = os.path.join(directory, f"sample_{i}.{fmt}")
+			size = sizes[i % len(sizes)]
+			backend.run(
+				backend.command("convert", "-size", size, "plasma:fractal", path),
+				timeout=120,
+			)
+			files.append(path)
+	return files
+
+
+def benchmark(backend, files):
+	"""Time the header parser against identify; returns a dict of results"""
+	started = time.perf_counter()
+	parsed = [read_header_info(path) for path in files]
+	header_seconds = time.perf_counter() - started
+
+	started = time.perf_counter()
+	identified = [identify_info(backend, path) for path in files]
+	identify_seconds = time.perf_counter() - started
+
+	mismatches = [
+		path
+		for path, header, ident in zip(files, parsed, identified)
+		if header is not None
+		and ident["width"] is not None
+		and (header["width"], header["height"]) != (ident["width"], ident["height"])
+	]
+	return {
+		"files": len(files),
+		"parsed": sum(info is not None for info in parsed),
+		"header_seconds": header_seconds,
+		"identify_seconds": identify_seconds,
+		"mismatches": mismatches,
+	}
+
+
+def main(argv=None):
+	"""Benchmark the header parser against identify"""
+	parser = argparse.ArgumentParser(
+		description="Benchmark the header parser against ImageMagick identify."
+	)
+	parser.add_argument(
+		"files", nargs="*", help="files to read (default: a generated corpus)"
+	)
+	parser.add_argument(
+		"--count",
+		type=int,
+		default=8,
+		help="generated files per format (default: 8)",
+	)
+	args = parser.parse_args(argv)
+
+	backend = resolve_backend()
+	if backend is None:
+		print("error: ImageMagick not found", file=sys.stderr)
+		return 2
+
+	with tempfile.TemporaryDirectory() as directory:
+		files = args.files or _generate_corpus(backend, directory, args.count)
+		results = benchmark(backend, files)
+
+	per_file = 1000 / max(1, results["files"])
+	print(f"Files:     {results['files']} ({results['parsed']} parsed from headers)")
+	print(
+		f"Header:    {results['header_seconds'] * per_file:.3f} ms/file "
+		f"({results['header_seconds']:.3f}s)"
+	)
+	print(
+		f"Identify:  {results['identify_seconds'] * per_file:.3f} ms/file "
+		f"({results['identify_seconds']:.3f}s)"
+	)
+	if results["header_seconds"]:
+		speedup = results["identify_seconds"] / results["header_seconds"]
+		print(f"Speedup:   {speedup:.0f}x")
+	for path in results["mismatches"]:
+		print(f"Mismatch:  {path}")
+	return 1 if results["mismatches"] else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
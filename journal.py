@@ -0,0 +1,313 @@
+"""
+Crash-safe batch journal
+
+Every batch is recorded in an SQLite database in the user cache directory:
+the settings it was started with and, for every input, whether it is
+pending, running, done or failed, with its output, error and timings. The
+database is in WAL mode and written by a background thread that commits
+at most once per COMMIT_INTERVAL, so journaling costs the conversion a
+queue put per file. If the application is closed or crashes halfway
+through a batch, resuming it converts the files that are not done (failed
+ones included) with the batch's settings; a crash loses at most the last
+interval's updates, whose files are simply converted again.
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from backend import get_cache_dir
+
+
+JOURNAL_NAME = "journal.sqlite3"
+# Commit queued updates at least this often, and when this many are queued
+COMMIT_INTERVAL = 1.0
+COMMIT_ROWS = 2000
+# Older batches are deleted when a new one starts
+KEEP_BATCHES = 20
+
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+	id INTEGER PRIMARY KEY,
+	started REAL NOT NULL,
+	finished REAL,
+	settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+	batch INTEGER NOT NULL,
+	position INTEGER NOT NULL,
+	input TEXT NOT NULL,
+	state TEXT NOT NULL,
+	output TEXT,
+	error TEXT,
+	elapsed REAL,
+	cpu_time REAL,
+	PRIMARY KEY (batch, input)
+);
+"""
+
+_STOP = object()
+
+
+def journal_path():
+	return get_cache_dir() / JOURNAL_NAME
+
+
+def _connect(path):
+	connection = sqlite3.connect(str(path), timeout=30)
+	connection.execute("PRAGMA journal_mode=WAL")
+	# Durable enough in WAL mode: a power loss may only lose recent commits
+	connection.execute("PRAGMA synchronous=NORMAL")
+	connection.executescript(_SCHEMA)
+	return connection
+
+
+class ResumableBatch:
+	"""A journaled batch with files left to convert"""
+
+	def __init__(self, batch_id, settings, remaining, total, finished):
+		self.id = batch_id
+		self.settings = settings  # ConversionEngine.batch_settings()
+		self.remaining = remaining  # Input paths not done, in batch order
+		self.total = total
+		self.finished = finished  # False if the batch was interrupted
+
+	def describe(self):
+		state = "finished with failures" if self.finished else "interrupted"
+		return (
+			f"batch {self.id} ({state}): {len(self.remaining)} of {self.total} "
+			"files left"
+		)
+
+
+def find_batch(batch_id=None, path=None):
+	"""The batch to resume: ``batch_id``, or else the most recent batch
+
+	Returns a ResumableBatch, or None if that batch has nothing left to
+	convert (or there is no such batch).
+	"""
+	path = path or journal_path()
+	if not path.exists():
+		return None
+	try:
+		connection = _connect(path)
+		try:
+			if batch_id is None:
+				row = connection.execute(
+					"SELECT id, settings, finished FROM batches "
+					"ORDER BY id DESC LIMIT 1"
+				).fetchone()
+			else:
+				row = connection.execute(
+					"SELECT id, settings, finished FROM batches WHERE id = ?",
+					(batch_id,),
+				).fetchone()
+			if row is None:
+				return None
+			batch_id, settings, finished = row
+			total = connection.execute(
+				"SELECT COUNT(*) FROM files WHERE batch = ?", (batch_id,)
+			).fetchone()[0]
+			remaining = [
+				input_path
+				for (input_path,) in connection.execute(
+					"SELECT input FROM files WHERE batch = ? AND state != ? "
+					"ORDER BY position",
+					(batch_id, STATE_DONE),
+				)
+			]
+		finally:
+			connection.close()
+	except sqlite3.Error:
+		return None
+	if not remaining:
+		return None
+	return ResumableBatch(
+		batch_id, json.loads(settings), remaining, total, finished is not None
+	)
+
+
+class BatchJournal:
+	"""The journal of one batch
+
+	Safe to use from several threads. Updates are queued for the writer
+	thread; close() (also called at exit) writes whatever is still queued.
+	The journal never fails a conversion: if the database cannot be
+	written, updates are dropped.
+	"""
+
+	def __init__(self, batch_id, path, next_position=0, prune=False):
+		self.id = batch_id
+		self.path = path
+		self._position = next_position
+		self._position_lock = threading.Lock()
+		self._queue = queue.SimpleQueue()
+		self._closed = False
+		self._writer = threading.Thread(
+			target=self._write, args=(prune,), name="batch-journal", daemon=True
+		)
+		self._writer.start()
+		atexit.register(self.close)
+
+	@classmethod
+	def create(cls, settings, path=None):
+		"""Start journaling a new batch; None if the journal cannot be opened"""
+		path = path or journal_path()
+		try:
+			path.parent.mkdir(parents=True, exist_ok=True)
+			connection = _connect(path)
+			try:
+				with connection:
+					batch_id = connection.execute(
+						"INSERT INTO batches (started, settings) VALUES (?, ?)",
+						(time.time(), json.dumps(settings, sort_keys=True)),
+					).lastrowid
+			finally:
+				connection.close()
+		except (OSError, sqlite3.Error):
+			return None
+		return cls(batch_id, path, prune=True)
+
+	@classmethod
+	def resume(cls, batch_id, path=None):
+		"""Continue journaling a batch found by find_batch(); None on failure"""
+		path = path or journal_path()
+		try:
+			connection = _connect(path)
+			try:
+				with connection:
+					connection.execute(
+						"UPDATE batches SET finished = NULL WHERE id = ?", (batch_id,)
+					)
+				last = connection.execute(
+					"SELECT MAX(position) FROM files WHERE batch = ?", (batch_id,)
+				).fetchone()[0]
+			finally:
+				connection.close()
+		except (OSError, sqlite3.Error):
+			return None
+		return cls(batch_id, path, next_position=(last or 0) + 1)
+
+	def add(self, input_paths):
+		"""Record inputs as pending; inputs already in the batch are kept"""
+		rows = []
+		with self._position_lock:
+			for input_path in input_paths:
+				rows.append((self.id, self._position, str(input_path), STATE_PENDING))
+				self._position += 1
+		self._put(
+			"INSERT OR IGNORE INTO files (batch, position, input, state) "
+			"VALUES (?, ?, ?, ?)",
+			rows,
+		)
+
+	def running(self, input_paths):
+		self._put(
+			"UPDATE files SET state = ? WHERE batch = ? AND input = ?",
+			[(STATE_RUNNING, self.id, str(path)) for path in input_paths],
+		)
+
+	def record(self, result):
+		"""Record a ConversionResult; cancelled files are pending again"""
+		if result.success:
+			state = STATE_DONE
+		elif result.cancelled:
+			state = STATE_PENDING
+		else:
+			state = STATE_FAILED
+		self._put(
+			"UPDATE files SET state = ?, output = ?, error = ?, elapsed = ?, "
+			"cpu_time = ? WHERE batch = ? AND input = ?",
+			[
+				(
+					state,
+					str(result.output_path),
+					None if result.error is None else str(result.error),
+					result.elapsed,
+					result.cpu_time,
+					self.id,
+					str(result.input_path),
+				)
+			],
+		)
+
+	def close(self, finished=False):
+		"""Write queued updates and stop; ``finished`` marks the batch as over
+
+		Safe to call more than once; updates made after are dropped.
+		"""
+		if self._closed:
+			return
+		if finished:
+			self._put(
+				"UPDATE batches SET finished = ? WHERE id = ?", [(time.time(), self.id)]
+			)
+		self._closed = True
+		atexit.unregister(self.close)
+		self._queue.put(_STOP)
+		self._writer.join()
+
+	def _put(self, sql, rows):
+		if not self._closed:
+			self._queue.put((sql, rows))
+
+	def _write(self, prune):
+		try:
+			connection = _connect(self.path)
+		except sqlite3.Error:
+			connection = None
+		if connection is not None and prune:
+			self._prune(connection)
+		queued = 0
+		last_commit = time.monotonic()
+		while True:
+			try:
+				item = self._queue.get(timeout=COMMIT_INTERVAL)
+			except queue.Empty:
+				item = None
+			if item is not _STOP and item is not None and connection is not None:
+				try:
+					connection.executemany(*item)
+					queued += len(item[1])
+				except sqlite3.Error:
+					connection.close()
+					connection = None  # Drop updates from now on
+			now = time.monotonic()
+			if connection is not None and queued and (
+				item is _STOP
+				or queued >= COMMIT_ROWS
+				or now - last_commit >= COMMIT_INTERVAL
+			):
+				try:
+					connection.commit()
+				except sqlite3.Error:
+					connection.close()
+					connection = None
+				queued = 0
+				last_commit = now
+			if item is _STOP:
+				break
+		if connection is not None:
+			connection.close()
+
+	def _prune(self, connection):
+		"""Delete all but the KEEP_BATCHES most recent batches"""
+		try:
+			with connection:
+				row = connection.execute(
+					"SELECT id FROM batches ORDER BY id DESC LIMIT 1 OFFSET ?",
+					(KEEP_BATCHES - 1,),
+				).fetchone()
+				if row is not None:
+					connection.execute("DELETE FROM files WHERE batch < ?", row)
+					connection.execute("DELETE FROM batches WHERE id < ?", row)
+		except sqlite3.Error:
+			pass
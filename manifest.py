@@ -0,0 +1,189 @@
+"""
+Incremental conversion manifest
+
+A manifest lives in each output directory and remembers, for every input
+converted into it, the input's size, mtime and content hash, the settings
+used and the size, mtime and hash of the output that was written. A file
+whose input, settings and output all still match is up to date and can be
+skipped on the next run.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+MANIFEST_NAME = ".imagemagick-gui-manifest.json"
+MANIFEST_VERSION = 1
+
+# Save at most this often while a batch is running
+SAVE_INTERVAL = 30.0
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+	"""Return the BLAKE2b hex digest of a file's contents"""
+	digest = hashlib.blake2b(digest_size=20)
+	with open(path, "rb") as fh:
+		for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def settings_key(settings):
+	"""Return a stable string for a settings dict"""
+	return json.dumps(settings, sort_keys=True, separators=(",", ":"))
+
+
+def _stat(path):
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return stat.st_size, stat.st_mtime_ns
+
+
+class Manifest:
+	"""The manifest of one output directory"""
+
+	def __init__(self, directory):
+		self.path = Path(directory) / MANIFEST_NAME
+		self.entries = {}  # absolute input path -> entry dict
+		self.dirty = False
+		self.last_saved = time.monotonic()
+		self.lock = threading.Lock()
+		# Held for a whole save(), so only one thread writes the file at a time
+		self._save_lock = threading.Lock()
+		self._load()
+
+	def _load(self):
+		try:
+			with open(self.path, "r", encoding="utf-8") as fh:
+				data = json.load(fh)
+		except (OSError, ValueError):
+			return
+		if data.get("version") == MANIFEST_VERSION:
+			self.entries = data.get("entries", {})
+
+	def is_current(self, input_path, output_path, settings):
+		"""Whether output_path is an up-to-date conversion of input_path
+
+		Size and mtime are compared first; content hashes are only computed
+		when those differ, so touched-but-identical files are still skipped.
+		"""
+		key = os.path.abspath(input_path)
+		with self.lock:
+			entry = self.entries.get(key)
+		if (
+			entry is None
+			or entry["output"] != os.path.abspath(output_path)
+			or entry["settings"] != settings_key(settings)
+		):
+			return False
+
+		input_stat = _stat(input_path)
+		output_stat = _stat(output_path)
+		if input_stat is None or output_stat is None:
+			return False
+
+		updated = dict(entry)
+		try:
+			if list(input_stat) != [entry["size"], entry["mtime_ns"]]:
+				if input_stat[0] != entry["size"] or hash_file(input_path) != entry["hash"]:
+					return False
+				updated["size"], updated["mtime_ns"] = input_stat
+			if list(output_stat) != [entry["output_size"], entry["output_mtime_ns"]]:
+				if (
+					output_stat[0] != entry["output_size"]
+					or hash_file(output_path) != entry["output_hash"]
+				):
+					return False
+				updated["output_size"], updated["output_mtime_ns"] = output_stat
+		except OSError:
+			return False
+
+		if updated != entry:
+			with self.lock:
+				self.entries[key] = updated
+				self.dirty = True
+		return True
+
+	def record(self, input_path, output_path, settings):
+		"""Record a successful conversion"""
+		input_stat = _stat(input_path)
+		output_stat = _stat(output_path)
+		if input_stat is None or output_stat is None:
+			return
+		try:
+			entry = {
+				"size": input_stat[0],
+				"mtime_ns": input_stat[1],
+				"hash": hash_file(input_path),
+				"settings": settings_key(settings),
+				"output": os.path.abspath(output_path),
+				"output_size": output_stat[0],
+				"output_mtime_ns": output_stat[1],
+				"output_hash": hash_file(output_path),
+			}
+		except OSError:
+			return
+		with self.lock:
+			self.entries[os.path.abspath(input_path)] = entry
+			self.dirty = True
+		if time.monotonic() - self.last_saved > SAVE_INTERVAL:
+			self.save(min_interval=SAVE_INTERVAL)
+
+	def save(self, min_interval=None):
+		"""Write the manifest if it changed (atomically)
+
+		With ``min_interval``, only if the last save is older than that many
+		seconds, checked again once no other thread is saving.
+		"""
+		with self._save_lock:
+			with self.lock:
+				if not self.dirty:
+					return
+				if (
+					min_interval is not None
+					and time.monotonic() - self.last_saved <= min_interval
+				):
+					return
+				data = {"version": MANIFEST_VERSION, "entries": dict(self.entries)}
+				self.dirty = False
+				self.last_saved = time.monotonic()
+			tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+			try:
+				self.path.parent.mkdir(parents=True, exist_ok=True)
+				with open(tmp_path, "w", encoding="utf-8") as fh:
+					json.dump(data, fh, separators=(",", ":"))
+				os.replace(tmp_path, self.path)
+			except OSError:
+				with self.lock:
+					self.dirty = True
+
+
+class ManifestSet:
+	"""Lazily loaded manifests, one per output directory"""
+
+	def __init__(self):
+		self.manifests = {}
+		self.lock = threading.Lock()
+
+	def for_output(self, output_path):
+		directory = os.path.dirname(os.path.abspath(output_path))
+		with self.lock:
+			manifest = self.manifests.get(directory)
+			if manifest is None:
+				manifest = Manifest(directory)
+				self.manifests[directory] = manifest
+			return manifest
+
+	def save(self):
+		with self.lock:
+			manifests = list(self.manifests.values())
+		for manifest in manifests:
+			manifest.save()
@@ -0,0 +1,88 @@
+"""
+Several outputs per input
+
+An output spec is a format, optionally with a size the image is shrunk to
+fit: ``FORMAT[:WIDTHxHEIGHT]``, such as ``png``, ``webp`` or ``jpg:320x320``
+(``jpg:320x`` and ``jpg:x240`` bound one side only). A batch can write
+several specs per input from one ImageMagick call, so each input is read
+and decoded once however many outputs it gets: the first spec is the
+primary output, written last, and every other one is written from a clone
+of the decoded image (``( -clone 0--1 -resize ... -write out -delete 0--1 )``).
+Clones share the decoded pixels until they are resized, so they cost
+little memory.
+
+Outputs are named after the input as before; a spec with a size adds it
+to the name (``photo_converted_320x320.jpg``) so that it does not clash
+with a full-size output in the same format.
+"""
+
+import re
+
+
+_SIZE = re.compile(r"^(\d+)?(?:x(\d+)?)?$")
+
+
+class OutputSpec:
+	"""One output written for every input"""
+
+	def __init__(self, fmt, size=None):
+		self.format = fmt.lower()
+		self.size = size  # ImageMagick geometry such as "320x320", or None
+
+	@classmethod
+	def parse(cls, text):
+		"""Parse ``FORMAT[:WIDTHxHEIGHT]``; raises ValueError"""
+		fmt, _, size = text.strip().partition(":")
+		if not fmt.isalnum():
+			raise ValueError(f"not an output format: {text!r}")
+		size = size.strip().lower() or None
+		if size is not None:
+			match = _SIZE.match(size)
+			if match is None or not any(match.groups()):
+				raise ValueError(f"not a size (WIDTHxHEIGHT): {size!r}")
+			if any(int(side) == 0 for side in match.groups() if side is not None):
+				raise ValueError(f"not a size (WIDTHxHEIGHT): {size!r}")
+		return cls(fmt, size)
+
+	def __str__(self):
+		return self.format if self.size is None else f"{self.format}:{self.size}"
+
+	def __eq__(self, other):
+		return isinstance(other, OutputSpec) and str(self) == str(other)
+
+	def __hash__(self):
+		return hash(str(self))
+
+	def name_suffix(self):
+		"""What the spec adds to an output's file name, before the extension"""
+		return "" if self.size is None else f"_{self.size}"
+
+	def resize_options(self):
+		"""Options shrinking the image to the spec's size (never enlarging it)"""
+		return [] if self.size is None else ["-resize", f"{self.size}>"]
+
+
+def parse_output_specs(text):
+	"""Parse comma-separated output specs into a list; raises ValueError"""
+	specs = [OutputSpec.parse(part) for part in text.split(",") if part.strip()]
+	if not specs:
+		raise ValueError("no output format given")
+	seen = set()
+	for spec in specs:
+		if spec in seen:
+			raise ValueError(f"output {spec} is listed twice")
+		seen.add(spec)
+	return specs
+
+
+def fan_out_options(outputs):
+	"""Options writing each ``(spec, path)`` from a clone of the current images
+
+	They go after the input and before the primary output's own options,
+	which then apply to the primary output alone.
+	"""
+	args = []
+	for spec, path in outputs:
+		args += ["(", "-clone", "0--1", *spec.resize_options()]
+		args += ["-write", str(path), "-delete", "0--1", ")"]
+	return args
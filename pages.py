@@ -0,0 +1,164 @@
+"""
+Page-parallel conversion of multi-page documents
+
+A single magick process converting a 300-page PDF rasterizes the pages one
+after another, on one worker. ConversionEngine instead splits multi-page
+PDFs and TIFFs into page ranges (``input.pdf[10-19]``), each converted by a
+worker of its own. Outputs in single-image formats (PNG, JPEG, BMP) are
+numbered per page the way ImageMagick names them itself (``out-0.png``,
+``out-1.png``...). For formats that hold several pages (TIFF, PDF, GIF,
+WebP) every range is written to a lossless MIFF file in the scratch
+directory, and the worker that finishes the last range joins them into the
+output with one more magick call.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+
+# Input extensions whose pages are counted and split
+PAGED_EXTENSIONS = {".pdf", ".tif", ".tiff"}
+# Input extensions rasterized at the engine's density
+VECTOR_EXTENSIONS = {".pdf", ".ps", ".eps", ".ai", ".svg"}
+# Output formats that hold several pages in one file
+MULTI_PAGE_FORMATS = {"tif", "tiff", "pdf", "gif", "webp"}
+
+# Inputs with fewer pages are converted in one piece
+MIN_SPLIT_PAGES = 2
+# Page ranges per worker, so that workers finishing early can take another
+PARTS_PER_WORKER = 2
+# Lossless format of the ranges joined into multi-page outputs
+PART_FORMAT = "miff"
+
+
+def page_ranges(pages, parts):
+	"""Split ``pages`` pages into ``parts`` contiguous ``(first, last)`` ranges"""
+	parts = max(1, min(parts, pages))
+	size, extra = divmod(pages, parts)
+	ranges = []
+	first = 0
+	for part in range(parts):
+		last = first + size + (1 if part < extra else 0) - 1
+		ranges.append((first, last))
+		first = last + 1
+	return ranges
+
+
+def page_output_path(output_path, page):
+	"""The output written for one page: ``out.png`` -> ``out-<page>.png``"""
+	output_path = Path(output_path)
+	return output_path.with_name(f"{output_path.stem}-{page}{output_path.suffix}")
+
+
+def numbered_output_pattern(output_path):
+	"""An output filename ImageMagick numbers with each page's scene number"""
+	output_path = Path(output_path)
+	# A literal % would be taken for a format character
+	prefix = str(output_path.with_name(f"{output_path.stem}-")).replace("%", "%%")
+	return f"{prefix}%d{output_path.suffix.replace('%', '%%')}"
+
+
+def output_size(output_path):
+	"""``(bytes, pages)`` written for an output, or ``(0, 0)`` if there is none
+
+	``pages`` is 0 for a single output file, or the number of numbered
+	per-page outputs written instead (``out-0.png``, ``out-1.png``...).
+	"""
+	try:
+		return os.path.getsize(output_path), 0
+	except OSError:
+		pass
+	size = 0
+	pages = 0
+	while True:
+		try:
+			size += os.path.getsize(page_output_path(output_path, pages))
+		except OSError:
+			return size, pages
+		pages += 1
+
+
+class PagePart:
+	"""One page range of a PagedInput and how its conversion went"""
+
+	def __init__(self, paged, first, last):
+		self.paged = paged
+		self.first = first
+		self.last = last
+		self.error = None  # ConversionError, or None on success
+		self.started = None
+		self.elapsed = 0.0
+		self.queue_wait = 0.0
+		self.spawn_time = 0.0
+		self.cpu_time = None
+		self.worker = ""
+
+	@property
+	def pages(self):
+		return self.last - self.first + 1
+
+	@property
+	def source(self):
+		"""The input, limited to this range, as ImageMagick reads it"""
+		return f"{self.paged.input_path}[{self.first}-{self.last}]"
+
+	@property
+	def part_path(self):
+		"""Where the range is written before being joined"""
+		return os.path.join(
+			self.paged.part_dir, f"pages-{self.first:06d}.{PART_FORMAT}"
+		)
+
+
+class PagedInput:
+	"""A multi-page input converted as several page ranges
+
+	finish() is called as each range is done; the call that finishes the
+	last range returns True, and its worker completes the conversion.
+	"""
+
+	def __init__(
+		self, index, input_path, output_path, pages, parts, numbered, measure
+	):
+		self.index = index
+		self.input_path = input_path
+		self.output_path = output_path
+		self.pages = pages
+		self.measure = measure  # The input's (bytes, pixels)
+		# Write numbered per-page outputs instead of joining the ranges
+		self.numbered = numbered
+		self.parts = [
+			PagePart(self, first, last) for first, last in page_ranges(pages, parts)
+		]
+		self.part_dir = None  # Scratch directory of the ranges to join
+		self._remaining = len(self.parts)
+		self._lock = threading.Lock()
+
+	def make_part_dir(self, scratch_dir):
+		"""Create the scratch directory for the ranges, if they are joined"""
+		if not self.numbered:
+			self.part_dir = tempfile.mkdtemp(
+				prefix="imagemagick-gui-pages-", dir=scratch_dir
+			)
+
+	def remove_part_dir(self):
+		if self.part_dir is not None:
+			shutil.rmtree(self.part_dir, ignore_errors=True)
+			self.part_dir = None
+
+	def finish(self):
+		"""Mark one range as done; True once every range is"""
+		with self._lock:
+			self._remaining -= 1
+			return self._remaining == 0
+
+	@property
+	def error(self):
+		"""The error of the first range that failed, or None"""
+		for part in self.parts:
+			if part.error is not None:
+				return part.error
+		return None
@@ -0,0 +1,126 @@
+"""
+Batch progress tracking
+
+Measures throughput (files, bytes and megapixels per second) over a rolling
+window and estimates the time remaining from the input bytes still to be
+converted. The tracker is updated from the conversion thread and read on a
+timer, so how often the display refreshes does not depend on how fast files
+complete.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+# Throughput is measured over the most recent completions in this window
+RATE_WINDOW = 30.0
+
+
+def format_duration(seconds):
+	"""Format a number of seconds as e.g. "45s", "3m 12s" or "2h 05m" """
+	if seconds is None:
+		return "unknown"
+	seconds = int(round(seconds))
+	if seconds < 60:
+		return f"{seconds}s"
+	minutes, seconds = divmod(seconds, 60)
+	if minutes < 60:
+		return f"{minutes}m {seconds:02d}s"
+	hours, minutes = divmod(minutes, 60)
+	return f"{hours}h {minutes:02d}m"
+
+
+class ProgressSnapshot:
+	"""A consistent view of a batch's progress at one point in time"""
+
+	def __init__(self, **fields):
+		self.completed = fields["completed"]
+		self.total = fields["total"]
+		self.bytes_done = fields["bytes_done"]
+		self.total_bytes = fields["total_bytes"]
+		self.elapsed = fields["elapsed"]
+		self.files_per_second = fields["files_per_second"]
+		self.bytes_per_second = fields["bytes_per_second"]
+		self.megapixels_per_second = fields["megapixels_per_second"]
+		self.eta = fields["eta"]
+
+	def to_dict(self):
+		return dict(vars(self))
+
+	def describe(self):
+		"""One-line human-readable summary"""
+		return (
+			f"{self.completed}/{self.total} files · "
+			f"{self.files_per_second:.1f} files/s · "
+			f"{self.bytes_per_second / (1024 * 1024):.1f} MB/s · "
+			f"{self.megapixels_per_second:.1f} MP/s · "
+			f"ETA {format_duration(self.eta)}"
+		)
+
+
+class ProgressTracker:
+	"""Thread-safe progress accounting for one batch"""
+
+	def __init__(self, total, total_bytes, window=RATE_WINDOW):
+		self.total = total
+		self.total_bytes = total_bytes
+		self.window = window
+		self.started = time.monotonic()
+		self.completed = 0
+		self.bytes_done = 0
+		self.pixels_done = 0
+		self._recent = deque()  # (timestamp, files, bytes, pixels)
+		self._lock = threading.Lock()
+
+	def add_files(self, files=1, input_bytes=0):
+		"""Grow the batch, for inputs that arrive after it started"""
+		with self._lock:
+			self.total += files
+			self.total_bytes += input_bytes
+
+	def record(self, input_bytes=0, pixels=0, files=1):
+		"""Record completed files"""
+		now = time.monotonic()
+		with self._lock:
+			self.completed += files
+			self.bytes_done += input_bytes
+			self.pixels_done += pixels
+			self._recent.append((now, files, input_bytes, pixels))
+			while self._recent and now - self._recent[0][0] > self.window:
+				self._recent.popleft()
+
+	def snapshot(self):
+		"""Return the current ProgressSnapshot"""
+		now = time.monotonic()
+		with self._lock:
+			elapsed = now - self.started
+			recent = [item for item in self._recent if now - item[0] <= self.window]
+			# Until the window has filled up, measure from the start of the batch
+			span = min(elapsed, self.window) or 1e-9
+			files_rate = sum(item[1] for item in recent) / span
+			bytes_rate = sum(item[2] for item in recent) / span
+			pixels_rate = sum(item[3] for item in recent) / span
+
+			remaining_files = self.total - self.completed
+			remaining_bytes = max(0, self.total_bytes - self.bytes_done)
+			if remaining_files <= 0:
+				eta = 0.0
+			elif bytes_rate > 0 and remaining_bytes > 0:
+				eta = remaining_bytes / bytes_rate
+			elif files_rate > 0:
+				eta = remaining_files / files_rate
+			else:
+				eta = None
+
+			return ProgressSnapshot(
+				completed=self.completed,
+				total=self.total,
+				bytes_done=self.bytes_done,
+				total_bytes=self.total_bytes,
+				elapsed=elapsed,
+				files_per_second=files_rate,
+				bytes_per_second=bytes_rate,
+				megapixels_per_second=pixels_rate / 1e6,
+				eta=eta,
+			)
@@ -0,0 +1,261 @@
+"""
+ImageMagick resource limits
+
+ImageMagick spreads every conversion over all cores with OpenMP and sizes
+its pixel cache from the machine's memory, so several magick processes
+running side by side oversubscribe the CPU and RAM and thrash. Each process
+is therefore given ``-limit`` settings that divide the cores and the
+available memory between the parallel workers.
+
+Which mix of processes and threads per process is fastest depends on the
+machine and the images, so it can be measured (engine.calibrate()) and the
+result is remembered per machine and ImageMagick build.
+
+Inputs whose pixel cache would not fit in a process's memory limit are
+converted in large-image mode: their processes get a small, fixed memory
+and map limit, so ImageMagick keeps the rest of the pixel cache on disk in
+a scratch directory and peak memory stays the same whatever the image size.
+"""
+
+import ctypes
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from backend import get_cache_dir
+
+
+# Share of the available memory that ImageMagick may use across all workers
+MEMORY_FRACTION = 0.5
+# Memory-mapped pixel cache allowed per process, relative to its memory limit
+MAP_FACTOR = 2
+# Share of the free space in the temporary directory that ImageMagick may use
+# for disk-backed pixel caches across all workers
+DISK_FRACTION = 0.5
+CALIBRATION_VERSION = 1
+
+# Memory, and memory-mapped cache, allowed per process in large-image mode
+LARGE_IMAGE_MEMORY = 256 * 1024 * 1024
+# Inputs from this size on are large when the memory limit is unknown
+LARGE_IMAGE_PIXELS = 100_000_000
+
+
+def cpu_count():
+	"""Number of CPUs this process may run on"""
+	if hasattr(os, "sched_getaffinity"):
+		return len(os.sched_getaffinity(0)) or 1
+	return os.cpu_count() or 1
+
+
+def available_memory():
+	"""Bytes of memory available for new processes, or None if unknown"""
+	try:
+		with open("/proc/meminfo", "r", encoding="ascii") as fh:
+			for line in fh:
+				if line.startswith("MemAvailable:"):
+					return int(line.split()[1]) * 1024
+	except (OSError, ValueError, IndexError):
+		pass
+
+	if sys.platform == "win32":
+
+		class MemoryStatus(ctypes.Structure):
+			_fields_ = [
+				("dwLength", ctypes.c_ulong),
+				("dwMemoryLoad", ctypes.c_ulong),
+				("ullTotalPhys", ctypes.c_ulonglong),
+				("ullAvailPhys", ctypes.c_ulonglong),
+				("ullTotalPageFile", ctypes.c_ulonglong),
+				("ullAvailPageFile", ctypes.c_ulonglong),
+				("ullTotalVirtual", ctypes.c_ulonglong),
+				("ullAvailVirtual", ctypes.c_ulonglong),
+				("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+			]
+
+		status = MemoryStatus()
+		status.dwLength = ctypes.sizeof(MemoryStatus)
+		if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+			return status.ullAvailPhys
+		return None
+
+	try:
+		# Total rather than available memory, but the best macOS offers cheaply
+		return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+	except (ValueError, OSError, AttributeError):
+		return None
+
+
+class ResourceLimits:
+	"""The ``-limit`` settings for one ImageMagick process"""
+
+	def __init__(self, threads, memory=None, map_size=None, disk=None):
+		self.threads = max(1, int(threads))
+		self.memory = memory  # Bytes, or None for ImageMagick's default
+		self.map_size = map_size
+		self.disk = disk
+
+	def arguments(self):
+		"""Command line settings, placed before the first input"""
+		args = ["-limit", "thread", str(self.threads)]
+		for resource, value in (
+			("memory", self.memory),
+			("map", self.map_size),
+			("disk", self.disk),
+		):
+			if value is not None:
+				args += ["-limit", resource, f"{max(1, value // (1024 * 1024))}MiB"]
+		return args
+
+	def describe(self):
+		text = f"{self.threads} thread{'s' if self.threads != 1 else ''}"
+		if self.memory is not None:
+			text += f", {self.memory // (1024 * 1024)} MiB memory"
+		return text + " per process"
+
+
+def free_disk_space(directory=None):
+	"""Free bytes in ``directory`` (default: the temporary directory), or None"""
+	try:
+		return shutil.disk_usage(directory or tempfile.gettempdir()).free
+	except OSError:
+		return None
+
+
+def limits_for(workers, threads=None, memory=None):
+	"""Divide the machine between ``workers`` parallel ImageMagick processes
+
+	``threads`` overrides the threads per process, which otherwise share
+	the CPUs evenly. ``memory`` is the total to divide (default: a share of
+	the available memory).
+	"""
+	workers = max(1, workers)
+	if threads is None:
+		threads = max(1, cpu_count() // workers)
+	if memory is None:
+		available = available_memory()
+		memory = int(available * MEMORY_FRACTION) if available else None
+	per_process = memory // workers if memory else None
+	free_disk = free_disk_space()
+	return ResourceLimits(
+		threads,
+		memory=per_process,
+		map_size=per_process * MAP_FACTOR if per_process else None,
+		disk=int(free_disk * DISK_FRACTION) // workers if free_disk else None,
+	)
+
+
+def pixel_cache_bytes(pixels, version=""):
+	"""Estimate ImageMagick's pixel cache size for ``pixels`` pixels
+
+	Assumes four channels, at the sample size of the build named in its
+	version string (Q8, Q16, Q32, or floats for HDRI builds).
+	"""
+	if "HDRI" in version or "Q32" in version:
+		sample_bytes = 4
+	elif "Q8" in version:
+		sample_bytes = 1
+	else:
+		sample_bytes = 2
+	return pixels * 4 * sample_bytes
+
+
+def large_image_threshold(backend, limits):
+	"""Pixel count from which an input is converted in large-image mode"""
+	if limits.memory is None:
+		return LARGE_IMAGE_PIXELS
+	version = backend.version if backend is not None else ""
+	return max(1, limits.memory // pixel_cache_bytes(1, version))
+
+
+def large_image_limits(limits, scratch_dir):
+	"""Limits for a process converting a large image
+
+	Memory and map are capped at LARGE_IMAGE_MEMORY; the pixel cache may
+	use a share of the free space in ``scratch_dir``, which is not divided
+	between workers because a large image needs all the room it can get.
+	"""
+	memory = LARGE_IMAGE_MEMORY
+	if limits.memory is not None:
+		memory = min(memory, limits.memory)
+	free_disk = free_disk_space(scratch_dir)
+	return ResourceLimits(
+		limits.threads,
+		memory=memory,
+		map_size=memory,
+		disk=int(free_disk * DISK_FRACTION) if free_disk else None,
+	)
+
+
+def _calibration_file():
+	return get_cache_dir() / "calibration.json"
+
+
+def _calibration_key(backend):
+	return f"{backend.executable}|{backend.version}|{cpu_count()}"
+
+
+def load_calibration(backend):
+	"""Return the remembered ``{"workers", "threads", ...}`` mix, or None"""
+	if backend is None:
+		return None
+	try:
+		with open(_calibration_file(), "r", encoding="utf-8") as fh:
+			data = json.load(fh)
+	except (OSError, ValueError):
+		return None
+	if data.get("version") != CALIBRATION_VERSION:
+		return None
+	return data.get("results", {}).get(_calibration_key(backend))
+
+
+def save_calibration(backend, best):
+	"""Remember the fastest mix for this machine and ImageMagick build"""
+	path = _calibration_file()
+	try:
+		with open(path, "r", encoding="utf-8") as fh:
+			data = json.load(fh)
+		if data.get("version") != CALIBRATION_VERSION:
+			raise ValueError
+	except (OSError, ValueError):
+		data = {"version": CALIBRATION_VERSION, "results": {}}
+	data["results"][_calibration_key(backend)] = best
+	try:
+		path.parent.mkdir(parents=True, exist_ok=True)
+		tmp_path = path.with_suffix(".tmp")
+		with open(tmp_path, "w", encoding="utf-8") as fh:
+			json.dump(data, fh, indent=1)
+		os.replace(tmp_path, path)
+	except OSError:
+		pass  # Calibrating again is the only cost
+
+
+def candidate_mixes(cpus=None):
+	"""``(workers, threads)`` pairs to try: powers of two that fill the CPUs"""
+	cpus = cpus or cpu_count()
+	mixes = []
+	workers = 1
+	while workers < cpus:
+		mixes.append((workers, max(1, cpus // workers)))
+		workers *= 2
+	mixes.append((cpus, 1))
+	# One oversubscribed mix, for workloads that wait on I/O
+	mixes.append((cpus * 2, 1))
+	return mixes
+
+
+def recommended_workers(backend):
+	"""The calibrated number of workers, else one per CPU"""
+	calibration = load_calibration(backend)
+	if calibration:
+		return calibration["workers"]
+	return cpu_count()
+
+
+def recommended_limits(backend, workers):
+	"""Limits for ``workers`` processes, using calibrated threads if they apply"""
+	calibration = load_calibration(backend)
+	if calibration and calibration["workers"] == workers:
+		return limits_for(workers, threads=calibration["threads"])
+	return limits_for(workers)
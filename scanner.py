@@ -0,0 +1,204 @@
+"""
+Folder scanning
+
+Walks directory trees with os.scandir and picks out image files by their
+extension or, optionally, by their magic bytes. FolderScan runs a walk on a
+background thread and hands the files it finds to a callback in chunks, so
+the first files of a large tree can be listed (and converted) long before
+the walk finishes.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+
+from imageinfo import is_image_file
+
+
+INPUT_EXTENSIONS = {
+	".png",
+	".jpg",
+	".jpeg",
+	".bmp",
+	".tif",
+	".tiff",
+	".gif",
+	".webp",
+	".pdf",
+}
+
+# Found files are handed over in chunks of this many, or sooner when this
+# many seconds have passed since the last chunk
+CHUNK_SIZE = 500
+CHUNK_INTERVAL = 0.2
+
+
+def parse_patterns(text):
+	"""Split a ``;``-separated list of glob patterns"""
+	return [pattern.strip() for pattern in text.split(";") if pattern.strip()]
+
+
+def _matches(patterns, name, relative_path):
+	return any(
+		fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+		for pattern in patterns
+	)
+
+
+def _list_directory(path):
+	try:
+		with os.scandir(path) as entries:
+			return iter(sorted(entries, key=lambda entry: entry.name))
+	except OSError:
+		return iter(())  # Unreadable directories are skipped
+
+
+def walk_images(root, include=(), exclude=(), max_depth=None, sniff=False):
+	"""Yield the image files under ``root``, in sorted order
+
+	Patterns are matched against both the file name and the path relative
+	to ``root`` (with ``/`` separators). A file is listed when it matches
+	one of ``include`` (or ``include`` is empty) and none of ``exclude``;
+	directories matching ``exclude`` are not entered. ``max_depth`` limits
+	how many levels of subdirectories are walked (0 lists only ``root``
+	itself, None has no limit). With ``sniff``, files whose extension is
+	not a known image extension are still listed if their magic bytes are.
+	"""
+	stack = [(_list_directory(root), 0, "")]
+	while stack:
+		entries, depth, prefix = stack[-1]
+		entry = next(entries, None)
+		if entry is None:
+			stack.pop()
+			continue
+
+		relative_path = prefix + entry.name
+		try:
+			is_dir = entry.is_dir(follow_symlinks=False)
+			is_file = not is_dir and entry.is_file()
+		except OSError:
+			continue
+		if is_dir:
+			if (max_depth is None or depth < max_depth) and not _matches(
+				exclude, entry.name, relative_path
+			):
+				subdirectory = _list_directory(entry.path)
+				stack.append((subdirectory, depth + 1, relative_path + "/"))
+			continue
+		if not is_file:
+			continue
+		if include and not _matches(include, entry.name, relative_path):
+			continue
+		if exclude and _matches(exclude, entry.name, relative_path):
+			continue
+		if os.path.splitext(entry.name)[1].lower() in INPUT_EXTENSIONS or (
+			sniff and is_image_file(entry.path)
+		):
+			yield entry.path
+
+
+class FolderScan:
+	"""Walk folders on a background thread, reporting files in chunks
+
+	``on_chunk(scan, paths)`` and ``on_done(scan)`` are called from the
+	scan thread. Every file found is also kept in ``found``, so a consumer
+	that starts late can catch up with follow().
+	"""
+
+	def __init__(
+		self,
+		roots,
+		on_chunk,
+		on_done=None,
+		include=(),
+		exclude=(),
+		max_depth=None,
+		sniff=False,
+		chunk_size=CHUNK_SIZE,
+	):
+		self.roots = list(roots)
+		self.on_chunk = on_chunk
+		self.on_done = on_done
+		self.include = list(include)
+		self.exclude = list(exclude)
+		self.max_depth = max_depth
+		self.sniff = sniff
+		self.chunk_size = chunk_size
+		self.found = []
+		self.started = None
+		self.elapsed = None
+		self.done = threading.Event()
+		self._cancelled = threading.Event()
+		self._condition = threading.Condition()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+
+	@property
+	def cancelled(self):
+		return self._cancelled.is_set()
+
+	def start(self):
+		self.started = time.monotonic()
+		self._thread.start()
+		return self
+
+	def cancel(self):
+		"""Stop walking; files already reported stay reported"""
+		self._cancelled.set()
+
+	def _run(self):
+		chunk = []
+		last_flush = time.monotonic()
+		try:
+			for root in self.roots:
+				for path in walk_images(
+					root, self.include, self.exclude, self.max_depth, self.sniff
+				):
+					if self.cancelled:
+						return
+					chunk.append(path)
+					now = time.monotonic()
+					if (
+						len(chunk) >= self.chunk_size
+						or now - last_flush >= CHUNK_INTERVAL
+					):
+						self._flush(chunk)
+						chunk = []
+						last_flush = now
+		finally:
+			if chunk and not self.cancelled:
+				self._flush(chunk)
+			self.elapsed = time.monotonic() - self.started
+			with self._condition:
+				self.done.set()
+				self._condition.notify_all()
+			if self.on_done is not None:
+				self.on_done(self)
+
+	def _flush(self, chunk):
+		with self._condition:
+			self.found.extend(chunk)
+			self._condition.notify_all()
+		self.on_chunk(self, chunk)
+
+	def follow(self, start=0, stop=None):
+		"""Yield found files from index ``start`` on, waiting for new ones
+
+		Returns once the scan is finished (or cancelled) and every file has
+		been yielded, or as soon as the optional ``stop()`` returns true.
+		"""
+		index = start
+		while True:
+			with self._condition:
+				while index >= len(self.found) and not self.done.is_set():
+					if stop is not None and stop():
+						return
+					self._condition.wait(0.25)
+				batch = self.found[index:]
+			if not batch:
+				return
+			for path in batch:
+				if stop is not None and stop():
+					return
+				yield path
+			index += len(batch)
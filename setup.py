@@ -17,7 +17,7 @@ setup(
 	long_description=long_description,
 	long_description_content_type="text/markdown",
 	url="https://github.com/AlfEspadero/ImageMagickGUI",
-	py_modules=["main"],
+	py_modules=["main", "gui", "backend", "engine", "manifest", "imageinfo", "thumbnails", "progress", "scanner", "filelist", "resources", "benchmark", "tracing", "fastpath", "wandpool", "pages", "store", "eventloop", "journal", "outputs"],
 	classifiers=[
 		"Development Status :: 5 - Production/Stable",
 		"Intended Audience :: End Users/Desktop",
@@ -30,6 +30,10 @@ setup(
 		"Topic :: Desktop Environment",
 	],
 	python_requires=">=3.8",
+	extras_require={
+		"pillow": ["Pillow>=8.0"],
+		"wand": ["Wand>=0.6"],
+	},
 	entry_points={
 		"console_scripts": [
 			"imagemagick-gui=main:main",
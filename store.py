@@ -0,0 +1,222 @@
+"""
+Content-addressed output store
+
+Asset drops often hold the same image under many names. With the store
+enabled, the engine hashes every input (on its worker threads, so inputs
+are hashed in parallel) and keys the output on the input's contents and
+the conversion settings. The first file with a given key is converted and
+its output is copied into the store; every other file with that key, in
+the same batch or a later one, gets its output from the store instead, as
+a reflink (a copy-on-write clone, on file systems that support them), a
+hard link or a plain copy. The store is trimmed to a maximum size by
+evicting the least recently used outputs.
+
+A hard-linked output shares its contents with the store, so the engine
+unlinks an output that has other links before ImageMagick overwrites it.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+try:
+	import fcntl
+except ImportError:  # Windows: no reflinks
+	fcntl = None
+
+from backend import get_cache_dir
+from imageinfo import LRUCache, cache_key
+from manifest import hash_file, settings_key
+
+
+MAX_STORE_BYTES = 2 * 1024 * 1024 * 1024
+# Evict down to this fraction of the limit so eviction doesn't run every time
+EVICT_TARGET = 0.8
+# Linux ioctl that clones a file's extents (Btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+
+def _reflink(source, target):
+	"""Clone ``source`` to ``target`` without copying data; False if unsupported"""
+	if fcntl is None or not sys.platform.startswith("linux"):
+		return False
+	try:
+		with open(source, "rb") as src, open(target, "wb") as dst:
+			fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+		return True
+	except OSError:
+		try:
+			os.remove(target)
+		except OSError:
+			pass
+		return False
+
+
+def place_file(source, target, hardlink=True):
+	"""Make ``target`` a file with the contents of ``source``
+
+	Tries a reflink, then (with ``hardlink``) a hard link, then copies.
+	The file is created under a temporary name and renamed, so ``target``
+	is replaced atomically and any file it was linked to is left alone.
+	Returns how it was placed: "reflink", "hardlink" or "copy".
+	"""
+	target = Path(target)
+	tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+	try:
+		if _reflink(source, tmp_path):
+			method = "reflink"
+		else:
+			method = "copy"
+			if hardlink:
+				try:
+					os.link(source, tmp_path)
+					method = "hardlink"
+				except OSError:  # Other file system, or links unsupported
+					pass
+			if method == "copy":
+				shutil.copyfile(source, tmp_path)
+		os.replace(tmp_path, target)
+	except BaseException:
+		try:
+			os.remove(tmp_path)
+		except OSError:
+			pass
+		raise
+	return method
+
+
+def unshare_output(path):
+	"""Unlink an output that is hard-linked elsewhere, before it is rewritten
+
+	ImageMagick overwrites an existing output in place, which would change
+	every file linked to it, store entries included.
+	"""
+	try:
+		if os.stat(path).st_nlink > 1:
+			os.remove(path)
+	except OSError:
+		pass
+
+
+class OutputStore:
+	"""Outputs keyed by the contents of their input and the settings used
+
+	Safe to use from several threads. A worker that is about to convert a
+	file claim()s its key first; other workers finding the key claimed
+	wait() for it and then fetch() the output, so each key is converted
+	only once even when its copies are converted at the same time.
+	"""
+
+	def __init__(self, directory=None, max_bytes=MAX_STORE_BYTES):
+		self.directory = Path(directory or get_cache_dir() / "outputs")
+		self.max_bytes = max_bytes
+		self._digests = LRUCache(65536)  # (path, size, mtime) -> content hash
+		self._claimed = {}  # key -> threading.Event set when released
+		self._lock = threading.Lock()
+		self._total_bytes = None  # Computed on first insert
+
+	def key(self, input_path, settings):
+		"""The store key of converting ``input_path`` with ``settings``, or None"""
+		file_key = cache_key(input_path)
+		if file_key is None:
+			return None
+		digest = self._digests.get(file_key)
+		if digest is None:
+			try:
+				digest = hash_file(input_path)
+			except OSError:
+				return None
+			self._digests.put(file_key, digest)
+		combined = hashlib.blake2b(digest_size=20)
+		combined.update(digest.encode("ascii"))
+		combined.update(settings_key(settings).encode("utf-8"))
+		return combined.hexdigest()
+
+	def _entry_path(self, key, output_path):
+		return self.directory / f"{key}{Path(output_path).suffix}"
+
+	def fetch(self, key, output_path):
+		"""Place the stored output for ``key`` at ``output_path``
+
+		Returns how it was placed ("reflink", "hardlink" or "copy"), or None
+		when the store has no output for ``key``.
+		"""
+		entry = self._entry_path(key, output_path)
+		try:
+			os.utime(entry)  # Mark as recently used for eviction
+			return place_file(entry, output_path)
+		except OSError:
+			return None
+
+	def add(self, key, output_path):
+		"""Store a copy of a freshly converted output
+
+		Entries are never hard links to outputs: an output overwritten in
+		place by another tool would change the entry too.
+		"""
+		entry = self._entry_path(key, output_path)
+		try:
+			self.directory.mkdir(parents=True, exist_ok=True)
+			place_file(output_path, entry, hardlink=False)
+			size = os.path.getsize(entry)
+		except OSError:
+			return
+		self._account(size)
+
+	def claim(self, key):
+		"""Reserve ``key`` for conversion; False if another worker holds it
+
+		The caller must release() a key it claimed, whatever the outcome.
+		"""
+		with self._lock:
+			if key in self._claimed:
+				return False
+			self._claimed[key] = threading.Event()
+			return True
+
+	def release(self, key):
+		with self._lock:
+			event = self._claimed.pop(key, None)
+		if event is not None:
+			event.set()
+
+	def wait(self, key):
+		"""Wait until ``key`` is no longer claimed"""
+		with self._lock:
+			event = self._claimed.get(key)
+		if event is not None:
+			event.wait()
+
+	def _account(self, added_bytes):
+		"""Track the store size and evict old outputs when over the limit"""
+		with self._lock:
+			if self._total_bytes is None:
+				# Names starting with a dot are entries still being written
+				self._total_bytes = sum(
+					entry.stat().st_size
+					for entry in os.scandir(self.directory)
+					if entry.is_file() and not entry.name.startswith(".")
+				)
+			else:
+				self._total_bytes += added_bytes
+			if self._total_bytes <= self.max_bytes:
+				return
+
+			entries = [
+				(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+				for entry in os.scandir(self.directory)
+				if entry.is_file() and not entry.name.startswith(".")
+			]
+			entries.sort()
+			target = self.max_bytes * EVICT_TARGET
+			for _, size, entry_path in entries:
+				if self._total_bytes <= target:
+					break
+				try:
+					os.remove(entry_path)
+				except OSError:
+					continue
+				self._total_bytes -= size
@@ -0,0 +1,79 @@
+import sys
+import textwrap
+
+import pytest
+
+from backend import ImageMagickBackend
+
+
+# Stands in for magick: each output (after -write, and the last argument)
+# gets a copy of the input read before it. Inputs named *FAIL* fail and
+# inputs named *SLOW* take a second. Every call is logged, one per line.
+FAKE_MAGICK = """\
+import shutil, sys, time
+args = sys.argv[1:]
+with open({log!r}, "a") as fh:
+	fh.write("\\0".join(args) + "\\n")
+current = None
+for position, arg in enumerate(args):
+	if arg.endswith((".png", ".jpg", ".gif")) and "_converted" not in arg:
+		current = arg
+		if "FAIL" in arg:
+			sys.stderr.write("magick: no decode delegate for this image format\\n")
+			sys.exit(1)
+		if "SLOW" in arg:
+			time.sleep(1)
+	elif position == len(args) - 1 or args[position - 1] == "-write":
+		shutil.copyfile(current, arg)
+"""
+
+
+class FakeMagick:
+	def __init__(self, directory):
+		self.log = directory / "magick.log"
+		self.script = directory / "magick"
+		self.script.write_text(
+			f"#!{sys.executable}\n"
+			+ textwrap.dedent(FAKE_MAGICK).format(log=str(self.log))
+		)
+		self.script.chmod(0o755)
+		self.backend = ImageMagickBackend("magick", str(self.script), "7.1.1-0 fake")
+
+	def calls(self):
+		"""The argv of every call so far"""
+		if not self.log.exists():
+			return []
+		return [line.split("\0") for line in self.log.read_text().splitlines()]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+	"""Keep caches, calibrations and journals out of the user's cache directory"""
+	directory = tmp_path / "cache"
+	monkeypatch.setenv("XDG_CACHE_HOME", str(directory))
+	monkeypatch.setenv("LOCALAPPDATA", str(directory))
+	return directory / "imagemagick-gui"
+
+
+@pytest.fixture
+def fake_magick(tmp_path):
+	directory = tmp_path / "bin"
+	directory.mkdir()
+	return FakeMagick(directory)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+	"""Make input files named ``names`` in a directory of their own"""
+	directory = tmp_path / "in"
+	directory.mkdir()
+
+	def make(*names, contents=None):
+		paths = []
+		for name in names:
+			path = directory / name
+			path.write_bytes(contents if contents is not None else name.encode())
+			paths.append(path)
+		return paths
+
+	return make
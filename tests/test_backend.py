@@ -0,0 +1,203 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+import backend
+from backend import (
+	ERROR_CORRUPT_INPUT,
+	ERROR_FAILED,
+	ERROR_POLICY,
+	ERROR_RESOURCES,
+	ERROR_TIMEOUT,
+	ERROR_UNREADABLE_INPUT,
+	ERROR_UNSUPPORTED_INPUT,
+	ERROR_UNSUPPORTED_OUTPUT,
+	ERROR_WRITE_FAILED,
+	ConversionError,
+	ImageMagickBackend,
+	ProcessStats,
+	classify_error,
+	resolve_backend,
+)
+
+
+@pytest.mark.parametrize(
+	"stderr, kind",
+	[
+		(
+			"magick: no decode delegate for this image format `XYZ' @ "
+			"error/constitute.c/ReadImage/741.",
+			ERROR_UNSUPPORTED_INPUT,
+		),
+		(
+			"magick: no encode delegate for this image format `HEIC' @ "
+			"error/constitute.c/WriteImage/1378.",
+			ERROR_UNSUPPORTED_OUTPUT,
+		),
+		(
+			"convert: attempt to perform an operation not allowed by the security "
+			"policy `PDF' @ error/constitute.c/IsCoderAuthorized/408.",
+			ERROR_POLICY,
+		),
+		(
+			"convert-im6.q16: not authorized `doc.pdf' @ "
+			"error/constitute.c/ReadImage/412.",
+			ERROR_POLICY,
+		),
+		(
+			"magick: cache resources exhausted `big.tif' @ "
+			"error/cache.c/OpenPixelCache/4095.",
+			ERROR_RESOURCES,
+		),
+		("magick: memory allocation failed `huge.png'", ERROR_RESOURCES),
+		(
+			"magick: improper image header `broken.bmp' @ "
+			"error/bmp.c/ReadBMPImage/840.",
+			ERROR_CORRUPT_INPUT,
+		),
+		(
+			"magick: Premature end of JPEG file `cut.jpg' @ "
+			"warning/jpeg.c/JPEGWarningHandler/403.",
+			ERROR_CORRUPT_INPUT,
+		),
+		(
+			"magick: Not a JPEG file: starts with 0x89 0x50 `fake.jpg' @ "
+			"error/jpeg.c/JPEGErrorHandler/346.",
+			ERROR_CORRUPT_INPUT,
+		),
+		(
+			"magick: unable to open image `out/x.png': Permission denied @ "
+			"error/blob.c/OpenBlob/3596.",
+			ERROR_WRITE_FAILED,
+		),
+		(
+			"magick: unable to open image `missing.png': No such file or "
+			"directory @ error/blob.c/OpenBlob/3596.",
+			ERROR_UNREADABLE_INPUT,
+		),
+		("magick: something unexpected happened", ERROR_FAILED),
+		("", ERROR_FAILED),
+		(None, ERROR_FAILED),
+	],
+)
+def test_classify_error(stderr, kind):
+	assert classify_error(stderr) == kind
+
+
+PROBED_MAGICK = """\
+#!{python}
+import sys
+with open({log!r}, "a") as fh:
+	fh.write(" ".join(sys.argv[1:]) + "\\n")
+if sys.argv[1] == "-version":
+	print("Version: ImageMagick 7.1.1-0 Q16 x86_64 fake")
+	print("Delegates (built-in): jpeg png zlib")
+else:
+	print("      PNG* PNG       rw-   Portable Network Graphics")
+	print("     JPEG* JPEG      rw-   Joint Photographic Experts Group")
+"""
+
+
+@pytest.fixture
+def probed_magick(tmp_path, monkeypatch):
+	"""A magick on PATH answering -version and -list format; returns its log"""
+	log = tmp_path / "probes.log"
+
+	def install(directory):
+		directory.mkdir(exist_ok=True)
+		script = directory / "magick"
+		script.write_text(PROBED_MAGICK.format(python=sys.executable, log=str(log)))
+		script.chmod(0o755)
+		monkeypatch.setenv("PATH", str(directory))
+		return script
+
+	monkeypatch.setattr(backend, "_resolved", None)
+	return install, log
+
+
+def probes(log):
+	return log.read_text().count("-version") if log.exists() else 0
+
+
+def resolve_again():
+	backend._resolved = None  # As in a new process
+	return resolve_backend()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs a script named magick")
+def test_backend_cache(probed_magick, tmp_path):
+	install, log = probed_magick
+	script = install(tmp_path / "bin")
+
+	resolved = resolve_again()
+	assert resolved.version == "ImageMagick 7.1.1-0 Q16 x86_64 fake"
+	assert resolved.can_write("jpg") and not resolved.can_write("webp")
+	assert probes(log) == 1
+
+	# Cached on disk: a new process does not probe again
+	assert resolve_again().version == resolved.version
+	assert probes(log) == 1
+
+	# An upgraded binary has a new mtime
+	stat = os.stat(script)
+	os.utime(script, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+	resolve_again()
+	assert probes(log) == 2
+
+	# So does one found elsewhere on PATH
+	moved = install(tmp_path / "other-bin")
+	os.utime(moved, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+	assert resolve_again().executable == str(moved)
+	assert probes(log) == 3
+	resolve_again()
+	assert probes(log) == 3
+
+
+# Burns some CPU, prints to both streams and exits with the given status
+BUSY = (
+	"import sys\n"
+	"sum(i * i for i in range(300000))\n"
+	"print('out'); print('no decode delegate', file=sys.stderr)\n"
+	"sys.exit(int(sys.argv[1]))\n"
+)
+
+
+def run_both(argv, **kwargs):
+	"""Run argv with run() and run_async(); returns [(result or error, stats)]"""
+	fake = ImageMagickBackend("magick", sys.executable, "7.1.1-0 fake")
+	outcomes = []
+	for run in (fake.run, lambda *a, **k: asyncio.run(fake.run_async(*a, **k))):
+		stats = ProcessStats()
+		try:
+			outcomes.append((run(argv, stats=stats, **kwargs), stats))
+		except ConversionError as error:
+			outcomes.append((error, stats))
+	return outcomes
+
+
+def test_run_measures_the_process():
+	for result, stats in run_both([sys.executable, "-c", BUSY, "0"]):
+		assert result.returncode == 0
+		assert result.stderr.strip() == "no decode delegate"
+		assert stats.wall >= stats.spawn > 0
+		if hasattr(os, "wait4") and hasattr(os, "pidfd_open"):
+			assert 0 < stats.cpu_time < stats.wall + 1
+	assert run_both([sys.executable, "-c", BUSY, "0"])[0][0].stdout.strip() == "out"
+
+
+def test_run_reports_failures():
+	for error, stats in run_both([sys.executable, "-c", BUSY, "3"]):
+		assert isinstance(error, ConversionError)
+		assert error.kind == ERROR_UNSUPPORTED_INPUT
+		assert stats.wall > 0
+
+
+def test_run_kills_on_timeout():
+	argv = [sys.executable, "-c", "import time; time.sleep(30)"]
+	for error, stats in run_both(argv, timeout=0.5):
+		assert isinstance(error, ConversionError)
+		assert error.kind == ERROR_TIMEOUT
+		assert stats.wall < 10
+		assert stats.cpu_time is None
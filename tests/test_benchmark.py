@@ -0,0 +1,37 @@
+import pytest
+
+from benchmark import compare, unmatched
+
+
+def run(mode="batch", fmt="png", jobs=4, pillow=True, magickwand=False, fps=10.0):
+	return {
+		"mode": mode,
+		"format": fmt,
+		"jobs": jobs,
+		"pillow": pillow,
+		"magickwand": magickwand,
+		"files_per_second": fps,
+	}
+
+
+def test_compare_matching_scenarios():
+	old = {"results": [run(fps=10.0), run(mode="single", fps=4.0)]}
+	new = {"results": [run(fps=12.0), run(mode="single", fps=5.0), run(fmt="jpg")]}
+	changes = {scenario: change for scenario, _, _, _, change in compare(old, new)}
+	assert changes == pytest.approx({"batch/png": 0.2, "single/png": 0.25})
+	assert list(unmatched(old, new)) == []
+
+
+@pytest.mark.parametrize(
+	"settings, differences",
+	[
+		({"jobs": 8}, "jobs 4 -> 8"),
+		({"pillow": False}, "pillow True -> False"),
+		({"magickwand": True, "jobs": 2}, "jobs 4 -> 2, magickwand False -> True"),
+	],
+)
+def test_differently_run_scenarios_are_not_compared(settings, differences):
+	old = {"results": [run(fps=10.0)]}
+	new = {"results": [run(fps=20.0, **settings)]}
+	assert list(compare(old, new)) == []
+	assert list(unmatched(old, new)) == [("batch/png", differences)]
@@ -0,0 +1,55 @@
+import engine
+from engine import ConversionEngine, calibrate
+
+
+def make_engine(fake_magick, tmp_path, **settings):
+	settings.setdefault("max_workers", 2)
+	settings.setdefault("group_small_files", False)
+	settings.setdefault("use_pillow", False)
+	return ConversionEngine(
+		fake_magick.backend, output_dir=tmp_path / "out", **settings
+	)
+
+
+def test_results_come_in_input_order(fake_magick, inputs, tmp_path):
+	(tmp_path / "out").mkdir()
+	files = inputs("SLOW.png", *(f"img{n:02}.png" for n in range(6)))
+	results = list(make_engine(fake_magick, tmp_path).convert_many(files))
+	assert [result.index for result in results] == list(range(len(files)))
+	assert all(result.success for result in results)
+
+
+def test_held_back_results_are_bounded(fake_magick, inputs, tmp_path, monkeypatch):
+	# Behind a slow first file, later files only run until the held-back
+	# results reach the limit
+	monkeypatch.setattr(engine, "HELD_RESULTS_PER_WORKER", 2)
+	(tmp_path / "out").mkdir()
+	files = inputs("SLOW.png", *(f"img{n:02}.png" for n in range(20)))
+	calls_at_first_result = []
+
+	def on_result(result):
+		if result.index == 0:
+			calls_at_first_result.append(len(fake_magick.calls()))
+
+	make_engine(fake_magick, tmp_path).submit_many(files, on_result).result()
+	# The slow file, the held-back limit and at most one more per worker
+	assert calls_at_first_result[0] <= 1 + 2 * 2 + 2
+	assert len(fake_magick.calls()) == len(files)
+
+
+def test_calibration_times_imagemagick(fake_magick, inputs, monkeypatch):
+	# Even where Pillow could convert the files, every mix runs magick
+	in_process = []
+	monkeypatch.setattr(engine, "PILLOW_AVAILABLE", True)
+	monkeypatch.setattr(engine, "can_convert_in_process", lambda *args: True)
+	monkeypatch.setattr(
+		engine, "convert_in_process", lambda *args: in_process.append(args)
+	)
+	files = inputs("a.png", "b.png", "c.png")
+	mixes = [(1, 2), (2, 1)]
+	best, results = calibrate(fake_magick.backend, files, mixes=mixes)
+	assert not in_process
+	assert [result["converted"] for result in results] == [3, 3]
+	assert (best["workers"], best["threads"]) in mixes
+	converted = [arg for call in fake_magick.calls() for arg in call]
+	assert all(converted.count(str(path)) == len(mixes) for path in files)
@@ -0,0 +1,92 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image, ImageChops, ImageStat, features  # noqa: E402
+
+from fastpath import can_convert_in_process, convert_in_process  # noqa: E402
+
+MAGICK = shutil.which("magick")
+pytestmark = pytest.mark.skipif(MAGICK is None, reason="needs ImageMagick 7")
+
+# Mean difference per channel (0-255) allowed between the two outputs
+TOLERANCE = {"jpg": 4.0, "webp": 4.0}
+LOSSLESS_TOLERANCE = 1.0
+
+
+def gradient(mode, size=(64, 48)):
+	"""A smooth image with more colours than a palette holds"""
+	width, height = size
+	image = Image.new("RGBA", size)
+	image.putdata(
+		[
+			(x * 4, y * 5, (x + y) * 2, 64 + (x * y) % 192)
+			for y in range(height)
+			for x in range(width)
+		]
+	)
+	return image.convert(mode)
+
+
+def make_corpus(directory):
+	corpus = {
+		"rgb.png": gradient("RGB"),
+		"rgba.png": gradient("RGBA"),
+		"gray.png": gradient("L"),
+		"rgb.jpg": gradient("RGB"),
+		"rgb.bmp": gradient("RGB"),
+		"palette.gif": gradient("RGB").quantize(64),
+	}
+	paths = {}
+	for name, image in corpus.items():
+		paths[name] = directory / name
+		image.save(paths[name])
+	return paths
+
+
+def channels(image):
+	"""What an image stores, whatever the mode: "L" or "RGB", then "A" for alpha"""
+	if image.mode == "P":
+		image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+	base = "L" if image.mode in ("1", "L", "LA") else "RGB"
+	return base + ("A" if image.mode in ("LA", "RGBA") else "")
+
+
+CASES = [
+	("rgb.png", "jpg"),
+	("rgb.png", "webp"),
+	("rgb.png", "bmp"),
+	("rgba.png", "png"),
+	("rgba.png", "webp"),
+	("gray.png", "jpg"),
+	("gray.png", "png"),
+	("rgb.jpg", "png"),
+	("rgb.jpg", "jpg"),
+	("rgb.bmp", "png"),
+	("palette.gif", "png"),
+	("palette.gif", "gif"),
+]
+
+
+@pytest.mark.parametrize("name, output_format", CASES)
+def test_matches_imagemagick(tmp_path, name, output_format):
+	if output_format == "webp" and not features.check("webp"):
+		pytest.skip("Pillow was built without WebP")
+	source = make_corpus(tmp_path)[name]
+	pillow_path = tmp_path / f"pillow.{output_format}"
+	magick_path = tmp_path / f"magick.{output_format}"
+
+	assert can_convert_in_process(source, output_format)
+	assert convert_in_process(source, pillow_path, output_format)
+	subprocess.run([MAGICK, str(source), str(magick_path)], check=True)
+
+	with Image.open(pillow_path) as pillow, Image.open(magick_path) as magick:
+		assert pillow.size == magick.size
+		assert channels(pillow) == channels(magick)
+		mode = "RGBA" if channels(pillow).endswith("A") else "RGB"
+		difference = ImageChops.difference(pillow.convert(mode), magick.convert(mode))
+		tolerance = TOLERANCE.get(output_format, LOSSLESS_TOLERANCE)
+		assert max(ImageStat.Stat(difference).mean) <= tolerance
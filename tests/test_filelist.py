@@ -0,0 +1,121 @@
+import os
+import struct
+
+import pytest
+
+from filelist import FileListModel, format_size
+
+
+def png_header(width, height):
+	ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+	return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + b"\0" * 4
+
+
+@pytest.fixture
+def model(tmp_path):
+	"""A model of four files with different names, sizes and dimensions"""
+	files = {
+		"b.png": png_header(10, 10) + b"\0" * 3000,
+		"C.png": png_header(300, 200),
+		"a.png": png_header(20, 4) + b"\0" * 9000,
+		"d.txt": b"not an image",
+	}
+	model = FileListModel()
+	for name, data in files.items():
+		(tmp_path / name).write_bytes(data)
+		model.add([str(tmp_path / name)])
+	return model
+
+
+def names(model):
+	return [os.path.basename(path) for path in model.paths()]
+
+
+def test_add_and_remove(model, tmp_path):
+	a = str(tmp_path / "a.png")
+	assert model.add([a, str(tmp_path / "e.png"), str(tmp_path / "e.png")]) == 1
+	assert len(model) == 5
+	assert names(model) == ["b.png", "C.png", "a.png", "d.txt", "e.png"]
+	model.set_status(a, "ok")
+	assert model.remove([a, str(tmp_path / "missing.png")]) == 1
+	assert a not in model
+	assert model.status(a) == ""
+	assert names(model) == ["b.png", "C.png", "d.txt", "e.png"]
+	assert model.path_at(1) == str(tmp_path / "C.png")
+
+
+def test_filter_by_status(model, tmp_path):
+	model.set_status(str(tmp_path / "C.png"), "failed")
+	model.set_status(str(tmp_path / "d.txt"), "failed")
+	model.set_status(str(tmp_path / "b.png"), "ok")
+	model.set_status(str(tmp_path / "unlisted.png"), "failed")
+	failed = [path for path in model.paths() if model.status(path) == "failed"]
+	assert [os.path.basename(path) for path in failed] == ["C.png", "d.txt"]
+	assert str(tmp_path / "unlisted.png") not in model
+	model.reset_status()
+	assert all(model.status(path) == "" for path in model.paths())
+
+
+@pytest.mark.parametrize(
+	"column, reverse, expected",
+	[
+		("name", False, ["a.png", "b.png", "C.png", "d.txt"]),
+		("name", True, ["d.txt", "C.png", "b.png", "a.png"]),
+		("size", False, ["d.txt", "C.png", "b.png", "a.png"]),
+		("dimensions", False, ["d.txt", "a.png", "b.png", "C.png"]),
+		("dimensions", True, ["C.png", "b.png", "a.png", "d.txt"]),
+	],
+)
+def test_sort(model, column, reverse, expected):
+	model.sort(column, reverse)
+	assert names(model) == expected
+	assert (model.sort_column, model.sort_reverse) == (column, reverse)
+
+
+def test_sort_by_status_is_stable(model, tmp_path):
+	model.set_status(str(tmp_path / "a.png"), "failed")
+	model.set_status(str(tmp_path / "b.png"), "ok")
+	model.sort("status")
+	assert names(model) == ["C.png", "d.txt", "a.png", "b.png"]
+
+
+def test_add_after_sort_unsorts(model, tmp_path):
+	model.sort("name")
+	model.add([str(tmp_path / "0.png")])
+	assert model.sort_column is None
+	assert names(model)[-1] == "0.png"
+
+
+@pytest.mark.parametrize(
+	"top, rows, expected_top, expected",
+	[
+		(0, 2, 0, ["b.png", "C.png"]),
+		(1, 2, 1, ["C.png", "a.png"]),
+		# Scrolled past the end: the window is pulled back to stay full
+		(3, 2, 2, ["a.png", "d.txt"]),
+		(100, 3, 1, ["C.png", "a.png", "d.txt"]),
+		(-5, 2, 0, ["b.png", "C.png"]),
+		# More rows than files
+		(2, 10, 0, ["b.png", "C.png", "a.png", "d.txt"]),
+	],
+)
+def test_window(model, top, rows, expected_top, expected):
+	top, paths = model.window(top, rows)
+	assert top == expected_top
+	assert [os.path.basename(path) for path in paths] == expected
+
+
+def test_window_of_empty_list():
+	assert FileListModel().window(3, 5) == (0, [])
+
+
+def test_lazy_metadata(model, tmp_path):
+	path = str(tmp_path / "C.png")
+	assert model.dimensions(path) == (300, 200)
+	assert model.dimensions(str(tmp_path / "d.txt")) == (0, 0)
+	(tmp_path / "C.png").write_bytes(png_header(1, 1))
+	assert model.dimensions(path) == (300, 200)  # Cached
+	assert model.size(str(tmp_path / "missing.png")) == 0
+	assert model.row_values(path) == ("C.png", format_size(33), "300x200", "")
+	model.set_status(path, "failed")
+	assert model.row_values(path)[3] == "❌ Failed"
@@ -0,0 +1,278 @@
+import struct
+import zlib
+
+import pytest
+
+import imageinfo
+from imageinfo import count_pages, is_image_file, read_header_info
+
+
+def png_chunk(chunk_type, data):
+	crc = zlib.crc32(chunk_type + data)
+	return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def png(width, height, frames=None):
+	data = b"\x89PNG\r\n\x1a\n"
+	data += png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+	if frames is not None:
+		data += png_chunk(b"acTL", struct.pack(">II", frames, 0))
+	data += png_chunk(b"IDAT", zlib.compress(b"\0" * (width * 3 + 1)))
+	return data + png_chunk(b"IEND", b"")
+
+
+def jpeg_segment(marker, payload):
+	return bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def jpeg(width, height, sof=0xC0):
+	app0 = jpeg_segment(0xE0, b"JFIF\0\x01\x01\0\0\x01\0\x01\0\0")
+	frame = jpeg_segment(sof, struct.pack(">BHHB", 8, height, width, 1) + b"\x01\x11\0")
+	scan = jpeg_segment(0xDA, b"\x01\x01\0\0\x3f\0")
+	return b"\xff\xd8" + app0 + frame + scan + b"\0" * 16 + b"\xff\xd9"
+
+
+def gif(width, height):
+	screen = struct.pack("<HHBBB", width, height, 0x80, 0, 0) + b"\0" * 6
+	return b"GIF89a" + screen + b"\x2c" + b"\0" * 9 + b"\x02\x02\x44\x01\0\x3b"
+
+
+def bmp(width, height, header_size=40, planes=1, bits=24):
+	if header_size == 12:
+		info = struct.pack("<IHHHH", 12, width, height, planes, bits)
+	else:
+		info = struct.pack("<IiiHH", header_size, width, height, planes, bits)
+		info += b"\0" * (header_size - len(info))
+	offset = 14 + len(info)
+	return b"BM" + struct.pack("<IHHI", offset + 4, 0, 0, offset) + info + b"\0" * 4
+
+
+def riff(chunk_type, payload):
+	chunk = chunk_type + struct.pack("<I", len(payload)) + payload
+	return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def webp_lossy(width, height, start_code=b"\x9d\x01\x2a"):
+	return riff(b"VP8 ", b"\x30\x01\x00" + start_code + struct.pack("<HH", width, height))
+
+
+def webp_lossless(width, height, signature=0x2F):
+	bits = (width - 1) | ((height - 1) << 14)
+	return riff(b"VP8L", bytes([signature]) + struct.pack("<I", bits) + b"\0" * 8)
+
+
+def webp_extended(width, height, animated=False):
+	flags = 0x02 if animated else 0
+	payload = bytes([flags, 0, 0, 0])
+	payload += (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+	return riff(b"VP8X", payload + b"\0" * 8)
+
+
+def tiff(width, height, pages=1, endian="<", next_offset=None):
+	"""A TIFF whose IFDs hold only ImageWidth (SHORT) and ImageLength (LONG)"""
+	magic = b"II*\0" if endian == "<" else b"MM\0*"
+	data = magic + struct.pack(endian + "I", 8)
+	for page in range(pages):
+		ifd_offset = len(data)
+		following = ifd_offset + 2 + 2 * 12 + 4 if page < pages - 1 else 0
+		if next_offset is not None and page == pages - 1:
+			following = next_offset
+		data += struct.pack(endian + "H", 2)
+		data += struct.pack(endian + "HHIHH", 256, 3, 1, width, 0)
+		data += struct.pack(endian + "HHII", 257, 4, 1, height)
+		data += struct.pack(endian + "I", following)
+	return data + b"\0" * 16
+
+
+def info(width, height, fmt, pages=1):
+	return {"width": width, "height": height, "format": fmt, "pages": pages}
+
+
+HEADERS = [
+	("png", png(640, 480), info(640, 480, "PNG")),
+	("apng", png(32, 16, frames=12), info(32, 16, "PNG", 12)),
+	("jpeg-baseline", jpeg(1920, 1080), info(1920, 1080, "JPEG")),
+	("jpeg-progressive", jpeg(300, 200, sof=0xC2), info(300, 200, "JPEG")),
+	("gif", gif(90, 60), info(90, 60, "GIF", None)),
+	("bmp", bmp(123, 45), info(123, 45, "BMP")),
+	("bmp-top-down", bmp(123, -45), info(123, 45, "BMP")),
+	("bmp-v5", bmp(7, 9, header_size=124), info(7, 9, "BMP")),
+	("bmp-os2", bmp(50, 40, header_size=12), info(50, 40, "BMP")),
+	("webp-vp8", webp_lossy(800, 600), info(800, 600, "WEBP")),
+	("webp-vp8l", webp_lossless(16383, 1), info(16383, 1, "WEBP")),
+	("webp-vp8x", webp_extended(5000, 4000), info(5000, 4000, "WEBP")),
+	(
+		"webp-vp8x-animated",
+		webp_extended(64, 64, animated=True),
+		info(64, 64, "WEBP", None),
+	),
+	("tiff-le", tiff(2000, 1500), info(2000, 1500, "TIFF")),
+	("tiff-be", tiff(640, 3, endian=">"), info(640, 3, "TIFF")),
+	("tiff-pages", tiff(10, 20, pages=5), info(10, 20, "TIFF", 5)),
+	# An IFD chain that loops back on itself is walked once
+	("tiff-ifd-loop", tiff(10, 20, next_offset=8), info(10, 20, "TIFF")),
+	# Truncated and corrupt headers
+	("empty", b"", None),
+	("text", b"just some text, certainly not an image file", None),
+	("png-signature-only", png(640, 480)[:12], None),
+	("png-cut-in-ihdr", png(640, 480)[:20], None),
+	("png-no-ihdr", png(640, 480).replace(b"IHDR", b"IHDx"), None),
+	("jpeg-cut-before-sof", jpeg(1920, 1080)[:24], None),
+	("jpeg-cut-in-sof", jpeg(1920, 1080)[:27], None),
+	("jpeg-scan-before-sof", b"\xff\xd8" + jpeg_segment(0xDA, b"\0" * 30), None),
+	(
+		"jpeg-zero-length-segment",
+		b"\xff\xd8\xff\xe0\x00\x00" + b"\x00" * 40,
+		None,
+	),
+	("gif-cut", gif(90, 60)[:10], None),
+	("bmp-bad-header-size", bmp(10, 10, header_size=20), None),
+	("bmp-no-planes", bmp(10, 10, planes=0), None),
+	("bmp-no-bits", bmp(10, 10, header_size=12, bits=0), None),
+	("bmp-cut", bmp(10, 10)[:28], None),
+	("text-starting-with-bm", b"BMW owners' manual, chapter 1: introduction", None),
+	("webp-vp8-bad-start-code", webp_lossy(8, 8, start_code=b"\0\0\0"), None),
+	("webp-vp8l-bad-signature", webp_lossless(8, 8, signature=0x00), None),
+	("webp-unknown-chunk", riff(b"VP9 ", b"\0" * 24), None),
+	("webp-cut", webp_lossy(800, 600)[:24], None),
+	("tiff-ifd-past-end", b"II*\0" + struct.pack("<I", 10**6) + b"\0" * 40, None),
+	("tiff-cut-in-ifd", tiff(2000, 1500)[:20] + b"\0" * 12, None),
+]
+
+
+@pytest.mark.parametrize(
+	"data, expected", [case[1:] for case in HEADERS], ids=[case[0] for case in HEADERS]
+)
+def test_read_header_info(tmp_path, data, expected):
+	path = tmp_path / "image"
+	path.write_bytes(data)
+	assert read_header_info(path) == expected
+
+
+def test_missing_file(tmp_path):
+	assert read_header_info(tmp_path / "missing.png") is None
+	assert not is_image_file(tmp_path / "missing.png")
+
+
+def test_is_image_file(tmp_path):
+	path = tmp_path / "photo.dat"
+	path.write_bytes(jpeg(10, 10))
+	assert is_image_file(path)
+	path.write_bytes(b"%PDF-1.7\n")
+	assert is_image_file(path)
+	path.write_bytes(b"hello")
+	assert not is_image_file(path)
+	path.write_bytes(b"BMW owners' manual, chapter 1: introduction")
+	assert not is_image_file(path)
+
+
+def test_count_pages(tmp_path):
+	path = tmp_path / "scan.tif"
+	path.write_bytes(tiff(10, 20, pages=3))
+	assert count_pages(path) == 3
+	path = tmp_path / "photo.png"
+	path.write_bytes(png(10, 20))
+	assert count_pages(path) is None
+
+
+def pdf(objects, padding=0):
+	"""A PDF of ``{number: body}`` objects (1 is the catalog) with an xref table"""
+	data = b"%PDF-1.4\n" + b"%" * padding + b"\n"
+	offsets = {}
+	for number, body in objects.items():
+		offsets[number] = len(data)
+		data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+	return data + xref_section(offsets, len(data))
+
+
+def xref_section(offsets, at, prev=None):
+	"""A cross-reference table listing ``offsets`` and its trailer, at ``at``"""
+	first, last = min(offsets), max(offsets)
+	data = b"xref\n%d %d\n" % (first, last - first + 1)
+	for number in range(first, last + 1):
+		if number in offsets:
+			data += b"%010d 00000 n\r\n" % offsets[number]
+		else:
+			data += b"0000000000 65535 f\r\n"
+	trailer = b"/Size %d /Root 1 0 R" % (last + 1)
+	if prev is not None:
+		trailer += b" /Prev %d" % prev
+	return data + b"trailer\n<< %s >>\nstartxref\n%d\n%%%%EOF\n" % (trailer, at)
+
+
+def page_tree(*counts):
+	"""Objects of a page tree with one intermediate node per count
+
+	The intermediate nodes come before the root in the file, so a scan that
+	took the first /Count would get a subtree's.
+	"""
+	objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>"}
+	leaves = {}
+	nodes = []
+	number = 3 + len(counts)
+	for node, count in enumerate(counts, 3):
+		kids = []
+		for _ in range(count):
+			leaves[number] = b"<< /Type /Page /Parent %d 0 R >>" % node
+			kids.append(b"%d 0 R" % number)
+			number += 1
+		objects[node] = b"<< /Type /Pages /Parent 2 0 R /Kids [%s] /Count %d >>" % (
+			b" ".join(kids),
+			count,
+		)
+		nodes.append(b"%d 0 R" % node)
+	objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+		b" ".join(nodes),
+		sum(counts),
+	)
+	objects.update(leaves)
+	return objects
+
+
+def updated(data, objects):
+	"""``data`` with an incremental update replacing some of its objects"""
+	prev = int(data.rsplit(b"startxref", 1)[1].split()[0])
+	offsets = {}
+	for number, body in objects.items():
+		offsets[number] = len(data)
+		data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+	return data + xref_section(offsets, len(data), prev)
+
+
+def without_xref(data):
+	"""``data`` with startxref pointing at no table, like an xref stream"""
+	head, _ = data.rsplit(b"startxref", 1)
+	return head + b"startxref\n9\n%%EOF\n"
+
+
+PDFS = [
+	("flat", pdf(page_tree(7)), 7),
+	("nested", pdf(page_tree(3, 4, 1)), 8),
+	("padded", pdf(page_tree(2, 2), padding=8192), 4),
+	(
+		"incremental-update",
+		updated(
+			pdf(page_tree(2, 3)),
+			{2: b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 6 >>"},
+		),
+		6,
+	),
+	("indirect-count", pdf({1: b"<< /Pages 2 0 R >>", 2: b"<< /Count 3 0 R >>"}), None),
+	# Cross-references that cannot be followed fall back to a scan
+	("xref-stream", without_xref(pdf(page_tree(3, 4))), 7),
+	("truncated", pdf(page_tree(3, 4))[:-60], 7),
+	("scan-limit", without_xref(pdf(page_tree(3, 4), padding=8192)), None),
+	("no-page-tree", b"%PDF-1.7\n" + b"\0" * 2000, None),
+	("not-a-pdf", b"%!PS-Adobe-3.0\n/Type /Pages /Count 5", None),
+]
+
+
+@pytest.mark.parametrize(
+	"data, expected", [case[1:] for case in PDFS], ids=[case[0] for case in PDFS]
+)
+def test_count_pdf_pages(tmp_path, monkeypatch, data, expected):
+	monkeypatch.setattr(imageinfo, "PDF_SCAN_BYTES", 4096)
+	monkeypatch.setattr(imageinfo, "PDF_CHUNK_BYTES", 1024)
+	path = tmp_path / "document.pdf"
+	path.write_bytes(data)
+	assert count_pages(path) == expected
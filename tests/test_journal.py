@@ -0,0 +1,115 @@
+import itertools
+
+import pytest
+
+from backend import ERROR_CANCELLED, ERROR_FAILED, ConversionError
+from engine import ConversionEngine, ConversionResult, create_progress_tracker
+from journal import BatchJournal, find_batch
+from scanner import FolderScan
+
+
+def make_engine(fake_magick, tmp_path):
+	(tmp_path / "out").mkdir(exist_ok=True)
+	return ConversionEngine(
+		fake_magick.backend,
+		output_dir=tmp_path / "out",
+		max_workers=2,
+		group_small_files=False,
+		use_pillow=False,
+	)
+
+
+def start_batch(engine, files):
+	journal = BatchJournal.create(engine.batch_settings())
+	journal.add(files)
+	engine.journal = journal
+	return journal
+
+
+def result(path, kind=None):
+	error = None if kind is None else ConversionError(kind)
+	return ConversionResult(0, path, f"{path}.out", error)
+
+
+def test_resume_lists_pending_and_running_in_order(tmp_path):
+	files = [str(tmp_path / f"img{n}.png") for n in range(6)]
+	journal = BatchJournal.create({"output_format": "png"})
+	journal.add(files)
+	journal.running(files[:4])
+	journal.record(result(files[1]))
+	journal.record(result(files[2], ERROR_FAILED))
+	journal.record(result(files[3], ERROR_CANCELLED))
+	journal.close()  # As if the application quit halfway
+
+	resumed = find_batch()
+	assert resumed.id == journal.id
+	assert not resumed.finished
+	assert resumed.total == 6
+	assert resumed.settings == {"output_format": "png"}
+	assert resumed.remaining == [files[0], *files[2:]]
+
+
+def test_interrupted_batch_resumes_where_it_stopped(fake_magick, inputs, tmp_path):
+	files = inputs("a.png", "b_SLOW.png", "c_SLOW.png", "d.png", "e.png", "f.png")
+	engine = make_engine(fake_magick, tmp_path)
+	journal = start_batch(engine, files)
+
+	def on_result(result):
+		if result.index == 0:
+			engine.cancel()
+
+	engine.submit_many(files, on_result).result()
+
+	# The slow files were cancelled while running; later ones never started
+	resumed = find_batch()
+	assert resumed.id == journal.id
+	assert not resumed.finished
+	assert resumed.remaining == [str(path) for path in files[1:]]
+
+	engine = make_engine(fake_magick, tmp_path)
+	engine.journal = BatchJournal.resume(resumed.id)
+	results = list(engine.convert_many(resumed.remaining))
+	assert all(result.success for result in results)
+	assert find_batch() is None
+
+
+def test_finished_batch_keeps_failures(fake_magick, inputs, tmp_path):
+	files = inputs("a.png", "b_FAIL.png", "c.png")
+	engine = make_engine(fake_magick, tmp_path)
+	start_batch(engine, files)
+	list(engine.convert_many(files))
+	resumed = find_batch()
+	assert resumed.finished
+	assert resumed.remaining == [str(files[1])]
+
+
+def test_files_from_a_running_scan_are_journaled(fake_magick, inputs, tmp_path):
+	gui = pytest.importorskip("gui")
+	files = inputs("a.png", "b_SLOW.png")
+	late = tmp_path / "late"
+	late.mkdir()
+	for name in ("c.png", "d.png"):
+		(late / name).write_bytes(name.encode())
+	scan = FolderScan([late], on_chunk=lambda scan, chunk: None).start()
+	engine = make_engine(fake_magick, tmp_path)
+	journal = start_batch(engine, files)
+	# What the GUI's _batch_inputs() feeds the engine: the listed files, then
+	# the ones the scan finds after the batch started
+	tracker = create_progress_tracker(files)
+	late_files = gui.ImageMagickGUI._follow_scans(
+		None, engine, tracker, [(scan, 0)], set(files)
+	)
+
+	def on_result(result):
+		if result.index == 0:
+			engine.cancel()
+
+	engine.submit_many(itertools.chain(files, late_files), on_result).result()
+
+	resumed = find_batch()
+	assert resumed.id == journal.id
+	assert resumed.remaining == [
+		str(files[1]),
+		str(late / "c.png"),
+		str(late / "d.png"),
+	]
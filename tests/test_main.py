@@ -0,0 +1,21 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_headless_does_not_import_tkinter():
+	code = (
+		"import sys, main\n"
+		"try:\n"
+		"\tmain.main(['--headless', '--help'])\n"
+		"except SystemExit:\n"
+		"\tpass\n"
+		"assert 'tkinter' not in sys.modules, 'tkinter was imported'\n"
+	)
+	result = subprocess.run(
+		[sys.executable, "-c", code],
+		cwd=Path(__file__).resolve().parent.parent,
+		capture_output=True,
+		text=True,
+	)
+	assert result.returncode == 0, result.stderr
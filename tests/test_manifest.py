@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+
+import manifest
+from manifest import MANIFEST_NAME, Manifest
+
+
+SETTINGS = {"output_format": "png"}
+
+
+def make_pairs(tmp_path, count):
+	pairs = []
+	for n in range(count):
+		source = tmp_path / f"in{n}.jpg"
+		output = tmp_path / f"in{n}.png"
+		source.write_bytes(b"input %d" % n)
+		output.write_bytes(b"output %d" % n)
+		pairs.append((source, output))
+	return pairs
+
+
+def test_is_current(tmp_path):
+	((source, output),) = make_pairs(tmp_path, 1)
+	first = Manifest(tmp_path)
+	assert not first.is_current(source, output, SETTINGS)
+	first.record(source, output, SETTINGS)
+	first.save()
+	loaded = Manifest(tmp_path)
+	assert loaded.is_current(source, output, SETTINGS)
+	assert not loaded.is_current(source, output, {"output_format": "jpg"})
+	output.write_bytes(b"changed")
+	assert not loaded.is_current(source, output, SETTINGS)
+
+
+def test_concurrent_saves_are_serialized(tmp_path, monkeypatch):
+	# Saves are due on every record(); a slow write shows overlapping saves
+	monkeypatch.setattr(manifest, "SAVE_INTERVAL", -1.0)
+	writing = []
+	overlaps = []
+	dump = json.dump
+
+	def slow_dump(data, fh, **kwargs):
+		writing.append(True)
+		if len(writing) > 1:
+			overlaps.append(True)
+		text = json.dumps(data, **kwargs)
+		fh.write(text[: len(text) // 2])
+		time.sleep(0.002)
+		fh.write(text[len(text) // 2 :])
+		writing.pop()
+
+	monkeypatch.setattr(json, "dump", slow_dump)
+	pairs = make_pairs(tmp_path, 64)
+	target = Manifest(tmp_path)
+
+	def record(chunk):
+		for source, output in chunk:
+			target.record(source, output, SETTINGS)
+
+	threads = [threading.Thread(target=record, args=(pairs[n::8],)) for n in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	target.save()
+	monkeypatch.setattr(json, "dump", dump)
+
+	assert not overlaps
+	assert sorted(path.name for path in tmp_path.glob(f"{MANIFEST_NAME}*")) == [
+		MANIFEST_NAME
+	]
+	loaded = Manifest(tmp_path)
+	assert len(loaded.entries) == len(pairs)
+	assert all(loaded.is_current(source, output, SETTINGS) for source, output in pairs)
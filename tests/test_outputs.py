@@ -0,0 +1,92 @@
+import pytest
+
+from engine import ConversionEngine
+from outputs import OutputSpec, fan_out_options, parse_output_specs
+from resources import ResourceLimits
+
+
+@pytest.mark.parametrize(
+	"text, expected",
+	[
+		("png", [("png", None)]),
+		("png,jpg:8x8", [("png", None), ("jpg", "8x8")]),
+		(" PNG , webp:320x ", [("png", None), ("webp", "320x")]),
+		("jpg:", [("jpg", None)]),
+		("jpg:x240,jpg", [("jpg", "x240"), ("jpg", None)]),
+		# The same format at different sizes is not a duplicate
+		("jpg:8x8,jpg:16x16,", [("jpg", "8x8"), ("jpg", "16x16")]),
+	],
+)
+def test_parse_output_specs(text, expected):
+	specs = parse_output_specs(text)
+	assert [(spec.format, spec.size) for spec in specs] == expected
+
+
+@pytest.mark.parametrize(
+	"text",
+	[
+		"",
+		" , ",
+		"png,png",
+		"png,PNG",
+		"jpg:8x8,jpg:8X8",
+		"jpg:x",
+		"jpg:0x8",
+		"jpg:8x0",
+		"jpg:8x8x8",
+		"jpg:-8x8",
+		"jpg:eightxeight",
+		"j.pg",
+		":8x8",
+	],
+)
+def test_parse_output_specs_rejects(text):
+	with pytest.raises(ValueError):
+		parse_output_specs(text)
+
+
+def test_output_spec():
+	spec = OutputSpec.parse("JPG:320x240")
+	assert str(spec) == "jpg:320x240"
+	assert spec == OutputSpec("jpg", "320x240")
+	assert spec != OutputSpec("jpg")
+	assert spec.name_suffix() == "_320x240"
+	assert spec.resize_options() == ["-resize", "320x240>"]
+	assert OutputSpec("png").name_suffix() == ""
+	assert OutputSpec("png").resize_options() == []
+
+
+def test_fan_out_options():
+	assert fan_out_options([(OutputSpec("png"), "a.png")]) == [
+		"(", "-clone", "0--1", "-write", "a.png", "-delete", "0--1", ")"
+	]
+
+
+def test_one_call_writes_every_output(fake_magick, inputs, tmp_path):
+	out = tmp_path / "out"
+	out.mkdir()
+	(photo,) = inputs("photo.png")
+	engine = ConversionEngine(
+		fake_magick.backend,
+		output_dir=out,
+		outputs=parse_output_specs("webp,jpg:8x8"),
+		max_workers=1,
+		use_pillow=False,
+		limits=ResourceLimits(1),
+	)
+	(result,) = engine.convert_many([photo])
+	assert result.success
+	assert result.output_path == out / "photo_converted.webp"
+	assert result.extra_outputs == [out / "photo_converted_8x8.jpg"]
+	assert fake_magick.calls() == [
+		[
+			"-limit", "thread", "1",
+			str(photo),
+			"(", "-clone", "0--1", "-resize", "8x8>",
+			"-write", str(out / "photo_converted_8x8.jpg"),
+			"-delete", "0--1", ")",
+			str(out / "photo_converted.webp"),
+		]
+	]
+	assert (out / "photo_converted.webp").exists()
+	assert (out / "photo_converted_8x8.jpg").exists()
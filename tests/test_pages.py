@@ -0,0 +1,31 @@
+import pytest
+
+from pages import page_output_path, page_ranges
+
+
+@pytest.mark.parametrize(
+	"pages, parts, expected",
+	[
+		# One page per part
+		(4, 4, [(0, 0), (1, 1), (2, 2), (3, 3)]),
+		(1, 1, [(0, 0)]),
+		# Exact multiples
+		(6, 3, [(0, 1), (2, 3), (4, 5)]),
+		(300, 2, [(0, 149), (150, 299)]),
+		# A remainder goes to the first parts, one page each
+		(7, 3, [(0, 2), (3, 4), (5, 6)]),
+		(11, 4, [(0, 2), (3, 5), (6, 8), (9, 10)]),
+		# More parts than pages, or none
+		(3, 8, [(0, 0), (1, 1), (2, 2)]),
+		(5, 0, [(0, 4)]),
+	],
+)
+def test_page_ranges(pages, parts, expected):
+	ranges = page_ranges(pages, parts)
+	assert ranges == expected
+	covered = [page for first, last in ranges for page in range(first, last + 1)]
+	assert covered == list(range(pages))
+
+
+def test_page_output_path(tmp_path):
+	assert page_output_path(tmp_path / "out.png", 3) == tmp_path / "out-3.png"
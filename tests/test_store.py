@@ -0,0 +1,117 @@
+import pytest
+
+import engine as engine_module
+from engine import BACKEND_PILLOW, BACKEND_STORE, ConversionEngine
+from store import OutputStore, place_file
+
+PLACEMENTS = {"reflink", "hardlink", "copy"}
+
+
+@pytest.fixture
+def make_engine(fake_magick, tmp_path):
+	def make(use_pillow=False):
+		(tmp_path / "out").mkdir(exist_ok=True)
+		return ConversionEngine(
+			fake_magick.backend,
+			output_dir=tmp_path / "out",
+			max_workers=2,
+			group_small_files=False,
+			use_pillow=use_pillow,
+			dedupe=True,
+			store_dir=tmp_path / "store",
+		)
+
+	return make
+
+
+@pytest.mark.parametrize("names", [("a.png", "b.png"), ("a_SLOW.png", "b_SLOW.png")])
+def test_identical_inputs_convert_once(make_engine, fake_magick, inputs, names):
+	# With SLOW inputs the second waits for the first to finish converting
+	files = inputs(*names, contents=b"same pixels")
+	results = list(make_engine().convert_many(files))
+	assert len(fake_magick.calls()) == 1
+	assert all(result.success for result in results)
+	for result in results:
+		assert result.output_path.read_bytes() == b"same pixels"
+	reused = [result for result in results if result.backend == BACKEND_STORE]
+	assert len(reused) == 1
+	assert reused[0].reused in PLACEMENTS
+
+
+def test_later_batch_reuses_stored_output(make_engine, fake_magick, inputs):
+	first, second = inputs("a.png", "b.png", contents=b"same pixels")
+	list(make_engine().convert_many([first]))
+	(result,) = make_engine().convert_many([second])
+	assert result.backend == BACKEND_STORE
+	assert result.output_path.read_bytes() == b"same pixels"
+	assert len(fake_magick.calls()) == 1
+
+
+def test_outputs_are_not_shared_across_producers(
+	make_engine, fake_magick, inputs, monkeypatch
+):
+	# Pillow and magick write different bytes for the same settings
+	def convert_in_process(input_path, output_path, output_format):
+		output_path.write_bytes(b"from pillow")
+		return True
+
+	monkeypatch.setattr(engine_module, "PILLOW_AVAILABLE", True)
+	monkeypatch.setattr(engine_module, "can_convert_in_process", lambda *args: True)
+	monkeypatch.setattr(engine_module, "convert_in_process", convert_in_process)
+	first, second, third = inputs("a.png", "b.png", "c.png", contents=b"same")
+	(result,) = make_engine(use_pillow=True).convert_many([first])
+	assert result.backend == BACKEND_PILLOW
+	(result,) = make_engine().convert_many([second])
+	assert result.backend != BACKEND_STORE
+	assert result.output_path.read_bytes() == b"same"
+	(result,) = make_engine(use_pillow=True).convert_many([third])
+	assert result.backend == BACKEND_STORE
+	assert result.output_path.read_bytes() == b"from pillow"
+
+
+def test_failed_conversion_releases_claim(make_engine, fake_magick, inputs):
+	(failing,) = inputs("a_FAIL.png", contents=b"same pixels")
+	engine = make_engine()
+	(result,) = engine.convert_many([failing])
+	assert not result.success
+	key = engine.store.key(failing, engine._store_settings(failing))
+	assert engine.store.claim(key)
+	engine.store.release(key)
+	# Nothing was stored, so a copy under another name is converted itself
+	(copy,) = inputs("b.png", contents=b"same pixels")
+	(result,) = engine.convert_many([copy])
+	assert result.success and result.backend != BACKEND_STORE
+	assert len(fake_magick.calls()) == 2
+
+
+def test_claims(tmp_path):
+	store = OutputStore(tmp_path / "store")
+	assert store.claim("key")
+	assert not store.claim("key")
+	store.release("key")
+	store.wait("key")  # Released, so this returns at once
+	assert store.claim("key")
+
+
+def test_fetch_and_add(tmp_path):
+	store = OutputStore(tmp_path / "store")
+	output = tmp_path / "out.png"
+	assert store.fetch("key", output) is None
+	output.write_bytes(b"converted")
+	store.add("key", output)
+	assert not output.samefile(store.directory / "key.png")
+	placed = tmp_path / "placed.png"
+	assert store.fetch("key", placed) in PLACEMENTS
+	assert placed.read_bytes() == b"converted"
+
+
+@pytest.mark.parametrize("hardlink", [True, False])
+def test_place_file(tmp_path, hardlink):
+	source = tmp_path / "source"
+	source.write_bytes(b"contents")
+	target = tmp_path / "target"
+	target.write_bytes(b"old contents")
+	method = place_file(source, target, hardlink=hardlink)
+	assert method in (PLACEMENTS if hardlink else PLACEMENTS - {"hardlink"})
+	assert target.read_bytes() == b"contents"
+	assert sorted(path.name for path in tmp_path.iterdir()) == ["source", "target"]
@@ -0,0 +1,188 @@
+"""
+Preview thumbnails
+
+Renders small PNG thumbnails with ImageMagick on a background pool and keeps
+them in a content-addressed cache on disk (named after a hash of the source
+file's contents), so a file that was seen before, under any name, gets its
+thumbnail without running ImageMagick again. The cache is trimmed to a
+maximum size by evicting the least recently used thumbnails.
+"""
+
+import concurrent.futures
+import os
+import threading
+
+from backend import ConversionError, get_cache_dir
+from imageinfo import LRUCache, cache_key
+from manifest import hash_file
+
+
+THUMBNAIL_SIZE = 256
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Evict down to this fraction of the limit so eviction doesn't run every time
+EVICT_TARGET = 0.8
+
+
+class ThumbnailCache:
+	"""Generate and cache thumbnails in the background
+
+	Only files that are currently wanted (the selected file plus whatever
+	was last prefetched) are rendered; queued jobs for files that have
+	scrolled out of view are dropped before they start.
+	"""
+
+	def __init__(
+		self,
+		backend,
+		directory=None,
+		size=THUMBNAIL_SIZE,
+		max_bytes=MAX_CACHE_BYTES,
+		max_workers=2,
+	):
+		self.backend = backend
+		self.directory = directory or get_cache_dir() / "thumbnails"
+		self.size = size
+		self.max_bytes = max_bytes
+		self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+		self._digests = LRUCache(4096)  # (path, size, mtime) -> content hash
+		self._lock = threading.Lock()
+		self._wanted = set()
+		self._queued = set()
+		self._total_bytes = None  # Computed on first insert
+
+	def request(self, path, callback):
+		"""Return the thumbnail path if it is cached, else render it in the background
+
+		When the thumbnail has to be rendered, ``callback(path,
+		thumbnail_path)`` is called from a pool thread once it is ready
+		(``thumbnail_path`` is None if rendering failed).
+		"""
+		cached = self._cached_thumbnail(path)
+		if cached is not None:
+			with self._lock:
+				self._wanted = {path}
+			return cached
+		with self._lock:
+			self._wanted = {path}
+		self._submit(path, callback)
+		return None
+
+	def prefetch(self, paths):
+		"""Render thumbnails for files likely to be viewed next"""
+		with self._lock:
+			self._wanted.update(paths)
+		for path in paths:
+			if self._cached_thumbnail(path) is None:
+				self._submit(path, None)
+
+	def _submit(self, path, callback):
+		with self._lock:
+			if path in self._queued and callback is None:
+				return
+			self._queued.add(path)
+		self._pool.submit(self._render, path, callback)
+
+	def _thumbnail_path(self, digest):
+		return self.directory / f"{digest}-{self.size}.png"
+
+	def _cached_thumbnail(self, path):
+		"""Return the cached thumbnail for a file without hashing it, or None"""
+		key = cache_key(path)
+		digest = self._digests.get(key) if key is not None else None
+		if digest is None:
+			return None
+		thumbnail = self._thumbnail_path(digest)
+		try:
+			os.utime(thumbnail)  # Mark as recently used for eviction
+		except OSError:
+			return None
+		return thumbnail
+
+	def _render(self, path, callback):
+		with self._lock:
+			self._queued.discard(path)
+			if path not in self._wanted:
+				return  # Selection moved on before the job started
+
+		thumbnail = None
+		try:
+			key = cache_key(path)
+			if key is None:
+				return
+			digest = self._digests.get(key)
+			if digest is None:
+				digest = hash_file(path)
+				self._digests.put(key, digest)
+			thumbnail = self._thumbnail_path(digest)
+			if os.path.exists(thumbnail):
+				os.utime(thumbnail)
+			else:
+				thumbnail = self._generate(path, thumbnail)
+		except (OSError, ConversionError):
+			thumbnail = None
+		finally:
+			if callback is not None:
+				callback(path, thumbnail)
+
+	def _generate(self, path, thumbnail):
+		if self.backend is None:
+			return None
+		self.directory.mkdir(parents=True, exist_ok=True)
+		tmp_path = thumbnail.with_name(
+			f"{thumbnail.stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+		)
+		hint = 2 * self.size
+		args = [
+			# Let the JPEG decoder downscale while decoding
+			"-define",
+			f"jpeg:size={hint}x{hint}",
+		]
+		if path.lower().endswith(".pdf"):
+			args += ["-density", "36"]  # Rasterize PDFs at low resolution
+		args += [
+			f"{path}[0]",
+			"-thumbnail",
+			f"{self.size}x{self.size}>",
+			f"png:{tmp_path}",
+		]
+		try:
+			self.backend.run(self.backend.command("convert", *args), timeout=30)
+			os.replace(tmp_path, thumbnail)
+		finally:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+		self._account(os.path.getsize(thumbnail))
+		return thumbnail
+
+	def _account(self, added_bytes):
+		"""Track the cache size and evict old thumbnails when over the limit"""
+		with self._lock:
+			if self._total_bytes is None:
+				self._total_bytes = sum(
+					entry.stat().st_size
+					for entry in os.scandir(self.directory)
+					if entry.name.endswith(".png")
+				)
+			else:
+				self._total_bytes += added_bytes
+			if self._total_bytes <= self.max_bytes:
+				return
+
+			entries = [
+				(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+				for entry in os.scandir(self.directory)
+				if entry.name.endswith(".png")
+			]
+			entries.sort()
+			target = self.max_bytes * EVICT_TARGET
+			for _, size, entry_path in entries:
+				if self._total_bytes <= target:
+					break
+				try:
+					os.remove(entry_path)
+				except OSError:
+					continue
+				self._total_bytes -= size
+
+	def shutdown(self):
+		self._pool.shutdown(wait=False)
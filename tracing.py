@@ -0,0 +1,327 @@
+"""
+Conversion timing
+
+ConversionEngine records how long each file took on its ConversionResult:
+wall time, the CPU time of the ImageMagick process, the time spent waiting
+for a worker and starting the process, and the input and output sizes.
+BatchTrace collects them for a batch. It always keeps per-format totals
+and the slowest files, for a summary at the end of the batch; with
+``record=True`` it also keeps every file's timings (and events such as GUI
+redraws) so they can be exported as CSV, JSON or a Chrome trace timeline,
+which chrome://tracing and https://ui.perfetto.dev display.
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+
+SLOWEST_FILES = 5
+
+# Columns of the CSV export, in order
+FIELDS = [
+	"index",
+	"input",
+	"format",
+	"status",
+	"worker",
+	"backend",
+	"start",
+	"elapsed",
+	"queue_wait",
+	"spawn_time",
+	"cpu_time",
+	"input_bytes",
+	"output_bytes",
+	"pixels",
+]
+
+
+def input_format(path):
+	"""The format of an input, from its extension"""
+	return os.path.splitext(str(path))[1].lstrip(".").lower() or "?"
+
+
+def format_summary(summary):
+	"""BatchTrace.summary() as a small text table"""
+	if not summary["formats"]:
+		return []
+	lines = [
+		f"{'format':<8}{'files':>7}{'avg wall':>10}{'avg CPU':>10}"
+		f"{'avg queue':>11}{'MB in':>9}{'MB out':>9}"
+	]
+	for fmt, row in summary["formats"].items():
+		cpu = row["avg_cpu_time"]
+		lines.append(
+			f"{fmt:<8}{row['files']:>7}{row['avg_elapsed']:>9.2f}s"
+			f"{'-' if cpu is None else f'{cpu:.2f}s':>10}"
+			f"{row['avg_queue_wait']:>10.2f}s"
+			f"{row['input_bytes'] / (1024 * 1024):>9.1f}"
+			f"{row['output_bytes'] / (1024 * 1024):>9.1f}"
+		)
+	lines.append("Slowest files:")
+	for record in summary["slowest"]:
+		cpu = record["cpu_time"]
+		lines.append(
+			f"  {record['elapsed']:>7.2f}s  {os.path.basename(record['input'])}"
+			f" ({record['pixels'] / 1e6:.1f} MP, CPU "
+			f"{'unknown' if cpu is None else f'{cpu:.2f}s'}, "
+			f"queued {record['queue_wait']:.2f}s)"
+		)
+	schedule = summary.get("schedule")
+	if schedule is not None:
+		policy = f" ({schedule['policy']})" if schedule["policy"] else ""
+		lines.append(
+			f"Schedule{policy}: {schedule['workers']} workers busy "
+			f"{schedule['utilization']:.0%} of {schedule['makespan']:.2f}s, "
+			f"idle tail {schedule['idle_tail']:.2f}s"
+		)
+	return lines
+
+
+class BatchTrace:
+	"""Timings of the files converted in one batch
+
+	add() and add_event() may be called from any thread. ``schedule`` is
+	the engine's schedule policy, named in the summary.
+	"""
+
+	def __init__(self, record=False, schedule=None):
+		self.origin = time.perf_counter()  # Export timestamps count from here
+		self.record = record
+		self.schedule = schedule
+		self.records = []  # Per-file dicts with FIELDS, when recording
+		self.events = []  # (name, lane, start, duration), when recording
+		# format -> [files, elapsed, cpu_time, files with cpu_time, queue_wait,
+		# input_bytes, output_bytes]
+		self.formats = {}
+		self._slowest = []  # Heap of (elapsed, tiebreak, record)
+		# worker -> [busy seconds, end of its last file], and the span of the
+		# batch, to tell how well the work was spread over the workers
+		self._workers = {}
+		self._first_start = None
+		self._last_end = None
+		self._counter = itertools.count()
+		self._lock = threading.Lock()
+
+	def add(self, result):
+		"""Account for a ConversionResult; files that did not run are ignored"""
+		if result.started is None:
+			return
+		record = {
+			"index": result.index,
+			"input": str(result.input_path),
+			"format": input_format(result.input_path),
+			"status": result.status,
+			"worker": result.worker,
+			"backend": result.backend,
+			"start": result.started - self.origin,
+			"elapsed": result.elapsed,
+			"queue_wait": result.queue_wait,
+			"spawn_time": result.spawn_time,
+			"cpu_time": result.cpu_time,
+			"input_bytes": result.input_bytes,
+			"output_bytes": result.output_bytes,
+			"pixels": result.pixels,
+		}
+		with self._lock:
+			totals = self.formats.setdefault(
+				record["format"], [0, 0.0, 0.0, 0, 0.0, 0, 0]
+			)
+			totals[0] += 1
+			totals[1] += result.elapsed
+			if result.cpu_time is not None:
+				totals[2] += result.cpu_time
+				totals[3] += 1
+			totals[4] += result.queue_wait
+			totals[5] += result.input_bytes
+			totals[6] += result.output_bytes
+
+			end = result.started + result.elapsed
+			worker = self._workers.setdefault(result.worker, [0.0, end])
+			worker[0] += result.elapsed
+			worker[1] = max(worker[1], end)
+			if self._first_start is None or result.started < self._first_start:
+				self._first_start = result.started
+			if self._last_end is None or end > self._last_end:
+				self._last_end = end
+
+			entry = (result.elapsed, next(self._counter), record)
+			if len(self._slowest) < SLOWEST_FILES:
+				heapq.heappush(self._slowest, entry)
+			else:
+				heapq.heappushpop(self._slowest, entry)
+			if self.record:
+				self.records.append(record)
+
+	def add_event(self, name, lane, start, duration):
+		"""Record work outside the conversions, e.g. a GUI redraw
+
+		``start`` is a time.perf_counter() value.
+		"""
+		if self.record:
+			with self._lock:
+				self.events.append((name, lane, start - self.origin, duration))
+
+	def summary(self):
+		"""The slowest files and per-format averages, as plain data"""
+		with self._lock:
+			slowest = [entry[2] for entry in sorted(self._slowest, reverse=True)]
+			formats = {}
+			for fmt, totals in sorted(self.formats.items()):
+				files, elapsed, cpu, cpu_files, queue_wait, in_bytes, out_bytes = totals
+				formats[fmt] = {
+					"files": files,
+					"avg_elapsed": elapsed / files,
+					"avg_cpu_time": cpu / cpu_files if cpu_files else None,
+					"avg_queue_wait": queue_wait / files,
+					"input_bytes": in_bytes,
+					"output_bytes": out_bytes,
+				}
+			summary = {"slowest": slowest, "formats": formats}
+			if self._workers:
+				summary["schedule"] = self._schedule_summary()
+		return summary
+
+	def _schedule_summary(self):
+		makespan = self._last_end - self._first_start
+		busy = sum(seconds for seconds, _ in self._workers.values())
+		first_idle = min(end for _, end in self._workers.values())
+		return {
+			"policy": self.schedule,
+			"workers": len(self._workers),
+			# From the first file starting to the last one ending
+			"makespan": makespan,
+			"utilization": (
+				busy / (makespan * len(self._workers)) if makespan > 0 else 1.0
+			),
+			# From the first worker running out of work to the end of the batch
+			"idle_tail": self._last_end - first_idle,
+		}
+
+	def export(self, path):
+		"""Write the recorded timings; the format follows the file name
+
+		``*.csv`` is one row per file, ``*.trace.json`` a Chrome trace and
+		anything else JSON with the files, events and summary.
+		"""
+		name = str(path).lower()
+		if name.endswith(".csv"):
+			self.write_csv(path)
+		elif name.endswith(".trace.json"):
+			self.write_chrome_trace(path)
+		else:
+			self.write_json(path)
+
+	def write_csv(self, path):
+		with self._lock:
+			records = sorted(self.records, key=lambda record: record["index"])
+		with open(path, "w", newline="", encoding="utf-8") as fh:
+			writer = csv.DictWriter(fh, fieldnames=FIELDS)
+			writer.writeheader()
+			writer.writerows(records)
+
+	def write_json(self, path):
+		with self._lock:
+			records = sorted(self.records, key=lambda record: record["index"])
+			events = [
+				{"name": name, "lane": lane, "start": start, "duration": duration}
+				for name, lane, start, duration in self.events
+			]
+		data = {"files": records, "events": events, "summary": self.summary()}
+		with open(path, "w", encoding="utf-8") as fh:
+			json.dump(data, fh, indent=1)
+
+	def write_chrome_trace(self, path):
+		"""Write a Chrome trace: one lane per worker thread
+
+		Each file is a slice on the lane of the thread that converted it,
+		with the process start nested at its beginning. The time files spent
+		queued is drawn as async slices, which get rows of their own.
+		"""
+		with self._lock:
+			records = list(self.records)
+			events = list(self.events)
+
+		lanes = {}
+
+		def lane_id(name):
+			if name not in lanes:
+				lanes[name] = len(lanes) + 1
+			return lanes[name]
+
+		def us(seconds):
+			return round(seconds * 1e6, 1)
+
+		trace = []
+		for record in records:
+			tid = lane_id(record["worker"] or "worker")
+			name = os.path.basename(record["input"])
+			args = {key: record[key] for key in FIELDS if key != "start"}
+			trace.append(
+				{
+					"name": name,
+					"cat": record["format"],
+					"ph": "X",
+					"ts": us(record["start"]),
+					"dur": us(record["elapsed"]),
+					"pid": 1,
+					"tid": tid,
+					"args": args,
+				}
+			)
+			if record["spawn_time"]:
+				trace.append(
+					{
+						"name": "spawn",
+						"cat": "process",
+						"ph": "X",
+						"ts": us(record["start"]),
+						"dur": us(record["spawn_time"]),
+						"pid": 1,
+						"tid": tid,
+					}
+				)
+			if record["queue_wait"]:
+				queued = record["start"] - record["queue_wait"]
+				for phase, ts in (("b", queued), ("e", record["start"])):
+					trace.append(
+						{
+							"name": "queued",
+							"cat": "queue",
+							"ph": phase,
+							"id": record["index"],
+							"ts": us(ts),
+							"pid": 1,
+							"tid": tid,
+						}
+					)
+		for name, lane, start, duration in events:
+			trace.append(
+				{
+					"name": name,
+					"cat": "event",
+					"ph": "X",
+					"ts": us(start),
+					"dur": us(duration),
+					"pid": 1,
+					"tid": lane_id(lane),
+				}
+			)
+		for name, tid in lanes.items():
+			trace.append(
+				{
+					"name": "thread_name",
+					"ph": "M",
+					"pid": 1,
+					"tid": tid,
+					"args": {"name": name},
+				}
+			)
+
+		with open(path, "w", encoding="utf-8") as fh:
+			json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, fh)
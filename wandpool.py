@@ -0,0 +1,270 @@
+"""
+MagickWand conversions in long-lived worker processes
+
+Running ``magick`` once per file pays for a fork/exec and for ImageMagick
+loading its configuration every time. WandPool instead keeps a few worker
+processes that load libMagickWand once, through the Wand package, and
+convert files sent to them over a pipe. Converting in separate processes,
+rather than in the application itself, keeps the behaviour of the command
+line path: a timed-out or cancelled conversion is stopped by killing its
+worker (which is then replaced), a crash in a codec fails one file rather
+than the whole application, and ImageMagick's errors are classified the same
+way. WandPool.convert() takes the same arguments as
+ImageMagickBackend.convert(), so the engine can use either.
+"""
+
+import importlib.util
+import multiprocessing
+import queue
+import threading
+import time
+
+from backend import (
+	ConversionError,
+	ERROR_CANCELLED,
+	ERROR_FAILED,
+	ERROR_MISSING_BINARY,
+	ERROR_TIMEOUT,
+	classify_error,
+)
+
+
+# Only checks that Wand is installed; whether it finds libMagickWand is known
+# once the first worker has started
+WAND_AVAILABLE = importlib.util.find_spec("wand") is not None
+
+# Seconds a worker may take to start and load libMagickWand
+STARTUP_TIMEOUT = 30.0
+# Workers are replaced after this many files, so that memory fragmented by
+# large images is handed back to the system
+MAX_FILES_PER_WORKER = 500
+
+
+def _worker_main(conn, limits):
+	"""Worker process: convert the files sent over ``conn`` until told to stop"""
+	try:
+		from wand.image import Image
+		from wand.resource import limits as resource_limits
+
+		for resource, value in limits.items():
+			resource_limits[resource] = value
+	except Exception as e:  # ImportError when libMagickWand is not found
+		conn.send(("error", str(e)))
+		return
+	conn.send(("ready", None))
+
+	while True:
+		try:
+			job = conn.recv()
+		except EOFError:
+			return
+		if job is None:
+			return
+		input_path, output_path = job
+		started = time.process_time()
+		try:
+			# Reads every frame and writes them like ``magick in out`` does
+			with Image(filename=input_path) as image:
+				image.save(filename=output_path)
+		except Exception as e:
+			detail = str(e)
+			conn.send((classify_error(detail), detail, time.process_time() - started))
+		else:
+			conn.send((None, "", time.process_time() - started))
+
+
+def _wand_limits(limits):
+	"""ResourceLimits as Wand resource limits (bytes and thread count)"""
+	if limits is None:
+		return {}
+	values = {"thread": limits.threads}
+	for resource, value in (
+		("memory", limits.memory),
+		("map", limits.map_size),
+		("disk", limits.disk),
+	):
+		if value is not None:
+			values[resource] = value
+	return values
+
+
+class _Worker:
+	def __init__(self, process, conn):
+		self.process = process
+		self.conn = conn
+		self.files = 0
+
+
+class WandPool:
+	"""Up to ``size`` MagickWand worker processes, started as they are needed
+
+	convert() may be called from several threads at once; each call uses
+	one worker. ``limits`` (resources.ResourceLimits) applies to each
+	worker, as ``-limit`` does to each magick process.
+	"""
+
+	name = "magickwand"
+
+	def __init__(self, size, limits=None):
+		self.size = max(1, size)
+		self.limits = _wand_limits(limits)
+		self._context = multiprocessing.get_context("spawn")
+		# Idle workers; None stands for a worker not started yet
+		self._idle = queue.Queue()
+		for _ in range(self.size):
+			self._idle.put(None)
+		self._workers = set()
+		self._lock = threading.Lock()
+		self._cancelled = threading.Event()
+		self._load_error = None  # Set when libMagickWand failed to load
+
+	@property
+	def cancelled(self):
+		return self._cancelled.is_set()
+
+	def _start_worker(self):
+		conn, child_conn = self._context.Pipe()
+		process = self._context.Process(
+			target=_worker_main,
+			args=(child_conn, self.limits),
+			name="magickwand-worker",
+			daemon=True,
+		)
+		process.start()
+		child_conn.close()
+		worker = _Worker(process, conn)
+		with self._lock:
+			self._workers.add(worker)
+		if self.cancelled:
+			self._discard(worker)
+			raise ConversionError(ERROR_CANCELLED)
+
+		if not conn.poll(STARTUP_TIMEOUT):
+			self._discard(worker)
+			raise ConversionError(ERROR_TIMEOUT, "MagickWand worker did not start")
+		try:
+			status, detail = conn.recv()
+		except (EOFError, OSError):
+			status, detail = "exited", None
+		if status != "ready":
+			self._discard(worker)
+			if self.cancelled:
+				raise ConversionError(ERROR_CANCELLED)
+			if status == "error":
+				# Every other worker would fail the same way
+				self._load_error = f"MagickWand could not be loaded: {detail}"
+				raise ConversionError(ERROR_MISSING_BINARY, self._load_error)
+			raise ConversionError(ERROR_FAILED, "MagickWand worker exited on start")
+		return worker
+
+	def _discard(self, worker):
+		"""Kill a worker and forget it"""
+		with self._lock:
+			self._workers.discard(worker)
+		if worker.process.is_alive():
+			worker.process.kill()
+		worker.process.join(1.0)
+		worker.conn.close()
+
+	def _retire(self, worker):
+		"""Ask an idle worker to exit"""
+		with self._lock:
+			self._workers.discard(worker)
+		try:
+			worker.conn.send(None)
+		except OSError:
+			pass
+		worker.process.join(1.0)
+		if worker.process.is_alive():
+			worker.process.kill()
+		worker.conn.close()
+
+	def convert(
+		self,
+		input_path,
+		output_path,
+		options=(),
+		timeout=60,
+		group=None,
+		settings=(),
+		stats=None,
+	):
+		"""Convert one file, raising ConversionError on failure
+
+		Behaves like ImageMagickBackend.convert(). Command line ``options``
+		and ``settings`` are not supported; limits are given to the pool.
+		"""
+		if options:
+			raise ValueError("WandPool does not support command line options")
+		if self.cancelled or (group is not None and group.cancelled):
+			raise ConversionError(ERROR_CANCELLED)
+		if self._load_error is not None:
+			raise ConversionError(ERROR_MISSING_BINARY, self._load_error)
+
+		started = time.perf_counter()
+		worker = self._idle.get()
+		try:
+			if worker is not None and not worker.process.is_alive():
+				self._discard(worker)
+				worker = None
+			if worker is None:
+				worker = self._start_worker()
+			spawned = time.perf_counter()
+			if stats is not None:
+				stats.spawn = spawned - started
+
+			try:
+				worker.conn.send((str(input_path), str(output_path)))
+				finished = worker.conn.poll(timeout)
+				reply = worker.conn.recv() if finished else None
+			except (EOFError, OSError):
+				finished, reply = True, None
+			if stats is not None:
+				stats.wall = time.perf_counter() - started
+
+			if reply is None:
+				self._discard(worker)
+				exit_code = worker.process.exitcode
+				worker = None
+				if self.cancelled or (group is not None and group.cancelled):
+					raise ConversionError(ERROR_CANCELLED)
+				if not finished:
+					raise ConversionError(ERROR_TIMEOUT, f"after {timeout:.0f}s")
+				raise ConversionError(
+					ERROR_FAILED, f"MagickWand worker crashed (exit code {exit_code})"
+				)
+
+			error_kind, detail, cpu_time = reply
+			if stats is not None:
+				stats.cpu_time = cpu_time
+			worker.files += 1
+			if worker.files >= MAX_FILES_PER_WORKER:
+				self._retire(worker)
+				worker = None
+			if error_kind is not None:
+				raise ConversionError(error_kind, detail.strip() or "Unknown error")
+		finally:
+			self._idle.put(worker)
+
+	def cancel(self):
+		"""Kill every worker and refuse new conversions
+
+		Conversions in progress fail as cancelled; their threads then
+		clean up the killed workers.
+		"""
+		self._cancelled.set()
+		with self._lock:
+			workers = list(self._workers)
+		for worker in workers:
+			if worker.process.is_alive():
+				worker.process.kill()
+
+	def close(self):
+		"""Stop the workers; they are started again if convert() is called
+
+		Only call this when no conversion is running.
+		"""
+		with self._lock:
+			workers = list(self._workers)
+		for worker in workers:
+			self._discard(worker)